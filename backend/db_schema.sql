@@ -20,6 +20,18 @@ CREATE TABLE IF NOT EXISTS packages (
     category VARCHAR(100)                   -- Bisa dipertahankan
 );
 
+-- Index listing GET /packages (module_2: filter + keyset pagination, sama dengan models.Package)
+-- Pola: (kolom filter, kolom urut, package_id) agar halaman mana pun cukup satu range scan
+CREATE INDEX IF NOT EXISTS ix_packages_price_id ON packages (price, package_id);
+CREATE INDEX IF NOT EXISTS ix_packages_name_id ON packages (name, package_id);
+CREATE INDEX IF NOT EXISTS ix_packages_category_price ON packages (lower(category), price, package_id);
+CREATE INDEX IF NOT EXISTS ix_packages_departure_price ON packages (lower(departure_city), price, package_id);
+CREATE INDEX IF NOT EXISTS ix_packages_duration_price ON packages (duration_days, price, package_id);
+CREATE INDEX IF NOT EXISTS ix_packages_featured_price ON packages (price, package_id) WHERE featured IS true;
+-- destination berisi beberapa kota ("Makkah, Madinah"): GIN atas array kota ternormalisasi
+CREATE INDEX IF NOT EXISTS ix_packages_destination ON packages
+    USING gin (string_to_array(replace(lower(destination), ' ', ''), ','));
+
 -- Tabel 2: Reviews (Diperbarui: ganti user_id dengan reviewer_name)
 CREATE TABLE IF NOT EXISTS reviews (
     review_id SERIAL PRIMARY KEY,
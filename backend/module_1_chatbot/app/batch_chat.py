@@ -0,0 +1,182 @@
+# module_1_chatbot/app/batch_chat.py
+"""
+Pemrosesan chat massal (POST /chat/batch, scripts/batch_chat.py) untuk
+lonjakan pesan masuk setelah broadcast WhatsApp.
+
+- Dimuat sekali per batch: snapshot katalog, history + state semua user
+  (HGETALL dipipeline) dan embedding semua pesan unik (satu inferensi batch
+  ke cache query; pesan yang match leksikalnya confident dilewati).
+  Retrieval vektor per pesan tinggal perkalian matriks in-process atas
+  embedding yang sudah ada di cache.
+- Pesan dari user yang sama diproses berurutan sesuai urutan di batch; antar
+  user paralel dengan batas CHAT_BATCH_CONCURRENCY.
+- Tiap item tetap lewat chat_coalescer + get_ai_response, jadi alur state
+  eskalasi (AWAITING_CONFIRM -> AWAITING_CONTACT) sama persis dengan /chat.
+  Percakapan hasil prefetch hanya dipakai bila versinya masih sama saat item
+  berjalan (user bisa chat lewat /chat atau WhatsApp selama batch); selain
+  itu dimuat ulang.
+- Hasil dikirim segera begitu tiap item selesai (urutan selesai, bukan urutan
+  input; pakai `index`/`id` untuk mencocokkan), diakhiri satu baris ringkasan.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+from . import metrics
+from . import rag_logic
+from .catalog_cache import catalog_cache
+from .coalescer import chat_coalescer, ChatOverloaded, CHAT_RETRY_AFTER_SEC
+from .conversation_store import conversation_store, Conversation
+from .embeddings import embedding_service
+from .lexical_index import lexical_index
+from .schemas import BatchChatItem, BatchChatResult
+from .timing import start_timings
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "5000"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "16"))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "64"))
+# Item yang ditolak admission control dicoba ulang, bukan langsung gagal
+CHAT_BATCH_OVERLOAD_RETRIES = int(os.getenv("CHAT_BATCH_OVERLOAD_RETRIES", "3"))
+
+BUSY_TEXT = "Maaf, sistem sedang sibuk. Silakan coba lagi beberapa saat lagi."
+
+
+class BatchChatRunner:
+    def __init__(self, concurrency: int = CHAT_BATCH_CONCURRENCY):
+        self.concurrency = concurrency
+        self.stats = {"batches": 0, "items": 0, "errors": 0, "prefetched_conversations": 0,
+                      "prefetched_embeddings": 0, "stale_conversations": 0}
+
+    async def _prefetch(self, items: List[BatchChatItem]) -> Dict[str, Conversation]:
+        """Muat bersama: katalog, percakapan semua user & embedding pesan unik"""
+        user_ids = list(dict.fromkeys(item.user_id for item in items))
+        # Pesan yang jalur leksikalnya confident tidak butuh embedding sama sekali
+        texts = [item.message for item in items if not lexical_index.search(item.message).confident]
+
+        async def embed() -> int:
+            if not rag_logic.model:
+                return 0
+            try:
+                return await embedding_service.aprefetch_queries(texts)
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding batch gagal, fallback per pesan: {e}")
+                return 0
+
+        async def catalog():
+            try:
+                await catalog_cache.get()
+            except Exception as e:
+                logger.warning(f"⚠️ Gagal memuat katalog untuk batch: {e}")
+
+        convs, embedded, _ = await asyncio.gather(conversation_store.load_many(user_ids), embed(), catalog())
+        self.stats["prefetched_conversations"] += len(convs)
+        self.stats["prefetched_embeddings"] += embedded
+        logger.info(f"📦 Batch {len(items)} pesan / {len(user_ids)} user: {len(convs)} percakapan & "
+                    f"{embedded} embedding dimuat di depan.")
+        return convs
+
+    async def _answer(self, index: int, item: BatchChatItem, conversation: Optional[Conversation]) -> Dict:
+        timings = start_timings()
+        started = time.perf_counter()
+        result = None
+
+        async def respond() -> Dict:
+            # Dicek di dalam coalescer (sudah serial per user) agar tidak ada giliran lain menyela
+            current = conversation
+            if current is not None and not await conversation_store.is_current(item.user_id, current):
+                self.stats["stale_conversations"] += 1
+                current = None  # get_ai_response memuat ulang history & state eskalasi terbaru
+            return await rag_logic.get_ai_response(
+                user_id=item.user_id,
+                message=item.message,
+                channel="batch",
+                user_contact=item.user_email,
+                conversation=current,
+            )
+
+        for attempt in range(CHAT_BATCH_OVERLOAD_RETRIES + 1):
+            try:
+                result = await chat_coalescer.run(item.user_id, item.message, respond)
+                break
+            except ChatOverloaded:
+                if attempt < CHAT_BATCH_OVERLOAD_RETRIES:
+                    await asyncio.sleep(CHAT_RETRY_AFTER_SEC)
+            except Exception as e:
+                logger.error(f"❌ Item batch {index} ({item.user_id}) gagal: {e}", exc_info=True)
+                break
+        if result is None:
+            result = {"response": BUSY_TEXT, "source": "Error", "escalated": False}
+
+        total_ms = (time.perf_counter() - started) * 1000
+        metrics.observe_request("chat_batch", timings, result["source"], total_ms)
+        return BatchChatResult(
+            index=index,
+            id=item.id,
+            user_id=item.user_id,
+            response_text=result["response"],
+            source=result["source"],
+            escalated=result["escalated"],
+            escalation_reason=result.get("escalation_reason"),
+            latency_ms=round(total_ms, 1),
+        ).model_dump()
+
+    async def run(self, items: List[BatchChatItem], concurrency: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Hasil per item (begitu selesai), lalu {"type": "summary", ...}"""
+        concurrency = max(1, min(concurrency or self.concurrency, CHAT_BATCH_MAX_CONCURRENCY))
+        started = time.perf_counter()
+        self.stats["batches"] += 1
+        convs = await self._prefetch(items)
+
+        # Urutan per user dijaga: satu task per user memproses pesannya berurutan
+        per_user: "OrderedDict[str, List[int]]" = OrderedDict()
+        for index, item in enumerate(items):
+            per_user.setdefault(item.user_id, []).append(index)
+
+        results: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def process_user(user_id: str, indices: List[int]):
+            # Snapshot history hanya valid untuk pesan pertama; berikutnya dibaca ulang
+            conversation = convs.get(user_id)
+            for index in indices:
+                async with slots:
+                    await results.put(await self._answer(index, items[index], conversation))
+                conversation = None
+
+        tasks = [asyncio.create_task(process_user(u, idx)) for u, idx in per_user.items()]
+        sources: Counter = Counter()
+        try:
+            for _ in range(len(items)):
+                result = await results.get()
+                sources[result["source"]] += 1
+                yield result
+        finally:
+            # Klien putus di tengah batch -> hentikan sisa item
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        errors = sources.get("Error", 0)
+        self.stats["items"] += len(items)
+        self.stats["errors"] += errors
+        elapsed = time.perf_counter() - started
+        logger.info(f"✅ Batch {len(items)} pesan selesai dalam {elapsed:.1f}s ({errors} error).")
+        yield {
+            "type": "summary",
+            "items": len(items),
+            "users": len(per_user),
+            "errors": errors,
+            "sources": dict(sources),
+            "concurrency": concurrency,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "items_per_sec": round(len(items) / elapsed, 1) if elapsed else None,
+        }
+
+
+batch_chat_runner = BatchChatRunner()
@@ -0,0 +1,200 @@
+# module_1_chatbot/app/catalog_answers.py
+"""
+Jawaban katalog deterministik untuk pertanyaan komersial yang polanya jelas:
+- daftar paket ("ada paket apa saja?", "list paket", "harga paket umrah berapa?"),
+- termurah / termahal (boleh dikombinasikan dengan filter, mis. "termurah dari Surabaya"),
+- paket sesuai kriteria ("di bawah 35 juta", "9 hari", "pakai Garuda"),
+- detail satu paket yang disebut namanya.
+
+Teks dirender langsung dari baris snapshot katalog lewat template (beberapa
+milidetik, tanpa panggilan LLM), sehingga harga selalu persis sama dengan
+database. Pertanyaan yang tidak cocok pola -- atau butuh penalaran
+(membandingkan, rekomendasi, cicilan, jadwal, syarat) -- dikembalikan None
+dan tetap dijawab LLM dengan konteks dari catalog_retrieval.
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .catalog_cache import CatalogSnapshot
+from .catalog_retrieval import (
+    CatalogFilters, apply_filters, format_package, format_rupiah, package_price, parse_filters,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+CATALOG_ANSWER_MAX_PACKAGES = int(os.getenv("CATALOG_ANSWER_MAX_PACKAGES", "8"))
+
+# --- POLA PERTANYAAN ---
+_AMOUNT_AHEAD = r"(?!\s*(?:rp\.?\s*)?\d)"  # "paling mahal 30 juta" = batas budget, bukan superlatif
+_CHEAPEST_RE = re.compile(rf"\b(?:termurah|paling murah{_AMOUNT_AHEAD}|harga terendah|paling hemat|paling terjangkau)\b")
+_PRICIEST_RE = re.compile(rf"\b(?:termahal|paling mahal{_AMOUNT_AHEAD}|harga tertinggi)\b")
+_LIST_RE = re.compile(
+    r"\b(?:daftar|list|katalog|semua paket|pilihan paket|paket apa|ada paket|paket (?:yang )?(?:tersedia|ada))\b"
+)
+_PRICE_WORDS = r"(?:harga\w*|berapa(?:an)?|biaya\w*|tarif\w*)"
+_PACKAGE_WORDS = r"(?:paket\w*|umrah\w*|umroh\w*|haji\w*)"
+# Kata harga yang menempel pada paket ("harga paket umrah", "umrohnya berapa"); "biaya vaksin" -> LLM
+_PACKAGE_PRICE_RE = re.compile(
+    rf"\b{_PRICE_WORDS}\s+(?:\w+\s+){{0,2}}?{_PACKAGE_WORDS}\b|\b{_PACKAGE_WORDS}\s+(?:\w+\s+){{0,2}}?{_PRICE_WORDS}\b"
+)
+_NOT_PACKAGE_RE = re.compile(r"\b(?:tanpa|selain|di luar|diluar)\s+(?:\w+\s+)?paket")
+# Butuh penalaran / informasi di luar tabel packages -> serahkan ke LLM
+_NEEDS_LLM_RE = re.compile(
+    r"\b(?:banding\w*|beda\w*|perbedaan|kenapa|mengapa|rekomendasi\w*|sarankan|saran|cocok|lebih (?:baik|bagus)|"
+    r"cicil\w*|angsur\w*|dp|kapan|jadwal\w*|tanggal|visa|syarat\w*|termasuk|refund|batal\w*|diskon|promo)\b"
+)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Kata pada nama paket yang terlalu umum untuk menunjuk satu paket
+_GENERIC_NAME_WORDS = {"paket", "hari", "umrah", "umroh", "haji", "plus", "reguler", "program", "info"}
+
+CLOSING = "Ingin info detail salah satu paket atau dibantu pendaftarannya? 😊"
+
+
+@dataclass
+class CatalogAnswer:
+    text: str
+    kind: str  # list / cheapest / priciest / filtered / detail
+    rows: List[Dict] = field(default_factory=list)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def describe_filters(filters: CatalogFilters) -> str:
+    parts = []
+    if filters.min_price is not None and filters.max_price is not None:
+        parts.append(f"harga {format_rupiah(filters.min_price)} – {format_rupiah(filters.max_price)}")
+    elif filters.max_price is not None:
+        parts.append(f"harga maks. {format_rupiah(filters.max_price)}")
+    elif filters.min_price is not None:
+        parts.append(f"harga mulai {format_rupiah(filters.min_price)}")
+    if filters.duration_days is not None:
+        parts.append(f"{filters.duration_days} hari")
+    if filters.departure_city:
+        parts.append(f"berangkat dari {filters.departure_city}")
+    if filters.category:
+        parts.append(f"kategori {filters.category}")
+    if filters.airline:
+        parts.append(f"maskapai {filters.airline}")
+    return ", ".join(parts)
+
+
+def format_package_detail(row: Dict) -> str:
+    lines = [f"📦 *{row['name']}*"]
+    for label, value in (
+        ("Kategori", row.get("category")),
+        ("Durasi", row.get("duration")),
+        ("Harga", format_rupiah(row["price"]) if row.get("price") is not None else None),
+        ("Maskapai", row.get("airline")),
+        ("Keberangkatan", row.get("departure_city")),
+        ("Hotel", row.get("hotel_info")),
+        ("Destinasi", row.get("destination")),
+        ("Fasilitas", ", ".join(row["features"]) if row.get("features") else None),
+    ):
+        if value:
+            lines.append(f"   - {label}: {value}")
+    if row.get("description"):
+        lines.append(f"\n{row['description']}")
+    return "\n".join(lines)
+
+
+class CatalogAnswerer:
+    def __init__(self, max_packages: int = CATALOG_ANSWER_MAX_PACKAGES):
+        self.max_packages = max_packages
+        self.stats = {"answered": 0, "skipped": 0}
+
+    @staticmethod
+    def _name_index(snapshot: CatalogSnapshot) -> List[tuple]:
+        """(nama ternormalisasi, kata khas nama) per paket, dihitung sekali per versi katalog"""
+        if "answer_names" not in snapshot.derived:
+            names = []
+            for row in snapshot.rows:
+                name = _normalize(str(row.get("name") or ""))
+                distinctive = frozenset(w for w in name.split() if w not in _GENERIC_NAME_WORDS and not w.isdigit())
+                names.append((name, distinctive))
+            snapshot.derived["answer_names"] = names
+        return snapshot.derived["answer_names"]
+
+    def _named_packages(self, snapshot: CatalogSnapshot, text: str) -> List[int]:
+        normalized = f" {_normalize(text)} "
+        words = set(normalized.split())
+        names = self._name_index(snapshot)
+        exact = [i for i, (name, _) in enumerate(names) if name and f" {name} " in normalized]
+        if exact:
+            return exact
+        return [i for i, (_, distinctive) in enumerate(names) if distinctive and distinctive <= words]
+
+    def _render_list(self, rows: List[Dict], header: str, kind: str) -> CatalogAnswer:
+        shown = rows[: self.max_packages]
+        parts = [header]
+        parts.extend(format_package(row) for row in shown)
+        if len(rows) > len(shown):
+            parts.append(f"…dan {len(rows) - len(shown)} paket lainnya. Sebutkan budget, durasi, atau kota "
+                         f"keberangkatan agar pilihannya lebih spesifik.")
+        parts.append(CLOSING)
+        return CatalogAnswer("\n\n".join(parts), kind, shown)
+
+    def answer(self, snapshot: CatalogSnapshot, message: str) -> Optional[CatalogAnswer]:
+        """Jawaban template untuk pola yang dikenali, selain itu None (-> LLM)"""
+        result = self._answer(snapshot, message)
+        self.stats["answered" if result else "skipped"] += 1
+        return result
+
+    def _answer(self, snapshot: CatalogSnapshot, message: str) -> Optional[CatalogAnswer]:
+        rows = snapshot.rows
+        text = message.lower()
+        if not rows or _NEEDS_LLM_RE.search(text):
+            return None
+
+        # 1. Detail paket yang disebut namanya
+        named = self._named_packages(snapshot, text)
+        if len(named) == 1:
+            row = rows[named[0]]
+            return CatalogAnswer(f"{format_package_detail(row)}\n\n{CLOSING}", "detail", [row])
+        if named:
+            chosen = sorted((rows[i] for i in named), key=lambda r: package_price(r) or 0)
+            return self._render_list(chosen, f"Ada {len(chosen)} paket yang cocok dengan nama tersebut:", "detail")
+
+        filters = parse_filters(message, rows)
+        active = filters.active()
+        candidates = apply_filters(list(range(len(rows))), rows, filters)
+        priced = sorted((i for i in candidates if package_price(rows[i]) is not None),
+                        key=lambda i: package_price(rows[i]))
+        criteria = describe_filters(filters)
+        # Filter yang dilonggarkan: sebut kriteria aslinya, hasilnya "terdekat"
+        note = f"Belum ada paket yang persis sesuai kriteria ({criteria}).\n\n" if filters.relaxed else ""
+        suffix = f" ({criteria})" if criteria and not filters.relaxed else ""
+
+        # 2. Termurah / termahal (di antara paket yang lolos filter)
+        cheapest, priciest = bool(_CHEAPEST_RE.search(text)), bool(_PRICIEST_RE.search(text))
+        if (cheapest or priciest) and not (cheapest and priciest) and priced:
+            row = rows[priced[0] if cheapest else priced[-1]]
+            kind, label = ("cheapest", "termurah") if cheapest else ("priciest", "termahal")
+            lead = (f"{note}Paket {label}{suffix} saat ini adalah *{row['name']}* dengan harga "
+                    f"{format_rupiah(row['price'])}.")
+            return CatalogAnswer(f"{lead}\n\n{format_package(row)}\n\n{CLOSING}", kind, [row])
+        if cheapest or priciest:
+            return None
+
+        # 3. Paket sesuai kriteria (diurutkan dari harga terendah)
+        if active:
+            chosen = [rows[i] for i in priced] + [rows[i] for i in candidates if package_price(rows[i]) is None]
+            if filters.relaxed:
+                header = f"{note}Berikut {len(chosen)} paket terdekat:"
+            else:
+                header = f"Berikut {len(chosen)} paket yang sesuai kriteria Anda{suffix}:"
+            return self._render_list(chosen, header, "filtered")
+
+        # 4. Daftar semua paket: hanya bila memang diminta daftar / harga paket
+        if _LIST_RE.search(text) or (_PACKAGE_PRICE_RE.search(text) and not _NOT_PACKAGE_RE.search(text)):
+            header = f"Berikut paket yang tersedia saat ini ({len(rows)} paket):"
+            return self._render_list(list(rows), header, "list")
+        return None
+
+
+catalog_answerer = CatalogAnswerer()
@@ -0,0 +1,270 @@
+# module_1_chatbot/app/catalog_cache.py
+"""
+Cache katalog paket dua tingkat:
+1. snapshot terstruktur in-process (baris tabel packages),
+2. snapshot JSON bersama di Redis (dibaca juga oleh module_2_packages_reviews).
+
+- Single-flight: dalam satu worker hanya satu refresh berjalan; antar worker
+  dikoordinasikan dengan lock Redis (SET NX) sehingga hanya satu yang query
+  Postgres, sisanya menunggu snapshot Redis baru.
+- Stale-while-revalidate: snapshot yang lewat CATALOG_FRESH_SEC tetap
+  dilayani sementara refresh berjalan di background.
+- Push invalidation: module_2 mem-publish ke channel CATALOG_CHANNEL setiap
+  kali paket ditulis; snapshot lokal langsung ditandai tidak valid.
+- Generasi invalidasi: publisher menaikkan CATALOG_GENERATION_KEY (INCR) dan
+  mengirim nilainya di pesan pub/sub. Snapshot mencatat generasi yang dibaca
+  SEBELUM query DB, ditulis ke Redis hanya bila generasi belum berubah, dan
+  hanya dipakai bila generasinya >= generasi terakhir yang diketahui worker.
+  Invalidasi yang datang saat refresh berjalan menaikkan epoch lokal sehingga
+  hasil refresh itu tidak dianggap segar.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from .database import get_async_db
+from .metrics import cache_event
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI (format key & channel sama dengan module_2) ---
+CATALOG_SNAPSHOT_KEY = "catalog:packages:snapshot"
+CATALOG_LOCK_KEY = "catalog:packages:refresh_lock"
+CATALOG_GENERATION_KEY = "catalog:packages:generation"
+CATALOG_CHANNEL = "catalog:invalidate"
+CATALOG_FRESH_SEC = float(os.getenv("CATALOG_FRESH_SEC", "60"))
+CATALOG_STALE_SEC = float(os.getenv("CATALOG_STALE_SEC", "900"))
+CATALOG_LOCK_MS = int(os.getenv("CATALOG_LOCK_MS", "10000"))
+CATALOG_LOCK_WAIT_SEC = float(os.getenv("CATALOG_LOCK_WAIT_SEC", "2"))
+
+# Simpan snapshot hanya bila belum ada invalidasi sejak generasinya dibaca (snapshot basi tidak menimpa)
+_SET_SNAPSHOT_LUA = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+PACKAGE_COLUMNS = (
+    "package_id, name, duration, price, features, image_url, featured, description, "
+    "airline, departure_city, duration_days, hotel_info, destination, category"
+)
+
+
+@dataclass
+class CatalogSnapshot:
+    rows: List[Dict[str, Any]]
+    fetched_at: float  # epoch detik (dibandingkan antar worker)
+    version: str = ""
+    generation: int = 0  # CATALOG_GENERATION_KEY saat baris dibaca dari DB
+    epoch: int = 0  # epoch invalidasi lokal saat refresh dimulai (tidak ikut diserialisasi)
+    derived: Dict[str, Any] = field(default_factory=dict)  # turunan per versi (teks prompt, dsb)
+
+    def __post_init__(self):
+        if not self.version:
+            payload = json.dumps(self.rows, sort_keys=True, default=str).encode("utf-8")
+            self.version = hashlib.sha1(payload).hexdigest()[:12]
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def to_json(self) -> str:
+        return json.dumps({"version": self.version, "generation": self.generation, "fetched_at": self.fetched_at,
+                           "rows": self.rows}, default=str)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CatalogSnapshot":
+        data = json.loads(raw)
+        return cls(rows=data["rows"], fetched_at=data["fetched_at"], version=data["version"],
+                   generation=int(data.get("generation", 0)))
+
+
+async def load_packages_from_db() -> List[Dict[str, Any]]:
+    """Query tabel packages (sumber kebenaran) -> list of dict"""
+    async with get_async_db() as db:
+        result = await db.execute(text(f"SELECT {PACKAGE_COLUMNS} FROM packages ORDER BY package_id"))
+        return [dict(row._mapping) for row in result.fetchall()]
+
+
+class CatalogCache:
+    def __init__(self, loader: Callable[[], Awaitable[List[Dict[str, Any]]]] = load_packages_from_db,
+                 fresh_sec: float = CATALOG_FRESH_SEC, stale_sec: float = CATALOG_STALE_SEC):
+        self.loader = loader
+        self.fresh_sec = fresh_sec
+        self.stale_sec = stale_sec
+        self.redis = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._epoch = 0  # naik di setiap invalidasi (lokal maupun pub/sub)
+        self._min_generation = 0  # generasi terbaru dari pesan invalidasi
+        self._manual_invalidated_at = 0.0  # invalidasi tanpa generasi: snapshot yang dimuat sebelumnya ditolak
+        self._inflight: Optional[asyncio.Task] = None
+        self._inflight_epoch = 0
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {"local_hits": 0, "stale_served": 0, "redis_hits": 0, "db_loads": 0, "invalidations": 0}
+
+    # --- LIFECYCLE ---
+    async def start(self, redis_client):
+        self.redis = redis_client
+        if redis_client and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_invalidations())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        self.redis = None
+
+    # --- BACA SNAPSHOT ---
+    def _valid(self, snap: Optional[CatalogSnapshot]) -> bool:
+        return bool(snap) and snap.epoch >= self._epoch and snap.generation >= self._min_generation
+
+    async def get(self) -> CatalogSnapshot:
+        snap = self._snapshot
+        if self._valid(snap):
+            if snap.age < self.fresh_sec:
+                self.stats["local_hits"] += 1
+                cache_event("packages", "hit")
+                return snap
+            if snap.age < self.stale_sec:
+                # Stale-while-revalidate: layani data lama, refresh di background
+                self.stats["stale_served"] += 1
+                cache_event("packages", "stale")
+                self._start_refresh()
+                return snap
+        cache_event("packages", "miss")
+        try:
+            return await asyncio.shield(self._start_refresh())
+        except Exception as e:
+            if snap:
+                logger.error(f"❌ Refresh katalog gagal, memakai snapshot lama: {e}")
+                return snap
+            raise
+
+    def _start_refresh(self) -> asyncio.Task:
+        # Refresh yang dimulai sebelum invalidasi terakhir tidak ditunggu: hasilnya sudah basi
+        if self._inflight is None or self._inflight.done() or self._inflight_epoch < self._epoch:
+            self._inflight_epoch = self._epoch
+            self._inflight = asyncio.create_task(self._refresh())
+            self._inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._inflight
+
+    async def _read_redis(self) -> Optional[CatalogSnapshot]:
+        if not self.redis:
+            return None
+        try:
+            raw = await self.redis.get(CATALOG_SNAPSHOT_KEY)
+            return CatalogSnapshot.from_json(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal membaca snapshot katalog dari Redis: {e}")
+            return None
+
+    def _usable(self, shared: Optional[CatalogSnapshot]) -> bool:
+        # Snapshot Redis dari sebelum invalidasi terakhir (mis. SET dari refresh yang sedang jalan saat DELETE) ditolak
+        return (bool(shared) and shared.age < self.fresh_sec and shared.generation >= self._min_generation
+                and shared.fetched_at >= self._manual_invalidated_at)
+
+    async def _read_generation(self) -> int:
+        if not self.redis:
+            return self._min_generation
+        try:
+            return int(await self.redis.get(CATALOG_GENERATION_KEY) or 0)
+        except Exception:
+            return self._min_generation
+
+    async def _refresh(self) -> CatalogSnapshot:
+        epoch = self._epoch
+
+        # 1. Snapshot Redis yang masih segar (diisi worker lain)
+        shared = await self._read_redis()
+        if self._usable(shared):
+            self.stats["redis_hits"] += 1
+            return self._adopt(shared, epoch)
+
+        # 2. Hanya satu worker yang query DB; sisanya menunggu hasilnya di Redis
+        got_lock = True
+        if self.redis:
+            try:
+                got_lock = bool(await self.redis.set(CATALOG_LOCK_KEY, "1", nx=True, px=CATALOG_LOCK_MS))
+            except Exception:
+                got_lock = True
+        if not got_lock:
+            deadline = time.monotonic() + CATALOG_LOCK_WAIT_SEC
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                shared = await self._read_redis()
+                if self._usable(shared):
+                    self.stats["redis_hits"] += 1
+                    return self._adopt(shared, epoch)
+
+        try:
+            # Generasi dibaca sebelum query: baris yang dimuat mencakup semua invalidasi <= generasi ini
+            generation = await self._read_generation()
+            started = time.time()  # fetched_at = awal query: data "per" saat ini
+            rows = await self.loader()
+            self.stats["db_loads"] += 1
+            snap = CatalogSnapshot(rows=rows, fetched_at=started, generation=generation)
+            if self.redis:
+                try:
+                    await self.redis.eval(_SET_SNAPSHOT_LUA, 2, CATALOG_SNAPSHOT_KEY, CATALOG_GENERATION_KEY,
+                                          snap.to_json(), generation, int(self.stale_sec))
+                except Exception as e:
+                    logger.warning(f"⚠️ Gagal menyimpan snapshot katalog ke Redis: {e}")
+            return self._adopt(snap, epoch)
+        finally:
+            if got_lock and self.redis:
+                try:
+                    await self.redis.delete(CATALOG_LOCK_KEY)
+                except Exception:
+                    pass
+
+    def _adopt(self, snap: CatalogSnapshot, epoch: int) -> CatalogSnapshot:
+        # Refresh yang dimulai lebih baru sudah selesai duluan: jangan timpa dengan hasil lama
+        if self._snapshot and self._snapshot.epoch > epoch:
+            return self._snapshot
+        # Pertahankan data turunan bila isi katalog ternyata tidak berubah
+        if self._snapshot and self._snapshot.version == snap.version:
+            snap.derived = self._snapshot.derived
+        # Invalidasi yang datang saat refresh berjalan (epoch naik) tetap memicu refresh berikutnya
+        snap.epoch = epoch
+        self._snapshot = snap
+        return snap
+
+    # --- INVALIDASI ---
+    def invalidate(self, generation: Optional[int] = None):
+        """generation dari pesan pub/sub; tanpa generasi (manual) hanya memaksa refresh"""
+        self._epoch += 1
+        if generation is not None:
+            self._min_generation = max(self._min_generation, generation)
+        else:
+            self._manual_invalidated_at = time.time()
+        self.stats["invalidations"] += 1
+
+    async def _listen_invalidations(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        data = str(message.get("data") or "")
+                        logger.info(f"🔔 Invalidasi katalog diterima: {data}")
+                        self.invalidate(int(data) if data.isdigit() else None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Listener invalidasi katalog terputus: {e}. Mencoba lagi...")
+                await asyncio.sleep(2)
+            finally:
+                await pubsub.reset()
+
+
+catalog_cache = CatalogCache()
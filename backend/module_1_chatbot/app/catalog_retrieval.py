@@ -0,0 +1,312 @@
+# module_1_chatbot/app/catalog_retrieval.py
+"""
+Seleksi konteks katalog untuk jalur komersial.
+
+Alih-alih menempel seluruh tabel packages ke system prompt, hanya paket yang
+relevan dengan pertanyaan yang dimasukkan:
+1. filter keras dari teks pesan: rentang harga, durasi, kota keberangkatan,
+   kategori & maskapai (nilai kota/kategori/maskapai diambil dari katalog itu
+   sendiri, bukan daftar statis),
+2. filter yang membuat hasil kosong dilonggarkan satu per satu,
+3. sisa paket diurutkan dengan embedding deskripsi paket (dihitung sekali per
+   versi katalog) + sedikit bobot untuk paket featured,
+4. paket dimasukkan berurutan sampai batas token katalog tercapai.
+"""
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .catalog_cache import CatalogSnapshot
+from .embeddings import embedding_service
+from .prompt_assembly import PROMPT_BUDGET_CONTEXT, count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+# Batas token katalog = anggaran bagian konteks di prompt_assembly
+CATALOG_CONTEXT_MAX_TOKENS = int(os.getenv("CATALOG_CONTEXT_MAX_TOKENS", str(PROMPT_BUDGET_CONTEXT)))
+CATALOG_CONTEXT_MAX_PACKAGES = int(os.getenv("CATALOG_CONTEXT_MAX_PACKAGES", "8"))
+FEATURED_BOOST = 0.05
+APPROX_PRICE_MARGIN = 0.2  # "sekitar 30 juta" -> 24-36 juta
+
+EMPTY_CATALOG_TEXT = "⚠️ SAAT INI DATA PAKET KOSONG DI DATABASE."
+RELAXED_NOTE = "(Tidak ada paket yang persis sesuai kriteria; berikut paket terdekat.)\n\n"
+
+
+# --- FORMAT ---
+def format_rupiah(value: Any) -> str:
+    try:
+        return f"Rp {int(value):,}".replace(",", ".")
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def format_package(row: Dict) -> str:
+    price_fmt = format_rupiah(row['price'])
+
+    features_str = ", ".join(row['features']) if row.get('features') else "-"
+
+    return (
+        f"📦 {row['name']}\n"
+        f"   - Durasi: {row['duration']}\n"
+        f"   - Harga: {price_fmt}\n"
+        f"   - Maskapai: {row['airline']}\n"
+        f"   - Hotel/Fasilitas: {features_str}"
+    )
+
+
+def format_package_compact(row: Dict) -> str:
+    """Versi ringkas tanpa daftar fasilitas, untuk paket yang sendirian melebihi batas token"""
+    return (
+        f"📦 {row['name']}\n"
+        f"   - Durasi: {row['duration']}\n"
+        f"   - Harga: {format_rupiah(row['price'])}\n"
+        f"   - Maskapai: {row['airline']}"
+    )
+
+
+def format_packages(rows: List[Dict]) -> str:
+    """Format baris katalog menjadi teks untuk prompt"""
+    if not rows:
+        return EMPTY_CATALOG_TEXT
+    return "\n\n".join(format_package(row) for row in rows)
+
+
+def describe_package(row: Dict) -> str:
+    """Teks yang di-embed untuk ranking relevansi paket"""
+    parts = [
+        row.get("name"), row.get("category"), row.get("destination"), row.get("description"),
+        row.get("hotel_info"), row.get("airline"), row.get("departure_city"),
+        ", ".join(row.get("features") or []),
+    ]
+    return ". ".join(str(p) for p in parts if p)
+
+
+# --- PARSING FILTER DARI PESAN ---
+AMOUNT_PATTERN = r"(\d+(?:[.,]\d+)*)\s*(?:(juta|jt|ribu|rb|k)\b)?"
+_UNITS = {"juta": 1_000_000, "jt": 1_000_000, "ribu": 1_000, "rb": 1_000, "k": 1_000}
+_RANGE_RE = re.compile(rf"(?:antara|dari)?\s*(?:rp\.?\s*)?{AMOUNT_PATTERN}\s*(?:-|s/?d|sampai|hingga|sd)\s*(?:rp\.?\s*)?{AMOUNT_PATTERN}")
+_MAX_RE = re.compile(rf"(?:di ?bawah|kurang dari|maks(?:imal)?|max|budget|bujet|dana|paling mahal|under)\s*(?:rp\.?\s*)?{AMOUNT_PATTERN}")
+_MIN_RE = re.compile(rf"(?:di ?atas|lebih dari|minimal|min|mulai|paling murah)\s*(?:rp\.?\s*)?{AMOUNT_PATTERN}")
+_APPROX_RE = re.compile(rf"(?:sekitar|kisaran|kurang lebih|±)\s*(?:rp\.?\s*)?{AMOUNT_PATTERN}")
+_PLAIN_PRICE_RE = re.compile(rf"(?:rp\.?\s*)?{AMOUNT_PATTERN}")
+_DURATION_RE = re.compile(r"(\d{1,2})\s*(?:hari|hr|d\b)")
+
+
+def _to_rupiah(number: str, unit: Optional[str]) -> Optional[int]:
+    if unit:
+        cleaned = number.replace(",", ".")
+        value = float(cleaned) if cleaned.count(".") <= 1 else float(cleaned.replace(".", ""))
+        return int(value * _UNITS[unit])
+    digits = int(re.sub(r"\D", "", number) or 0)
+    # Tanpa satuan hanya dianggap harga bila berupa nominal rupiah penuh
+    return digits if digits >= 1_000_000 else None
+
+
+@dataclass
+class CatalogFilters:
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    duration_days: Optional[int] = None
+    departure_city: Optional[str] = None
+    category: Optional[str] = None
+    airline: Optional[str] = None
+    relaxed: List[str] = field(default_factory=list)  # filter yang dilepas karena hasil kosong
+
+    def active(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k != "relaxed" and v is not None}
+
+
+def _catalog_values(rows: List[Dict], column: str) -> List[str]:
+    return sorted({str(r[column]).strip() for r in rows if r.get(column)}, key=len, reverse=True)
+
+
+# Kata umum pada nama maskapai yang tidak cukup untuk mengenali maskapainya
+_AIRLINE_STOPWORDS = {"air", "airlines", "airline", "airways", "indonesia"}
+
+
+def _match_value(text: str, values: List[str], aliases=None) -> Optional[str]:
+    """Nilai katalog pertama yang muncul di pesan (nama lengkap atau alias-nya)"""
+    for value in values:
+        lower = value.lower()
+        candidates = [lower] + (aliases(lower) if aliases else [])
+        if any(c and re.search(rf"\b{re.escape(c)}\b", text) for c in candidates):
+            return value
+    return None
+
+
+def _city_aliases(value: str) -> List[str]:
+    # "Jakarta (CGK)" -> "jakarta"
+    head = re.split(r"[\s(/,-]", value)[0]
+    return [head] if len(head) >= 4 else []
+
+
+def _airline_aliases(value: str) -> List[str]:
+    # "Garuda Indonesia" -> "garuda", "Lion Air" -> "lion"
+    core = " ".join(w for w in value.split() if w not in _AIRLINE_STOPWORDS)
+    return [core] if len(core) >= 4 else []
+
+
+def parse_filters(message: str, rows: List[Dict]) -> CatalogFilters:
+    text = message.lower()
+    filters = CatalogFilters()
+
+    if match := _RANGE_RE.search(text):
+        unit = match.group(4) or match.group(2)
+        low, high = _to_rupiah(match.group(1), match.group(2) or unit), _to_rupiah(match.group(3), unit)
+        if low and high:
+            filters.min_price, filters.max_price = min(low, high), max(low, high)
+    if filters.max_price is None and (match := _MAX_RE.search(text)):
+        filters.max_price = _to_rupiah(match.group(1), match.group(2))
+    if filters.min_price is None and (match := _MIN_RE.search(text)):
+        filters.min_price = _to_rupiah(match.group(1), match.group(2))
+    if filters.min_price is None and filters.max_price is None:
+        match = _APPROX_RE.search(text) or next(
+            (m for m in _PLAIN_PRICE_RE.finditer(text) if m.group(2) == "juta" or m.group(2) == "jt"), None
+        )
+        price = _to_rupiah(match.group(1), match.group(2)) if match else None
+        if price:
+            filters.min_price = int(price * (1 - APPROX_PRICE_MARGIN))
+            filters.max_price = int(price * (1 + APPROX_PRICE_MARGIN))
+
+    if match := _DURATION_RE.search(text):
+        filters.duration_days = int(match.group(1))
+
+    filters.departure_city = _match_value(text, _catalog_values(rows, "departure_city"), _city_aliases)
+    filters.category = _match_value(text, _catalog_values(rows, "category"))
+    filters.airline = _match_value(text, _catalog_values(rows, "airline"), _airline_aliases)
+    return filters
+
+
+# --- FILTER & RANKING ---
+def package_price(row: Dict) -> Optional[int]:
+    try:
+        return int(row.get("price"))
+    except (TypeError, ValueError):
+        return None
+
+
+_PREDICATES = {
+    "min_price": lambda row, v: (package_price(row) or 0) >= v,
+    "max_price": lambda row, v: package_price(row) is not None and package_price(row) <= v,
+    "duration_days": lambda row, v: row.get("duration_days") == v or bool(re.search(rf"\b{v}\b", str(row.get("duration") or ""))),
+    "departure_city": lambda row, v: str(row.get("departure_city") or "").lower() == v.lower(),
+    "category": lambda row, v: str(row.get("category") or "").lower() == v.lower(),
+    "airline": lambda row, v: str(row.get("airline") or "").lower() == v.lower(),
+}
+# Urutan pelonggaran: atribut paling "lunak" dilepas lebih dulu
+_RELAX_ORDER = ("airline", "category", "departure_city", "duration_days", "min_price", "max_price")
+
+
+def apply_filters(indices: List[int], rows: List[Dict], filters: CatalogFilters) -> List[int]:
+    active = filters.active()
+    while True:
+        selected = [i for i in indices if all(_PREDICATES[k](rows[i], v) for k, v in active.items())]
+        if selected or not active:
+            return selected
+        name = next(k for k in _RELAX_ORDER if k in active)
+        active.pop(name)
+        filters.relaxed.append(name)
+
+
+@dataclass
+class CatalogSelection:
+    text: str
+    rows: List[Dict]
+    total: int
+    filters: CatalogFilters
+    tokens: int
+    truncated: bool
+
+
+class CatalogRetriever:
+    def __init__(self, max_tokens: int = CATALOG_CONTEXT_MAX_TOKENS, max_packages: int = CATALOG_CONTEXT_MAX_PACKAGES):
+        self.max_tokens = max_tokens
+        self.max_packages = max_packages
+        self._embed_lock = asyncio.Lock()
+        self.stats = {"selections": 0, "rows_selected": 0, "rows_total": 0, "truncated": 0, "relaxed": 0}
+
+    @staticmethod
+    def _blocks(snapshot: CatalogSnapshot) -> List[Tuple[str, int]]:
+        """Teks per paket + perkiraan tokennya, dihitung sekali per versi katalog"""
+        if "package_blocks" not in snapshot.derived:
+            blocks = [format_package(row) for row in snapshot.rows]
+            snapshot.derived["package_blocks"] = [(b, count_tokens(b)) for b in blocks]
+        return snapshot.derived["package_blocks"]
+
+    async def _package_embeddings(self, snapshot: CatalogSnapshot) -> Optional[np.ndarray]:
+        if "package_embeddings" in snapshot.derived:
+            return snapshot.derived["package_embeddings"]
+        # Single-flight: request bersamaan tidak meng-embed katalog berkali-kali
+        async with self._embed_lock:
+            if "package_embeddings" not in snapshot.derived:
+                try:
+                    texts = [describe_package(row) for row in snapshot.rows]
+                    snapshot.derived["package_embeddings"] = await embedding_service.aembed_documents(texts)
+                    logger.info(f"✅ Embedding {len(texts)} paket katalog versi {snapshot.version} dihitung.")
+                except Exception as e:
+                    logger.error(f"❌ Gagal embedding katalog: {e}")
+                    snapshot.derived["package_embeddings"] = None
+        return snapshot.derived["package_embeddings"]
+
+    async def _rank(self, snapshot: CatalogSnapshot, indices: List[int], query_embedding) -> List[int]:
+        rows = snapshot.rows
+        featured = np.array([1.0 if rows[i].get("featured") else 0.0 for i in indices], dtype=np.float32)
+        scores = featured * FEATURED_BOOST
+        if query_embedding is not None and len(indices) > 1:
+            matrix = await self._package_embeddings(snapshot)
+            if matrix is not None and len(matrix) == len(rows):
+                query = np.asarray(query_embedding, dtype=np.float32).ravel()
+                scores = scores + matrix[indices] @ query
+        order = np.argsort(-scores, kind="stable")
+        return [indices[i] for i in order]
+
+    async def select(self, snapshot: CatalogSnapshot, message: str, query_embedding=None) -> CatalogSelection:
+        rows = snapshot.rows
+        filters = parse_filters(message, rows)
+        if not rows:
+            return CatalogSelection(EMPTY_CATALOG_TEXT, [], 0, filters, count_tokens(EMPTY_CATALOG_TEXT), False)
+
+        candidates = apply_filters(list(range(len(rows))), rows, filters)
+        ranked = await self._rank(snapshot, candidates, query_embedding)
+
+        blocks = self._blocks(snapshot)
+        # Batas keras token katalog: sisihkan tempat untuk catatan di awal/akhir teks
+        count_note = f"\n\n(Menampilkan {len(candidates)} dari {len(candidates)} paket yang sesuai.)"
+        budget = self.max_tokens - count_tokens(count_note) - (count_tokens(RELAXED_NOTE) if filters.relaxed else 0)
+        chosen, parts, tokens = [], [], 0
+        for i in ranked[: self.max_packages]:
+            text, cost = blocks[i]
+            if not parts and cost > budget:
+                # Paket pertama selalu masuk, tapi diringkas / dipotong agar tetap di bawah batas
+                text = truncate_tokens(format_package_compact(rows[i]), max(budget, 1))
+                cost = count_tokens(text)
+            elif tokens + cost + 1 > budget:  # +1: pemisah antar paket
+                break
+            chosen.append(rows[i])
+            parts.append(text)
+            tokens += cost + 1
+
+        truncated = len(chosen) < len(candidates)
+        text = "\n\n".join(parts)
+        if truncated:
+            text += f"\n\n(Menampilkan {len(chosen)} dari {len(candidates)} paket yang sesuai.)"
+        if filters.relaxed:
+            text = RELAXED_NOTE + text
+        # Pengaman terakhir (hitungan token teks gabungan bisa sedikit beda dari jumlah per bagian)
+        text = truncate_tokens(text, self.max_tokens)
+
+        self.stats["selections"] += 1
+        self.stats["rows_selected"] += len(chosen)
+        self.stats["rows_total"] += len(rows)
+        self.stats["truncated"] += int(truncated)
+        self.stats["relaxed"] += int(bool(filters.relaxed))
+        return CatalogSelection(text, chosen, len(rows), filters, count_tokens(text), truncated)
+
+
+catalog_retriever = CatalogRetriever()
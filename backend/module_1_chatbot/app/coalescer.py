@@ -0,0 +1,201 @@
+# module_1_chatbot/app/coalescer.py
+"""
+Lapisan di depan get_ai_response / stream_ai_response:
+
+1. Single-flight: pesan identik (user_id + teks ternormalisasi) yang masih
+   diproses -- retry WhatsApp / double-send widget -- menunggu hasil yang
+   sama, tidak menjalankan pipeline (LLM, simpan history, state eskalasi)
+   kedua kalinya. Hasil disimpan sebentar (CHAT_DEDUP_GRACE_SEC) untuk retry
+   yang datang tepat setelah jawaban selesai.
+2. Serialisasi per user: pesan berbeda dari user yang sama diproses satu per
+   satu sesuai urutan datang (FIFO), sehingga history & state tidak balapan.
+   Antrean per user dibatasi CHAT_USER_MAX_PENDING.
+3. Admission global: maksimal CHAT_MAX_INFLIGHT giliran berjalan bersamaan
+   per worker; sisanya antre (maks CHAT_MAX_WAITING, tunggu maks
+   CHAT_ADMISSION_TIMEOUT_SEC). Di luar itu request ditolak (ChatOverloaded
+   -> HTTP 503) alih-alih menumpuk panggilan LLM saat provider melambat.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Tuple
+
+from .metrics import CHAT_ADMISSION, CHAT_INFLIGHT
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+CHAT_MAX_INFLIGHT = int(os.getenv("CHAT_MAX_INFLIGHT", "32"))
+CHAT_MAX_WAITING = int(os.getenv("CHAT_MAX_WAITING", "64"))
+CHAT_ADMISSION_TIMEOUT_SEC = float(os.getenv("CHAT_ADMISSION_TIMEOUT_SEC", "5"))
+CHAT_USER_MAX_PENDING = int(os.getenv("CHAT_USER_MAX_PENDING", "3"))
+CHAT_DEDUP_GRACE_SEC = float(os.getenv("CHAT_DEDUP_GRACE_SEC", "2"))
+CHAT_RETRY_AFTER_SEC = int(os.getenv("CHAT_RETRY_AFTER_SEC", "2"))
+
+
+class ChatOverloaded(RuntimeError):
+    """Request ditolak oleh admission control (dijawab 503 + Retry-After)"""
+
+
+@dataclass
+class _UserQueue:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)  # asyncio.Lock adil (FIFO)
+    pending: int = 0
+
+
+def dedup_key(user_id: str, message: str) -> Tuple[str, str]:
+    return user_id, " ".join(message.split()).lower()
+
+
+class ChatCoalescer:
+    def __init__(self, max_inflight: int = CHAT_MAX_INFLIGHT, max_waiting: int = CHAT_MAX_WAITING,
+                 admission_timeout: float = CHAT_ADMISSION_TIMEOUT_SEC,
+                 user_max_pending: int = CHAT_USER_MAX_PENDING, dedup_grace: float = CHAT_DEDUP_GRACE_SEC):
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.admission_timeout = admission_timeout
+        self.user_max_pending = user_max_pending
+        self.dedup_grace = dedup_grace
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._users: Dict[str, _UserQueue] = {}
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.stats = {"admitted": 0, "deduplicated": 0, "shed_global": 0, "shed_user": 0}
+
+    # --- ADMISSION GLOBAL ---
+    def saturated(self) -> bool:
+        """True bila request baru pasti ditolak (slot & antrean penuh)"""
+        return self._active >= self.max_inflight and len(self._waiters) >= self.max_waiting
+
+    def _shed(self, kind: str, reason: str):
+        self.stats[kind] += 1
+        CHAT_ADMISSION.labels(kind).inc()
+        raise ChatOverloaded(reason)
+
+    async def _admit(self):
+        if self._active < self.max_inflight and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_waiting:
+                self._shed("shed_global", f"antrean chat penuh ({self.max_waiting})")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # Slot dioper langsung oleh _release (self._active tidak berubah)
+                await asyncio.wait_for(waiter, self.admission_timeout)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # slot sudah dioper tepat saat timeout/pembatalan
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._shed("shed_global", f"menunggu slot chat > {self.admission_timeout:.0f}s")
+                raise
+        self.stats["admitted"] += 1
+        CHAT_ADMISSION.labels("admitted").inc()
+        CHAT_INFLIGHT.set(self._active)
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+        CHAT_INFLIGHT.set(self._active)
+
+    @asynccontextmanager
+    async def _slot(self, user_id: str):
+        """Urutan per user dulu, baru slot global (pesan yang antre tidak memegang slot)"""
+        queue = self._users.setdefault(user_id, _UserQueue())
+        if queue.pending >= self.user_max_pending:
+            self._shed("shed_user", f"terlalu banyak pesan tertunda dari {user_id}")
+        queue.pending += 1
+        try:
+            async with queue.lock:
+                await self._admit()
+                try:
+                    yield
+                finally:
+                    self._release()
+        finally:
+            queue.pending -= 1
+            if queue.pending == 0 and self._users.get(user_id) is queue:
+                del self._users[user_id]
+
+    # --- SINGLE-FLIGHT ---
+    def _forget_later(self, key: Tuple[str, str], future: asyncio.Future):
+        def forget():
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        if self.dedup_grace > 0 and not future.cancelled() and future.exception() is None:
+            asyncio.get_running_loop().call_later(self.dedup_grace, forget)
+        else:
+            forget()
+
+    def _follow(self, key: Tuple[str, str]):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+            CHAT_ADMISSION.labels("deduplicated").inc()
+        return future
+
+    async def run(self, user_id: str, message: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Jalankan fn() (satu giliran get_ai_response) lewat single-flight + serialisasi + admission"""
+        key = dedup_key(user_id, message)
+        future = self._follow(key)
+        if future is None:
+            async def execute() -> Dict:
+                async with self._slot(user_id):
+                    return await fn()
+
+            # Task terpisah: bila request pertama dibatalkan, pengikutnya tetap mendapat hasil
+            future = asyncio.ensure_future(execute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget_later(key, f))
+        return await asyncio.shield(future)
+
+    async def stream(self, user_id: str, message: str,
+                     start: Callable[[], AsyncIterator[Dict]]) -> AsyncIterator[Dict]:
+        """Versi streaming: duplikat menerima jawaban final sebagai satu token + event akhir"""
+        key = dedup_key(user_id, message)
+        future = self._follow(key)
+        if future is not None:
+            result = await asyncio.shield(future)
+            yield {"type": "token", "text": result["response"]}
+            yield {**result, "type": result.get("type", "done")}
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._forget_later(key, f))
+        try:
+            async with self._slot(user_id):
+                async for event in start():
+                    if event["type"] != "token":
+                        future.set_result(event)
+                    yield event
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e if isinstance(e, Exception) else ConnectionError("stream dibatalkan"))
+            raise
+        finally:
+            if not future.done():
+                future.set_exception(ConnectionError("stream berakhir tanpa hasil"))
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "inflight": self._active,
+            "waiting": len(self._waiters),
+            "users_queued": len(self._users),
+            "max_inflight": self.max_inflight,
+            "max_waiting": self.max_waiting,
+        }
+
+
+chat_coalescer = ChatCoalescer()
@@ -0,0 +1,199 @@
+# module_1_chatbot/app/conversation_store.py
+"""
+State percakapan per user dalam SATU hash Redis `conv:{user_id}`:
+- history     : JSON list pesan {"role", "content"} (maks HISTORY_MAX_TURNS giliran)
+- state       : state eskalasi (AWAITING_CONFIRM / AWAITING_CONTACT)
+- escalation  : JSON payload eskalasi (pesan asli, alasan)
+- state_until : epoch detik kedaluwarsa state eskalasi
+- summary     : ringkasan berjalan giliran yang sudah keluar dari history
+- version     : naik setiap save_turn (HINCRBY); snapshot yang dimuat jauh
+                sebelum dipakai (prefetch /chat/batch) dicek dengan is_current
+
+Satu giliran chat = satu HGETALL untuk membaca + satu EVALSHA (Lua) untuk
+menyimpan. Script Lua menambah history, memangkasnya, mengubah state dan
+memperpanjang TTL secara atomik, sehingga dua pesan beruntun dari user yang
+sama tidak saling menimpa history-nya.
+"""
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .metrics import cache_event
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+CONV_KEY_PREFIX = "conv:"
+HISTORY_MAX_TURNS = 4
+ESCALATION_EXPIRE_SEC = 900
+CONV_TTL_SEC = int(os.getenv("CONV_TTL_SEC", str(7 * 24 * 3600)))
+
+# Mode perubahan state saat save_turn
+STATE_KEEP = "keep"
+STATE_SET = "set"
+STATE_CLEAR = "clear"
+
+# KEYS[1] = conv:{user_id}
+# ARGV = user_msg_json, ai_msg_json, max_items, ttl, state_mode, state, escalation_json, state_until, summary
+SAVE_TURN_LUA = """
+local raw = redis.call('HGET', KEYS[1], 'history')
+local history = {}
+if raw then
+  history = cjson.decode(raw)
+end
+table.insert(history, cjson.decode(ARGV[1]))
+table.insert(history, cjson.decode(ARGV[2]))
+local max_items = tonumber(ARGV[3])
+while #history > max_items do
+  table.remove(history, 1)
+end
+redis.call('HSET', KEYS[1], 'history', cjson.encode(history))
+if ARGV[9] ~= '' then
+  redis.call('HSET', KEYS[1], 'summary', ARGV[9])
+end
+
+local mode = ARGV[5]
+if mode == 'set' then
+  redis.call('HSET', KEYS[1], 'state', ARGV[6], 'state_until', ARGV[8])
+  if ARGV[7] ~= '' then
+    redis.call('HSET', KEYS[1], 'escalation', ARGV[7])
+  end
+elseif mode == 'clear' then
+  redis.call('HDEL', KEYS[1], 'state', 'state_until', 'escalation')
+end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return #history
+"""
+
+
+@dataclass
+class Conversation:
+    history: List[Dict[str, str]] = field(default_factory=list)
+    state: Optional[str] = None
+    escalation: Dict[str, Any] = field(default_factory=dict)
+    summary: str = ""
+    version: int = 0  # field `version` hash saat dimuat (0 = belum ada)
+
+
+class ConversationStore:
+    def __init__(self, max_turns: int = HISTORY_MAX_TURNS, ttl_sec: int = CONV_TTL_SEC,
+                 state_ttl_sec: int = ESCALATION_EXPIRE_SEC):
+        self.max_items = max_turns * 2
+        self.ttl_sec = ttl_sec
+        self.state_ttl_sec = state_ttl_sec
+        self.redis = None
+        self._save_script = None
+
+    # --- LIFECYCLE ---
+    def start(self, redis_client):
+        self.redis = redis_client
+        self._save_script = redis_client.register_script(SAVE_TURN_LUA) if redis_client else None
+
+    def stop(self):
+        self.redis = None
+        self._save_script = None
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"{CONV_KEY_PREFIX}{user_id}"
+
+    # --- BACA (1 round trip) ---
+    async def load(self, user_id: str) -> Conversation:
+        if not self.redis:
+            return Conversation()
+        try:
+            raw = await self.redis.hgetall(self.key(user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal membaca percakapan {user_id}: {e}")
+            cache_event("history", "error")
+            return Conversation()
+        return self._parse(raw)
+
+    async def load_many(self, user_ids: List[str], chunk_size: int = 500) -> Dict[str, Conversation]:
+        """Banyak user sekaligus (HGETALL dipipeline per chunk), dipakai /chat/batch"""
+        if not self.redis or not user_ids:
+            return {}
+        convs: Dict[str, Conversation] = {}
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id in chunk:
+                    pipe.hgetall(self.key(user_id))
+                raws = await pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Gagal membaca {len(chunk)} percakapan sekaligus: {e}")
+                cache_event("history", "error")
+                continue
+            convs.update((user_id, self._parse(raw)) for user_id, raw in zip(chunk, raws))
+        return convs
+
+    async def is_current(self, user_id: str, conv: Conversation) -> bool:
+        """True bila belum ada giliran baru tersimpan sejak `conv` dimuat (1 HGET)"""
+        if not self.redis:
+            return True
+        try:
+            return int(await self.redis.hget(self.key(user_id), "version") or 0) == conv.version
+        except Exception:
+            return False
+
+    @staticmethod
+    def _parse(raw: Dict[str, str]) -> Conversation:
+        conv = Conversation()
+        try:
+            conv.history = json.loads(raw["history"]) if raw.get("history") else []
+        except ValueError:
+            conv.history = []
+        conv.summary = raw.get("summary") or ""
+        conv.version = int(raw.get("version") or 0)
+        cache_event("history", "hit" if conv.history else "miss")
+        # State eskalasi punya umur sendiri (15 menit) di dalam TTL hash
+        if raw.get("state") and float(raw.get("state_until") or 0) > time.time():
+            conv.state = raw["state"]
+            try:
+                conv.escalation = json.loads(raw["escalation"]) if raw.get("escalation") else {}
+            except ValueError:
+                conv.escalation = {}
+        return conv
+
+    def evicted_by_next_save(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Pesan tertua yang akan terpangkas saat giliran berikutnya disimpan"""
+        overflow = len(history) + 2 - self.max_items
+        return history[:overflow] if overflow > 0 else []
+
+    # --- SIMPAN (1 round trip, atomik) ---
+    async def save_turn(self, user_id: str, user_message: str, ai_message: str,
+                        state_mode: str = STATE_KEEP, state: Optional[str] = None,
+                        escalation: Optional[Dict] = None, summary: Optional[str] = None):
+        """
+        Tambah satu giliran ke history dan ubah state eskalasi sekaligus.
+        state_mode: STATE_KEEP (tidak diubah), STATE_SET (set `state`, payload
+        `escalation` bila diberikan) atau STATE_CLEAR (hapus state & payload).
+        summary: ringkasan berjalan baru (None = tidak diubah).
+        """
+        if not self._save_script:
+            return
+        try:
+            await self._save_script(
+                keys=[self.key(user_id)],
+                args=[
+                    json.dumps({"role": "user", "content": user_message}),
+                    json.dumps({"role": "assistant", "content": ai_message}),
+                    self.max_items,
+                    self.ttl_sec,
+                    state_mode,
+                    state or "",
+                    json.dumps(escalation) if escalation else "",
+                    int(time.time() + self.state_ttl_sec),
+                    summary or "",
+                ],
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal menyimpan percakapan {user_id}: {e}")
+
+
+conversation_store = ConversationStore()
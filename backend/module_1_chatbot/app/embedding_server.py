@@ -0,0 +1,342 @@
+# module_1_chatbot/app/embedding_server.py
+"""
+Proses embedding bersama untuk semua worker uvicorn.
+
+Model SentenceTransformer (beserta torch) hanya dimuat SEKALI di proses ini;
+worker API menghubunginya lewat Unix socket (EMBEDDING_BACKEND=remote, lihat
+embeddings.py). Permintaan encode yang datang bersamaan dikumpulkan menjadi
+micro-batch: batch ditutup saat mencapai EMBED_MAX_BATCH teks atau setelah
+EMBED_MAX_WAIT_MS sejak permintaan pertama. Antrean dibatasi
+(EMBED_QUEUE_MAX); bila penuh, permintaan langsung ditolak (OVERLOADED)
+alih-alih menumpuk latensi.
+
+    python -m app.embedding_server --socket /run/embedding/embedding.sock
+
+Protokol (satu koneksi bisa membawa banyak request sekaligus / pipelined):
+  request  : header !II  (request_id, panjang payload) + payload JSON
+             {"texts": [...]} atau {"op": "ping"}
+  response : header !IBII (request_id, status, dim, panjang body) + body
+             status OK   -> body float32 (baris x dim) atau JSON (ping)
+             status lain -> body pesan error UTF-8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "/tmp/chatbot-embedding.sock")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_QUEUE_MAX = int(os.getenv("EMBED_QUEUE_MAX", "256"))
+EMBEDDING_REMOTE_TIMEOUT_SEC = float(os.getenv("EMBEDDING_REMOTE_TIMEOUT_SEC", "5"))
+
+# --- PROTOKOL ---
+REQUEST_HEADER = struct.Struct("!II")
+RESPONSE_HEADER = struct.Struct("!IBII")
+MAX_PAYLOAD = 8 * 1024 * 1024
+
+STATUS_OK = 0
+STATUS_OVERLOADED = 1
+STATUS_ERROR = 2
+
+
+class EmbeddingOverloaded(RuntimeError):
+    """Antrean server embedding penuh (backpressure)"""
+
+
+# --- MICRO-BATCHING ---
+@dataclass
+class _Pending:
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = EMBED_MAX_BATCH,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS, max_queue: int = EMBED_QUEUE_MAX):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: "asyncio.Queue[_Pending]" = asyncio.Queue(maxsize=max_queue)
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "rejected": 0, "errors": 0,
+                      "max_batch_seen": 0, "queue_wait_ms_total": 0.0, "encode_ms_total": 0.0}
+
+    def submit(self, texts: List[str]) -> asyncio.Future:
+        """Masukkan ke antrean; EmbeddingOverloaded bila antrean penuh"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(_Pending(texts, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise EmbeddingOverloaded(f"antrean embedding penuh ({self.queue.maxsize})")
+        return future
+
+    async def _collect(self) -> List[_Pending]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        size = len(batch[0].texts)
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            # Yang sudah mengantre diambil tanpa menunggu; sisanya ditunggu sampai deadline
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self._collect()
+            texts = [t for item in batch for t in item.texts]
+            started = time.perf_counter()
+            try:
+                # Satu thread inferensi: batch berikutnya dikumpulkan selama batch ini berjalan
+                vectors = await asyncio.to_thread(self.encode, texts)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ Encode batch {len(texts)} teks gagal: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+
+            s = self.stats
+            s["requests"] += len(batch)
+            s["texts"] += len(texts)
+            s["batches"] += 1
+            s["max_batch_seen"] = max(s["max_batch_seen"], len(texts))
+            s["encode_ms_total"] += (time.perf_counter() - started) * 1000
+            offset = 0
+            for item in batch:
+                s["queue_wait_ms_total"] += (started - item.enqueued_at) * 1000
+                if not item.future.done():
+                    item.future.set_result(vectors[offset:offset + len(item.texts)])
+                offset += len(item.texts)
+
+    def snapshot(self) -> Dict:
+        s = self.stats
+        return {
+            **{k: v for k, v in s.items() if not k.endswith("_total")},
+            "queue_depth": self.queue.qsize(),
+            "avg_batch_texts": round(s["texts"] / s["batches"], 2) if s["batches"] else 0.0,
+            "avg_queue_wait_ms": round(s["queue_wait_ms_total"] / s["requests"], 2) if s["requests"] else 0.0,
+            "avg_encode_ms": round(s["encode_ms_total"] / s["batches"], 2) if s["batches"] else 0.0,
+        }
+
+
+# --- SERVER ---
+class EmbeddingServer:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], model_name: str, path: str = EMBEDDING_SOCKET,
+                 **batcher_kwargs):
+        self.path = path
+        self.model_name = model_name
+        self.batcher = MicroBatcher(encode, **batcher_kwargs)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # socket sisa proses sebelumnya
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info(f"✅ Server embedding '{self.model_name}' siap di {self.path} "
+                    f"(batch<={self.batcher.max_batch}, wait<={self.batcher.max_wait * 1000:.0f} ms).")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher_task:
+            self._batcher_task.cancel()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def reply(request_id: int, status: int, dim: int, body: bytes):
+            async with write_lock:
+                writer.write(RESPONSE_HEADER.pack(request_id, status, dim, len(body)) + body)
+                await writer.drain()
+
+        async def answer(request_id: int, future: asyncio.Future):
+            try:
+                vectors = np.ascontiguousarray(await future, dtype=np.float32)
+                await reply(request_id, STATUS_OK, vectors.shape[1] if vectors.ndim == 2 else 0, vectors.tobytes())
+            except Exception as e:
+                await reply(request_id, STATUS_ERROR, 0, str(e).encode("utf-8"))
+
+        try:
+            while True:
+                header = await reader.readexactly(REQUEST_HEADER.size)
+                request_id, length = REQUEST_HEADER.unpack(header)
+                if length > MAX_PAYLOAD:
+                    await reply(request_id, STATUS_ERROR, 0, b"payload terlalu besar")
+                    break
+                payload = json.loads(await reader.readexactly(length))
+                if payload.get("op") == "ping":
+                    info = {"model": self.model_name, "pid": os.getpid(), **self.batcher.snapshot()}
+                    await reply(request_id, STATUS_OK, 0, json.dumps(info).encode("utf-8"))
+                    continue
+                texts = payload.get("texts") or []
+                try:
+                    future = self.batcher.submit(texts)
+                except EmbeddingOverloaded as e:
+                    await reply(request_id, STATUS_OVERLOADED, 0, str(e).encode("utf-8"))
+                    continue
+                # Jawaban dikirim saat batch-nya selesai (bisa tidak berurutan, dicocokkan lewat request_id)
+                task = asyncio.create_task(answer(request_id, future))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # klien menutup koneksi
+        except Exception as e:
+            logger.warning(f"⚠️ Koneksi embedding ditutup: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+
+# --- KLIEN (dipakai worker API lewat embeddings.py) ---
+class EmbeddingClient:
+    """Satu koneksi Unix socket per worker; request di-pipeline & dicocokkan lewat request_id"""
+
+    def __init__(self, path: str = EMBEDDING_SOCKET, timeout: float = EMBEDDING_REMOTE_TIMEOUT_SEC):
+        self.path = path
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _ensure_connected(self):
+        if self.connected:
+            return
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), self.timeout
+            )
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        error: Exception = ConnectionError("koneksi server embedding terputus")
+        try:
+            while True:
+                header = await reader.readexactly(RESPONSE_HEADER.size)
+                request_id, status, dim, length = RESPONSE_HEADER.unpack(header)
+                body = await reader.readexactly(length) if length else b""
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue  # pemanggil sudah timeout
+                future.set_result((status, dim, body))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = ConnectionError(f"koneksi server embedding terputus: {e!r}")
+        finally:
+            if self._writer:
+                self._writer.close()
+                self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _call(self, payload: Dict) -> Tuple[int, int, bytes]:
+        await self._ensure_connected()
+        self._next_id = (self._next_id + 1) % 2**32
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        try:
+            self._writer.write(REQUEST_HEADER.pack(request_id, len(data)) + data)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        status, dim, body = await self._call({"texts": texts})
+        if status == STATUS_OVERLOADED:
+            raise EmbeddingOverloaded(body.decode("utf-8", "replace"))
+        if status != STATUS_OK:
+            raise RuntimeError(f"server embedding error: {body.decode('utf-8', 'replace')}")
+        return np.frombuffer(body, dtype=np.float32).reshape(len(texts), dim)
+
+    async def ping(self) -> Dict:
+        status, _, body = await self._call({"op": "ping"})
+        if status != STATUS_OK:
+            raise RuntimeError(body.decode("utf-8", "replace"))
+        return json.loads(body)
+
+    async def close(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+
+def main():
+    from .embeddings import EmbeddingService, EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Server embedding bersama (Unix socket, micro-batching)")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET)
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--max-batch", type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_MAX_WAIT_MS)
+    parser.add_argument("--max-queue", type=int, default=EMBED_QUEUE_MAX)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    service = EmbeddingService(model_name=args.model)
+    service.embed_documents(["warmup"])  # muat model & inisialisasi torch sebelum menerima koneksi
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return service.embed_documents(texts, batch_size=args.max_batch)
+
+    server = EmbeddingServer(encode, args.model, args.socket, max_batch=args.max_batch,
+                             max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# module_1_chatbot/app/embeddings.py
+"""
+Layanan embedding tunggal: satu instance SentenceTransformer dipakai oleh
+query chatbot maupun script ingest, sehingga Chroma tidak perlu memuat
+embedding function default-nya sendiri. Embedding query disimpan di cache
+LRU (query ternormalisasi -> vektor) agar pertanyaan berulang tidak
+menjalankan inferensi lagi.
+
+EMBEDDING_BACKEND=remote: worker API tidak memuat model sama sekali; encode
+dikirim ke proses app.embedding_server (Unix socket, micro-batching) yang
+dipakai bersama oleh semua worker. Jalur sinkron (embed_documents, dipakai
+script ingest) tetap memuat model lokal.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .metrics import cache_event
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")  # local | remote
+EMBEDDING_CONNECT_WAIT_SEC = float(os.getenv("EMBEDDING_CONNECT_WAIT_SEC", "120"))
+
+
+def normalize_query(text: str) -> str:
+    """Kunci cache: huruf kecil & spasi dirapikan"""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class EmbeddingService:
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, cache_size: int = EMBEDDING_CACHE_SIZE,
+                 backend: str = EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.backend = backend
+        self._model = None
+        self._remote = None  # EmbeddingClient bila backend remote
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self):
+        """Model dimuat sekali (lazy) dan dipakai bersama"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    logger.info(f"✅ Model embedding '{self.model_name}' dimuat.")
+        return self._model
+
+    # --- LIFECYCLE ---
+    async def start(self) -> Dict:
+        """Siapkan backend: muat model lokal + warmup, atau tunggu server embedding"""
+        if self.backend != "remote":
+            await asyncio.to_thread(lambda: self.model)
+            # Satu inferensi pemanasan agar query pertama tidak membayar inisialisasi torch
+            await asyncio.to_thread(self.embed_documents, ["warmup"])
+            return {"backend": "local", "model": self.model_name}
+
+        from .embedding_server import EmbeddingClient
+        self._remote = EmbeddingClient()
+        deadline = time.monotonic() + EMBEDDING_CONNECT_WAIT_SEC
+        while True:
+            # Server bisa masih memuat model saat worker API sudah jalan
+            try:
+                info = await self._remote.ping()
+                break
+            except Exception as e:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"server embedding di {self._remote.path} tidak tersedia: {e}")
+                await asyncio.sleep(1)
+        self.model_name = info.get("model", self.model_name)
+        logger.info(f"✅ Memakai server embedding '{self.model_name}' (pid {info.get('pid')}) di {self._remote.path}.")
+        return {"backend": "remote", "model": self.model_name, "socket": self._remote.path}
+
+    async def close(self):
+        if self._remote:
+            await self._remote.close()
+            self._remote = None
+
+    def embed_documents(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """Embedding banyak dokumen sekaligus (float32, ternormalisasi L2)"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if vec is not None:
+            cache_event("query_embedding", "hit")
+        return vec
+
+    def _cache_put(self, key: str, vec: np.ndarray):
+        with self._cache_lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        key = normalize_query(text)
+        vec = self._cache_get(key)
+        if vec is not None:
+            return vec
+        with self._cache_lock:
+            self.misses += 1
+        cache_event("query_embedding", "miss")
+        vec = self.embed_documents([key])[0]
+        self._cache_put(key, vec)
+        return vec
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        """Versi async embed_documents: server embedding bila remote, selain itu thread pool"""
+        if self._remote:
+            return await self._remote.embed(texts)
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Versi async: cache hit dijawab langsung, inferensi di server embedding / thread pool"""
+        key = normalize_query(text)
+        vec = self._cache_get(key)
+        if vec is not None:
+            return vec
+        if not self._remote:
+            return await asyncio.to_thread(self.embed_query, text)
+        with self._cache_lock:
+            self.misses += 1
+        cache_event("query_embedding", "miss")
+        vec = (await self._remote.embed([key]))[0]
+        self._cache_put(key, vec)
+        return vec
+
+    async def aprefetch_queries(self, texts: List[str]) -> int:
+        """Isi cache query untuk banyak teks dengan satu inferensi batch (dipakai /chat/batch)"""
+        with self._cache_lock:
+            keys = [k for k in dict.fromkeys(normalize_query(t) for t in texts) if k and k not in self._cache]
+        if not keys:
+            return 0
+        vectors = await self.aembed_documents(keys)
+        with self._cache_lock:
+            self.misses += len(keys)
+        for key, vec in zip(keys, vectors):
+            self._cache_put(key, vec)
+        return len(keys)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "loaded": self._model is not None or bool(self._remote and self._remote.connected),
+            "cache_entries": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+embedding_service = EmbeddingService()
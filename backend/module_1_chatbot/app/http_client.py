@@ -0,0 +1,250 @@
+# module_1_chatbot/app/http_client.py
+"""
+Lapisan HTTP keluar bersama (Groq, OpenRouter, Fonnte).
+
+- satu pool koneksi persisten per host (keep-alive), ukuran pool & timeout
+  bisa diatur per host,
+- timeout connect / read / write / pool terpisah, ditambah budget total per
+  request (argumen `timeout` angka = total, dipotong ke tiap fase),
+- HTTP/2 opsional (HTTP2_ENABLED=1, butuh paket `h2`),
+- pre-warm koneksi saat startup agar request pertama tidak membayar
+  handshake TCP + TLS,
+- metrik per host lewat trace extension httpcore: koneksi baru vs reuse,
+  waktu connect/TLS, latensi sampai header respons (p50/p95), error.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI DEFAULT ---
+HTTP_CONNECT_TIMEOUT_SEC = float(os.getenv("HTTP_CONNECT_TIMEOUT_SEC", "3"))
+HTTP_READ_TIMEOUT_SEC = float(os.getenv("HTTP_READ_TIMEOUT_SEC", "30"))
+HTTP_WRITE_TIMEOUT_SEC = float(os.getenv("HTTP_WRITE_TIMEOUT_SEC", "10"))
+HTTP_POOL_TIMEOUT_SEC = float(os.getenv("HTTP_POOL_TIMEOUT_SEC", "2"))
+HTTP_TOTAL_TIMEOUT_SEC = float(os.getenv("HTTP_TOTAL_TIMEOUT_SEC", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_SEC = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SEC", "120"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0") == "1"
+HTTP_WARMUP_CONNECTIONS = int(os.getenv("HTTP_WARMUP_CONNECTIONS", "2"))
+
+
+@dataclass
+class HostConfig:
+    connect_timeout: float = HTTP_CONNECT_TIMEOUT_SEC
+    read_timeout: float = HTTP_READ_TIMEOUT_SEC
+    write_timeout: float = HTTP_WRITE_TIMEOUT_SEC
+    pool_timeout: float = HTTP_POOL_TIMEOUT_SEC
+    total_timeout: float = HTTP_TOTAL_TIMEOUT_SEC
+    max_connections: int = HTTP_MAX_CONNECTIONS
+    max_keepalive: int = HTTP_MAX_KEEPALIVE
+    keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SEC
+    http2: bool = HTTP2_ENABLED
+
+    def timeout(self, budget: Optional[float] = None) -> httpx.Timeout:
+        """Timeout per fase, tidak ada fase yang melebihi budget total"""
+        total = min(budget, self.total_timeout) if budget else self.total_timeout
+        return httpx.Timeout(
+            connect=min(self.connect_timeout, total),
+            read=min(self.read_timeout, total),
+            write=min(self.write_timeout, total),
+            pool=min(self.pool_timeout, total),
+        )
+
+
+class HostMetrics:
+    def __init__(self, window: int = 200):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.connect_sec_total = 0.0
+        self.http_versions: Dict[str, int] = {}
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def snapshot(self) -> Dict:
+        latencies = list(self.latencies)
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": max(reused, 0),
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "tls_handshakes": self.tls_handshakes,
+            "avg_connect_ms": round(self.connect_sec_total / self.new_connections * 1000, 1) if self.new_connections else None,
+            "http_versions": self.http_versions,
+            "latency_ms": {"p50": percentile(latencies, 0.5, scale=1000, ndigits=1),
+                           "p95": percentile(latencies, 0.95, scale=1000, ndigits=1)},
+        }
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """Transport pembungkus: catat koneksi baru/reuse & latensi sampai header"""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, metrics: HostMetrics):
+        self.inner = inner
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        marks: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict):
+            # Event httpcore: connection.connect_tcp.started/complete, connection.start_tls.complete, ...
+            if event_name in ("connection.connect_tcp.started", "connection.connect_tcp.complete",
+                              "connection.start_tls.complete"):
+                marks[event_name] = time.perf_counter()
+
+        request.extensions["trace"] = trace
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception:
+            self.metrics.requests += 1
+            self.metrics.errors += 1
+            raise
+
+        m = self.metrics
+        m.requests += 1
+        m.latencies.append(time.perf_counter() - started)
+        if "connection.connect_tcp.started" in marks:
+            m.new_connections += 1
+            connected = marks.get("connection.start_tls.complete") or marks.get("connection.connect_tcp.complete")
+            if connected:
+                m.connect_sec_total += connected - marks["connection.connect_tcp.started"]
+        if "connection.start_tls.complete" in marks:
+            m.tls_handshakes += 1
+        version = response.extensions.get("http_version", b"").decode() or "unknown"
+        m.http_versions[version] = m.http_versions.get(version, 0) + 1
+        return response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class OutboundHTTP:
+    """Registry AsyncClient per host; API mirip httpx (post, stream, request)"""
+
+    def __init__(self):
+        self._configs: Dict[str, HostConfig] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._metrics: Dict[str, HostMetrics] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def configure(self, url: str, config: HostConfig):
+        """Atur pool/timeout khusus untuk host dari `url` (sebelum dipakai)"""
+        self._configs[self.origin(url)] = config
+
+    def config_for(self, url: str) -> HostConfig:
+        return self._configs.setdefault(self.origin(url), HostConfig())
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None:
+            cfg = self.config_for(url)
+            http2 = cfg.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("⚠️ Paket 'h2' tidak terpasang, HTTP/2 dinonaktifkan.")
+                    http2 = False
+            metrics = self._metrics.setdefault(origin, HostMetrics())
+            transport = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=cfg.max_connections,
+                    max_keepalive_connections=cfg.max_keepalive,
+                    keepalive_expiry=cfg.keepalive_expiry,
+                ),
+            )
+            client = httpx.AsyncClient(transport=MeteredTransport(transport, metrics), timeout=cfg.timeout())
+            self._clients[origin] = client
+        return client
+
+    def _timeout(self, url: str, timeout) -> httpx.Timeout:
+        if isinstance(timeout, httpx.Timeout):
+            return timeout
+        return self.config_for(url).timeout(timeout)
+
+    # --- API REQUEST ---
+    async def request(self, method: str, url: str, *, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """`timeout` angka = budget total request (termasuk antre pool & handshake)"""
+        cfg = self.config_for(url)
+        total = min(timeout, cfg.total_timeout) if timeout else cfg.total_timeout
+        return await asyncio.wait_for(
+            self.client_for(url).request(method, url, timeout=self._timeout(url, timeout), **kwargs),
+            timeout=total,
+        )
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, *, timeout: Optional[float] = None, **kwargs):
+        """Streaming: timeout per fase (budget total dijaga pemanggil, mis. LLMRouter)"""
+        async with self.client_for(url).stream(method, url, timeout=self._timeout(url, timeout), **kwargs) as res:
+            yield res
+
+    # --- WARMUP ---
+    async def _warm_host(self, url: str, connections: int):
+        client = self.client_for(url)
+        origin = self.origin(url)
+        started = time.perf_counter()
+
+        async def touch():
+            # Status apa pun (404/405) sudah cukup: koneksi TCP+TLS tersimpan di pool
+            res = await client.request("HEAD", origin + "/", timeout=self.config_for(url).timeout(5))
+            await res.aclose()
+
+        results = await asyncio.gather(*(touch() for _ in range(connections)), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning(f"⚠️ Warmup {origin} gagal: {failed[0]!r}")
+        else:
+            logger.info(f"🔥 {connections} koneksi ke {origin} siap ({(time.perf_counter() - started) * 1000:.0f} ms).")
+
+    def start_warmup(self, urls: Iterable[str], connections: int = HTTP_WARMUP_CONNECTIONS):
+        """Pre-warm di background agar startup tidak tertahan jaringan"""
+        origins = {self.origin(u): u for u in urls if u}
+        if not origins or connections <= 0:
+            return
+        self._warmup_task = asyncio.create_task(self._warm_all(list(origins.values()), connections))
+
+    async def _warm_all(self, urls, connections: int):
+        await asyncio.gather(*(self._warm_host(u, connections) for u in urls), return_exceptions=True)
+
+    # --- OBSERVABILITAS & LIFECYCLE ---
+    def stats(self) -> Dict:
+        return {origin: metrics.snapshot() for origin, metrics in self._metrics.items()}
+
+    async def aclose(self):
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+
+# Dipakai bersama oleh rag_logic (LLM) & whatsapp_handler (Fonnte)
+outbound_http = OutboundHTTP()
@@ -0,0 +1,101 @@
+# module_1_chatbot/app/intent_router.py
+"""
+Router intent satu-lintasan untuk pesan chat.
+
+Semua keyword (custom, komersial, admin) dikompilasi menjadi satu automaton
+regex; pesan cukup di-lowercase dan dipindai sekali. Himpunan trigger custom
+yang memang ada di katalog dihitung sekali per versi teks katalog (bukan per
+pesan). Hasilnya berupa IntentResult yang dipakai ulang oleh build_prompt,
+semantic cache & deteksi eskalasi.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Tuple
+
+# --- KEYWORD ---
+# Keywords yang memicu Custom
+CUSTOM_TRIGGERS = (
+    'kustom', 'custom', 'request', 'ubah', 'ganti', 'sesuaikan',
+    'sendiri', 'private', 'rombongan', 'keluarga besar', 'diet',
+    'sakit', 'kursi roda', 'lansia', 'bayi', 'hamil',
+    'turki', 'aqsa', 'eropa', 'dubai', 'mesir',  # Destinasi non-standar
+)
+COMMERCIAL_KEYWORDS = ('paket', 'harga', 'biaya', 'tarif', 'promo', 'sedia', 'ada apa', 'list', 'daftar')
+# User minta admin: kedua kata harus muncul
+ADMIN_KEYWORDS = ('admin', 'hubun')
+
+CUSTOM = "custom"
+COMMERCIAL = "commercial"
+ADMIN = "admin"
+
+
+@dataclass(frozen=True)
+class IntentResult:
+    is_custom: bool
+    is_commercial: bool
+    wants_admin: bool
+    custom_triggers: Tuple[str, ...]  # trigger custom yang tidak ada di katalog
+    matched: FrozenSet[str]           # semua keyword yang muncul di pesan
+
+    @property
+    def is_general(self) -> bool:
+        """Jalur umum (RAG): bukan custom, bukan komersial, bukan minta admin"""
+        return not (self.is_custom or self.is_commercial or self.wants_admin)
+
+
+class IntentRouter:
+    def __init__(self, keyword_sets: Dict[str, Iterable[str]]):
+        self.labels: Dict[str, FrozenSet[str]] = {}
+        for label, keywords in keyword_sets.items():
+            for kw in keywords:
+                self.labels[kw] = self.labels.get(kw, frozenset()) | {label}
+
+        keywords = sorted(self.labels, key=len, reverse=True)
+        # Lookahead -> semua posisi dicoba (match boleh tumpang tindih);
+        # urutan terpanjang dulu -> match terpanjang di tiap posisi.
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in keywords) + "))")
+        # Keyword yang merupakan substring keyword lain ikut dianggap cocok,
+        # agar semantik sama persis dengan `kw in text`.
+        self._contained: Dict[str, FrozenSet[str]] = {
+            kw: frozenset(other for other in keywords if other != kw and other in kw) for kw in keywords
+        }
+        self.catalog_terms = lru_cache(maxsize=8)(self._catalog_terms)
+
+    def scan(self, text_lower: str) -> FrozenSet[str]:
+        found = set()
+        for match in self._pattern.finditer(text_lower):
+            kw = match.group(1)
+            if kw not in found:
+                found.add(kw)
+                found.update(self._contained[kw])
+        return frozenset(found)
+
+    def _catalog_terms(self, catalog_text: str) -> FrozenSet[str]:
+        """
+        Trigger custom yang ada di teks katalog. Di-cache per teks katalog;
+        hash str Python disimpan di objeknya, jadi teks katalog yang sama
+        (satu objek per versi snapshot) tidak pernah dipindai ulang.
+        """
+        return frozenset(kw for kw in self.scan(catalog_text.lower()) if CUSTOM in self.labels[kw])
+
+    def classify(self, message: str, catalog_text: str = "") -> IntentResult:
+        matched = self.scan(message.lower())
+        in_catalog = self.catalog_terms(catalog_text) if catalog_text else frozenset()
+        custom_hits = tuple(
+            kw for kw in CUSTOM_TRIGGERS if kw in matched and kw not in in_catalog
+        )
+        return IntentResult(
+            is_custom=bool(custom_hits),
+            is_commercial=any(COMMERCIAL in self.labels[kw] for kw in matched),
+            wants_admin=all(kw in matched for kw in ADMIN_KEYWORDS),
+            custom_triggers=custom_hits,
+            matched=matched,
+        )
+
+
+intent_router = IntentRouter({
+    CUSTOM: CUSTOM_TRIGGERS,
+    COMMERCIAL: COMMERCIAL_KEYWORDS,
+    ADMIN: ADMIN_KEYWORDS,
+})
@@ -0,0 +1,295 @@
+# module_1_chatbot/app/lexical_index.py
+"""
+Index leksikal BM25 atas chunk knowledge base (ditulis oleh
+scripts/ingest_knowledge.py di samping index NumPy, dimuat saat startup).
+
+- Tokenisasi sadar bahasa Indonesia: huruf kecil, buang stopword & kata
+  sapaan ("apa", "min", "dong", ...), samakan ejaan ("umroh" -> "umrah"), lalu stemming ringan berbasis aturan
+  (partikel -lah/-kah, posesif -nya/-ku/-mu, imbuhan me-/pe-/ber-/di-/ke-/
+  ter-/se-/per- dan akhiran -kan/-an/-i). Tanpa kamus kata dasar: yang penting
+  query & dokumen melewati stemmer yang sama.
+- Bobot BM25 tiap posting dihitung sekali saat load, sehingga satu query
+  cukup beberapa penjumlahan array NumPy (mikrodetik, tanpa model).
+- Query kata kunci pendek ("syarat paspor", "vaksin meningitis") yang semua
+  katanya muncul di dokumen teratas, semua katanya cukup langka (IDF) dan
+  dokumen teratasnya unggul jelas atas kandidat berikutnya dianggap
+  confident: retrieval tidak perlu embedding. Selain itu hasilnya difusikan dengan hasil vektor (RRF),
+  dan tetap dipakai sendiri bila model/vector store gagal dimuat.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retriever import VECTOR_INDEX_DIR, VECTOR_INDEX_RELOAD_SEC
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", VECTOR_INDEX_DIR)
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Jalur cepat: query maks N kata bermakna & semuanya ada di dokumen teratas
+LEXICAL_FAST_MAX_TERMS = int(os.getenv("LEXICAL_FAST_MAX_TERMS", "4"))
+LEXICAL_FAST_MIN_COVERAGE = float(os.getenv("LEXICAL_FAST_MIN_COVERAGE", "1.0"))
+# Tiap term harus diskriminatif: IDF 1.0 ~ muncul di < ~37% chunk ("paket" yang ada di hampir semua chunk tidak lolos)
+LEXICAL_FAST_MIN_IDF = float(os.getenv("LEXICAL_FAST_MIN_IDF", "1.0"))
+# Skor dokumen teratas harus >= rasio ini x skor kandidat pertama yang tidak ikut dikembalikan
+LEXICAL_FAST_MIN_MARGIN = float(os.getenv("LEXICAL_FAST_MIN_MARGIN", "1.15"))
+RRF_K = int(os.getenv("RRF_K", "60"))  # konstanta Reciprocal Rank Fusion
+
+LEXICAL_FILE = "lexical.json"
+
+# --- TOKENISASI & STEMMING ---
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+ada adalah agar aja akan aku anda apa apakah atau bagaimana bagi bahwa bang banget belum berapa bisa boleh bu
+bukan dan dari dengan di dia dimana dong engkau gan gimana hal harus ia ingin ini info informasi itu jika juga
+kak kakak kalau kami kamu kan kapan karena ke kenapa kok kita lah lagi maka mana mau min mohon nah nih oleh
+pada pak para perlu saja sama saya sebagai seperti sih siapa sudah supaya tanya tentang terima kasih tidak tolong
+untuk yaitu yang ya yg
+""".split())
+
+# Variasi ejaan yang umum di chat (disamakan sebelum stemming)
+SPELLING = {
+    "umroh": "umrah", "umrohnya": "umrahnya", "hajj": "haji", "mekah": "makkah", "mekkah": "makkah",
+    "makah": "makkah", "medinah": "madinah", "pasport": "paspor", "passport": "paspor",
+}
+
+# Kata sapaan/partikel yang tidak mengubah makna; satu-satunya yang dibuang dari kunci cache
+FILLER_WORDS = frozenset("""
+bang banget bu deh dong gan hai halo kak kakak kok min mohon nah nih pak sih tolong ya yah
+""".split())
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+
+
+def _strip_prefix(word: str) -> Optional[str]:
+    """Satu imbuhan depan (dengan peluluhan sederhana), None bila tidak ada"""
+    for prefix in ("meng", "peng"):
+        if word.startswith(prefix):
+            return word[4:]
+    for prefix in ("meny", "peny"):
+        if word.startswith(prefix) and word[4:5] in "aiueo":
+            return "s" + word[4:]
+    for prefix in ("mem", "pem"):
+        if word.startswith(prefix):
+            rest = word[3:]
+            return "p" + rest if rest[:1] in "aiueo" else rest
+    for prefix in ("men", "pen"):
+        if word.startswith(prefix):
+            rest = word[3:]
+            return "t" + rest if rest[:1] in "aiueo" else rest
+    for prefix in ("ber", "ter", "per"):
+        if word.startswith(prefix):
+            return word[3:]
+    for prefix in ("me", "pe"):
+        if word.startswith(prefix) and word[2:3] in "lrwy":
+            return word[2:]
+    for prefix in ("be", "di", "ke", "se"):
+        if word.startswith(prefix):
+            return word[2:]
+    return None
+
+
+@lru_cache(maxsize=50_000)
+def stem(word: str) -> str:
+    """Stemmer Indonesia ringan (gaya Nazief-Adriani tanpa kamus)"""
+    if len(word) <= 4 or word.isdigit():
+        return word
+    for suffix in _PARTICLES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    for suffix in _POSSESSIVES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    prefixed = False
+    for _ in range(2):
+        stripped = _strip_prefix(word)
+        if stripped is None or len(stripped) < 4:
+            break
+        word, prefixed = stripped, True
+    # Akhiran -i rawan ("haji", "saudi"): tanpa imbuhan depan sisa kata harus lebih panjang
+    for suffix, min_rest in (("kan", 4), ("an", 4), ("i", 4 if prefixed else 5)):
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_rest:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(SPELLING.get(t, t)) for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def cache_key(text: str) -> str:
+    """
+    Kunci exact-match semantic cache dari teks mentah ternormalisasi: huruf
+    kecil, ejaan disamakan, di-stem, urutan dipertahankan. Berbeda dengan
+    tokenize(), kata tanya & negasi ("tidak", "boleh", "kapan", "berapa")
+    TIDAK dibuang, sehingga "apa yang harus dibawa" != "apa yang tidak boleh dibawa".
+    """
+    return " ".join(stem(SPELLING.get(t, t)) for t in _TOKEN_RE.findall(text.lower()) if t not in FILLER_WORDS)
+
+
+def fuse_rankings(rankings: Sequence[Sequence[str]], k: int, rrf_k: int = RRF_K) -> List[str]:
+    """Reciprocal Rank Fusion beberapa daftar dokumen (kunci = teks chunk)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+# --- INDEX ---
+@dataclass
+class LexicalResult:
+    terms: List[str]
+    documents: List[str] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    coverage: float = 0.0  # porsi term query yang ada di dokumen teratas
+    confident: bool = False
+    key: str = ""  # cache_key(query), kunci exact-match semantic cache
+
+
+class LexicalIndex:
+    def __init__(self, index_dir: str = LEXICAL_INDEX_DIR, reload_interval: float = VECTOR_INDEX_RELOAD_SEC):
+        self.index_dir = index_dir
+        self.reload_interval = reload_interval
+        # (dokumen, postings term -> (doc_ids int32, bobot BM25 float32, idf)), ditukar sekaligus saat reload
+        self._index: Tuple[List[str], Dict[str, tuple]] = ([], {})
+        self._loaded_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "confident": 0, "no_match": 0}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.index_dir, LEXICAL_FILE)
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._index[0])
+
+    def load(self) -> Dict:
+        """Muat index dari file hasil ingest (dipanggil lifecycle saat startup)"""
+        self._maybe_reload(force=True)
+        if not self.loaded:
+            raise FileNotFoundError(f"index leksikal tidak ditemukan di {self.path}")
+        documents, postings = self._index
+        return {"chunks": len(documents), "terms": len(postings)}
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index = (data["documents"], self._weights(data))
+                self._loaded_mtime = mtime
+                logger.info(f"✅ Index leksikal BM25 dimuat: {len(data['documents'])} chunk, {len(data['postings'])} term.")
+            except Exception as e:
+                logger.error(f"❌ Gagal memuat index leksikal dari {self.path}: {e}")
+
+    @staticmethod
+    def _weights(data: Dict) -> Dict[str, tuple]:
+        """Bobot BM25 per posting dihitung sekali: idf * tf(k1+1) / (tf + k1(1-b+b*dl/avgdl))"""
+        doc_len = np.asarray(data["doc_len"], dtype=np.float32)
+        n_docs = len(doc_len)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        k1, b = data.get("k1", BM25_K1), data.get("b", BM25_B)
+        postings = {}
+        for term, pairs in data["postings"].items():
+            ids = np.fromiter((p[0] for p in pairs), dtype=np.int32, count=len(pairs))
+            tf = np.fromiter((p[1] for p in pairs), dtype=np.float32, count=len(pairs))
+            idf = math.log(1 + (n_docs - len(pairs) + 0.5) / (len(pairs) + 0.5))
+            norm = k1 * (1 - b + b * doc_len[ids] / (avgdl or 1.0))
+            postings[term] = (ids, (idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32), idf)
+        return postings
+
+    def search(self, query: str, k: int = 2) -> LexicalResult:
+        self._maybe_reload()
+        terms = list(dict.fromkeys(tokenize(query)))
+        result = LexicalResult(terms, key=cache_key(query))
+        documents, postings = self._index
+        if not documents or not terms:
+            return result
+        self.stats["queries"] += 1
+
+        scores = np.zeros(len(documents), dtype=np.float32)
+        matched = np.zeros(len(documents), dtype=np.int16)
+        min_idf = float("inf")
+        for term in terms:
+            hit = postings.get(term)
+            if hit is not None:
+                scores[hit[0]] += hit[1]  # doc_id unik per term
+                matched[hit[0]] += 1
+                min_idf = min(min_idf, hit[2])
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            self.stats["no_match"] += 1
+            return result
+
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        top = ranked[:k]
+        result.documents = [documents[i] for i in top]
+        result.scores = [round(float(scores[i]), 4) for i in top]
+        result.coverage = float(matched[top[0]]) / len(terms)
+        # Kandidat pertama di luar hasil; skornya mendekati teratas -> ranking leksikal tidak meyakinkan
+        runner_up = float(scores[ranked[k]]) if len(ranked) > k else 0.0
+        result.confident = (
+            len(terms) <= LEXICAL_FAST_MAX_TERMS
+            and result.coverage >= LEXICAL_FAST_MIN_COVERAGE
+            and min_idf >= LEXICAL_FAST_MIN_IDF
+            and float(scores[top[0]]) >= LEXICAL_FAST_MIN_MARGIN * runner_up
+        )
+        self.stats["confident"] += int(result.confident)
+        return result
+
+    def count(self) -> int:
+        return len(self._index[0])
+
+
+def write_lexical_index(documents: List[str], ids: List[str], index_dir: str = LEXICAL_INDEX_DIR):
+    """Bangun postings BM25 (term -> [[doc, tf], ...]) dan tulis secara atomik"""
+    postings: Dict[str, List[List[int]]] = {}
+    doc_len = []
+    for doc_id, text in enumerate(documents):
+        tokens = tokenize(text)
+        doc_len.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append([doc_id, tf])
+
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = os.path.join(index_dir, f".{LEXICAL_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"k1": BM25_K1, "b": BM25_B, "ids": ids, "documents": documents,
+                   "doc_len": doc_len, "postings": postings}, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(index_dir, LEXICAL_FILE))
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,109 @@
+# module_1_chatbot/app/lifecycle.py
+"""
+Manajer startup: resource berat (model embedding, vector store, Redis,
+snapshot katalog) dimuat di background setelah lifespan FastAPI mulai,
+bukan saat import. Worker uvicorn langsung menerima koneksi; `/ready`
+melaporkan status & lama muat tiap komponen, dan baru 200 setelah semua
+komponen wajib siap.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Status komponen
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+@dataclass
+class Component:
+    name: str
+    loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    required: bool = True
+    after: Tuple[str, ...] = ()  # ditunggu selesai (berhasil/gagal) sebelum mulai
+    status: str = PENDING
+    load_ms: Optional[float] = None
+    error: Optional[str] = None
+    detail: Dict[str, Any] = field(default_factory=dict)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def report(self) -> Dict[str, Any]:
+        data = {"status": self.status, "required": self.required, "load_ms": self.load_ms}
+        if self.error:
+            data["error"] = self.error
+        if self.detail:
+            data["detail"] = self.detail
+        return data
+
+
+class Lifecycle:
+    def __init__(self):
+        self.components: Dict[str, Component] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+
+    def add(self, name: str, loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+            required: bool = True, after: Tuple[str, ...] = ()):
+        self.components[name] = Component(name, loader, required, tuple(after))
+
+    def start(self):
+        """Jalankan semua loader di background (urutan hanya diikat oleh `after`)"""
+        self._started_at = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._run(c)) for c in self.components.values()]
+
+    async def _run(self, comp: Component):
+        try:
+            for dep in comp.after:
+                await self.components[dep].done.wait()
+            comp.status = LOADING
+            started = time.perf_counter()
+            try:
+                comp.detail = await comp.loader() or {}
+                comp.status = READY
+                logger.info(f"✅ Komponen '{comp.name}' siap ({(time.perf_counter() - started) * 1000:.0f} ms).")
+            except Exception as e:
+                comp.status = FAILED
+                comp.error = repr(e)
+                log = logger.error if comp.required else logger.warning
+                log(f"❌ Komponen '{comp.name}' gagal dimuat: {e}")
+            comp.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        finally:
+            comp.done.set()
+
+    @property
+    def ready(self) -> bool:
+        return all(c.status == READY for c in self.components.values() if c.required)
+
+    def status(self, name: str) -> str:
+        comp = self.components.get(name)
+        return comp.status if comp else PENDING
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        waits = [c.done.wait() for c in self.components.values() if c.required]
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime_sec": round(time.perf_counter() - self._started_at, 1) if self._started_at else None,
+            "components": {name: c.report() for name, c in self.components.items()},
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,426 @@
+# module_1_chatbot/app/llm_router.py
+"""
+Router provider LLM (Groq, OpenRouter, dst) dengan:
+- statistik latensi bergulir (p50/p95) & error rate per provider,
+- circuit breaker untuk provider yang sedang gagal,
+- hedged request: provider cadangan dipanggil bila provider utama belum
+  menjawab dalam batas waktu (budget), tanpa menunggu timeout penuh,
+- deadline total per chat.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .http_client import OutboundHTTP
+from .metrics import LLM_CALL_SECONDS, LLM_CALLS, LLM_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ROUTER ---
+CHAT_DEADLINE_SEC = float(os.getenv("LLM_CHAT_DEADLINE_SEC", "20"))
+HEDGE_MIN_SEC = float(os.getenv("LLM_HEDGE_MIN_SEC", "1.5"))
+HEDGE_MAX_SEC = float(os.getenv("LLM_HEDGE_MAX_SEC", "4.0"))
+# Untuk streaming, hedging diukur dari token pertama (bukan jawaban lengkap)
+STREAM_HEDGE_SEC = float(os.getenv("LLM_STREAM_HEDGE_SEC", "1.0"))
+STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "100"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_SAMPLES = int(os.getenv("LLM_BREAKER_MIN_SAMPLES", "10"))
+BREAKER_COOLDOWN_SEC = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+
+# Status circuit breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderError(Exception):
+    """Satu provider gagal menjawab (HTTP error, timeout, respons rusak)."""
+
+
+class AllProvidersFailed(Exception):
+    """Semua provider gagal atau deadline chat terlampaui."""
+
+
+@dataclass
+class LLMProvider:
+    name: str
+    url: str
+    api_key: str
+    model: str
+    timeout: float
+    extra_body: Dict = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+
+class ProviderStats:
+    """Jendela bergulir hasil panggilan: latensi sukses & rasio error."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def record(self, latency: float, ok: bool):
+        self.total_requests += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.total_errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(round(q * (len(ordered) - 1)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class CircuitBreaker:
+    """
+    CLOSED -> OPEN setelah N kegagalan beruntun atau error rate tinggi.
+    OPEN -> HALF_OPEN setelah cooldown; satu request percobaan diizinkan.
+    HALF_OPEN -> CLOSED bila percobaan sukses, kembali OPEN bila gagal.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SEC):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            return True
+        return False
+
+    def on_start(self):
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = True
+
+    def on_finish(self):
+        self.probe_in_flight = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.state = CLOSED
+
+    def record_failure(self, stats: ProviderStats):
+        self.consecutive_failures += 1
+        too_many = self.consecutive_failures >= self.failure_threshold
+        error_rate_high = len(stats.outcomes) >= BREAKER_MIN_SAMPLES and stats.error_rate >= BREAKER_ERROR_RATE
+        if self.state == HALF_OPEN or too_many or error_rate_high:
+            if self.state != OPEN:
+                logger.warning(f"⚡ Circuit breaker OPEN (gagal beruntun: {self.consecutive_failures})")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        http_client: OutboundHTTP,
+        deadline: float = CHAT_DEADLINE_SEC,
+        hedge_min: float = HEDGE_MIN_SEC,
+        hedge_max: float = HEDGE_MAX_SEC,
+    ):
+        self.providers = providers
+        self.http_client = http_client
+        self.deadline = deadline
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in providers}
+        self.breakers: Dict[str, CircuitBreaker] = {p.name: CircuitBreaker() for p in providers}
+
+    # --- PEMILIHAN PROVIDER ---
+    def candidates(self) -> List[LLMProvider]:
+        """Provider aktif yang diizinkan breaker, urut dari yang paling sehat."""
+        allowed = [p for p in self.providers if p.enabled and self.breakers[p.name].allow_request()]
+
+        def rank(item: Tuple[int, LLMProvider]):
+            order, provider = item
+            breaker = self.breakers[provider.name]
+            p50 = self.stats[provider.name].percentile(0.5)
+            # CLOSED didahulukan; provider tanpa data memakai urutan konfigurasi
+            return (breaker.state != CLOSED, p50 if p50 is not None else float("inf"), order)
+
+        return [p for _, p in sorted(enumerate(allowed), key=rank)]
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Budget sebelum hedging: p95 provider, dibatasi [hedge_min, hedge_max]."""
+        p95 = self.stats[provider.name].percentile(0.95)
+        if p95 is None:
+            return self.hedge_max
+        return min(self.hedge_max, max(self.hedge_min, p95))
+
+    # --- PANGGILAN SATU PROVIDER ---
+    def _request_body(self, provider: LLMProvider, messages: List[Dict]) -> Dict:
+        return {"model": provider.model, "messages": messages, **provider.extra_body}
+
+    async def _call(self, provider: LLMProvider, messages: List[Dict], end: float) -> str:
+        breaker = self.breakers[provider.name]
+        stats = self.stats[provider.name]
+        loop = asyncio.get_running_loop()
+        timeout = max(0.1, min(provider.timeout, end - loop.time()))
+        if not breaker.allow_request():
+            # Probe HALF_OPEN sudah dipakai request lain
+            LLM_CALLS.labels(provider.name, "circuit_open").inc()
+            raise ProviderError(f"{provider.name} circuit {breaker.state}")
+        breaker.on_start()
+        started = loop.time()
+        try:
+            res = await self.http_client.post(
+                provider.url,
+                headers={"Authorization": f"Bearer {provider.api_key}"},
+                json=self._request_body(provider, messages),
+                timeout=timeout,
+            )
+            if res.status_code != 200:
+                raise ProviderError(f"{provider.name} HTTP {res.status_code}")
+            content = res.json()["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            # Kalah hedging -> bukan kegagalan provider
+            LLM_CALLS.labels(provider.name, "cancelled").inc()
+            raise
+        except Exception as e:
+            stats.record(loop.time() - started, ok=False)
+            breaker.record_failure(stats)
+            LLM_CALLS.labels(provider.name, "error").inc()
+            logger.warning(f"⚠️ Provider {provider.name} gagal: {e!r}")
+            raise ProviderError(str(e)) from e
+        finally:
+            breaker.on_finish()
+
+        stats.record(loop.time() - started, ok=True)
+        breaker.record_success()
+        LLM_CALLS.labels(provider.name, "ok").inc()
+        LLM_CALL_SECONDS.labels(provider.name).observe(loop.time() - started)
+        return content
+
+    # --- ROUTING UTAMA ---
+    async def complete(self, messages: List[Dict], deadline: Optional[float] = None) -> Tuple[str, str]:
+        """
+        Kembalikan (teks, nama_provider). Provider berikutnya dijalankan
+        (hedge) bila provider aktif belum menjawab dalam budget-nya, dan
+        langsung bila provider aktif gagal.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (deadline if deadline is not None else self.deadline)
+        queue = self.candidates()
+        if not queue:
+            raise AllProvidersFailed("Tidak ada provider LLM yang tersedia.")
+
+        pending: Dict[asyncio.Task, LLMProvider] = {}
+        errors: List[str] = []
+
+        def launch() -> float:
+            provider = queue.pop(0)
+            task = asyncio.create_task(self._call(provider, messages, end))
+            pending[task] = provider
+            return loop.time() + self.hedge_delay(provider)
+
+        hedge_at = launch()
+        try:
+            while pending:
+                now = loop.time()
+                if now >= end:
+                    errors.append("deadline terlampaui")
+                    break
+                wait_until = min(end, hedge_at) if queue else end
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, wait_until - now), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result(), provider.name
+                    errors.append(f"{provider.name}: {task.exception()}")
+
+                # Failover langsung bila tidak ada yang sedang berjalan,
+                # atau hedge bila provider aktif melewati budget.
+                if queue and (not pending or loop.time() >= hedge_at):
+                    if pending:
+                        logger.info(f"⏱️ Hedging ke {queue[0].name}")
+                    LLM_FALLBACKS.labels("hedge" if pending else "failover").inc()
+                    hedge_at = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AllProvidersFailed("; ".join(errors) or "Semua provider gagal.")
+
+    # --- STREAMING ---
+    async def _pump(self, provider: LLMProvider, messages: List[Dict], end: float, out: asyncio.Queue):
+        """Alirkan token satu provider ke queue: ("token", teks)..., lalu ("done", None) atau ("error", exc)."""
+        breaker = self.breakers[provider.name]
+        stats = self.stats[provider.name]
+        loop = asyncio.get_running_loop()
+        timeout = max(0.1, min(provider.timeout, end - loop.time()))
+        if not breaker.allow_request():
+            LLM_CALLS.labels(provider.name, "circuit_open").inc()
+            await out.put(("error", ProviderError(f"{provider.name} circuit {breaker.state}")))
+            return
+        breaker.on_start()
+        started = loop.time()
+        try:
+            async with self.http_client.stream(
+                "POST",
+                provider.url,
+                headers={"Authorization": f"Bearer {provider.api_key}"},
+                json={**self._request_body(provider, messages), "stream": True},
+                timeout=timeout,
+            ) as res:
+                if res.status_code != 200:
+                    raise ProviderError(f"{provider.name} HTTP {res.status_code}")
+                # Format SSE OpenAI-compatible: "data: {...}" ... "data: [DONE]"
+                async for line in res.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        await out.put(("token", delta))
+        except asyncio.CancelledError:
+            LLM_CALLS.labels(provider.name, "cancelled").inc()
+            raise
+        except Exception as e:
+            stats.record(loop.time() - started, ok=False)
+            breaker.record_failure(stats)
+            LLM_CALLS.labels(provider.name, "error").inc()
+            logger.warning(f"⚠️ Stream provider {provider.name} gagal: {e!r}")
+            await out.put(("error", ProviderError(str(e))))
+            return
+        finally:
+            breaker.on_finish()
+
+        stats.record(loop.time() - started, ok=True)
+        breaker.record_success()
+        LLM_CALLS.labels(provider.name, "ok").inc()
+        LLM_CALL_SECONDS.labels(provider.name).observe(loop.time() - started)
+        await out.put(("done", None))
+
+    async def stream(self, messages: List[Dict], deadline: Optional[float] = None,
+                     meta: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Alirkan token dari provider yang paling cepat mengirim token pertama.
+        Provider berikutnya di-hedge bila token pertama belum datang dalam
+        STREAM_HEDGE_SEC, atau langsung bila provider aktif gagal sebelum
+        token pertama. Nama provider pemenang ditulis ke meta["provider"].
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (deadline if deadline is not None else self.deadline)
+        queue = self.candidates()
+        if not queue:
+            raise AllProvidersFailed("Tidak ada provider LLM yang tersedia.")
+
+        racers: Dict[asyncio.Task, Tuple[LLMProvider, asyncio.Task, asyncio.Queue]] = {}
+        errors: List[str] = []
+        winner = None
+
+        def launch() -> float:
+            provider = queue.pop(0)
+            out: asyncio.Queue = asyncio.Queue()
+            pump = asyncio.create_task(self._pump(provider, messages, end, out))
+            racers[asyncio.create_task(out.get())] = (provider, pump, out)
+            return loop.time() + STREAM_HEDGE_SEC
+
+        hedge_at = launch()
+        try:
+            while racers and winner is None:
+                now = loop.time()
+                if now >= end:
+                    errors.append("deadline terlampaui")
+                    break
+                wait_until = min(end, hedge_at) if queue else end
+                done, _ = await asyncio.wait(
+                    racers, timeout=max(0.0, wait_until - now), return_when=asyncio.FIRST_COMPLETED
+                )
+                for getter in done:
+                    provider, pump, out = racers.pop(getter)
+                    kind, payload = getter.result()
+                    if kind == "token" and winner is None:
+                        winner = (provider, pump, out, payload)
+                    elif kind == "token":
+                        pump.cancel()
+                    else:
+                        errors.append(f"{provider.name}: {payload or 'respons kosong'}")
+
+                if winner is None and queue and (not racers or loop.time() >= hedge_at):
+                    if racers:
+                        logger.info(f"⏱️ Hedging stream ke {queue[0].name}")
+                    LLM_FALLBACKS.labels("hedge" if racers else "failover").inc()
+                    hedge_at = launch()
+        finally:
+            for getter, (_, pump, _) in racers.items():
+                getter.cancel()
+                pump.cancel()
+
+        if winner is None:
+            raise AllProvidersFailed("; ".join(errors) or "Semua provider gagal.")
+
+        provider, pump, out, first_token = winner
+        if meta is not None:
+            meta["provider"] = provider.name
+        try:
+            yield first_token
+            while True:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    raise AllProvidersFailed("deadline terlampaui saat streaming")
+                try:
+                    kind, payload = await asyncio.wait_for(out.get(), remaining)
+                except asyncio.TimeoutError:
+                    raise AllProvidersFailed("deadline terlampaui saat streaming")
+                if kind == "token":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise AllProvidersFailed(f"{provider.name}: {payload}")
+        finally:
+            pump.cancel()
+
+    # --- OBSERVABILITY ---
+    def health(self) -> Dict:
+        report = {}
+        for provider in self.providers:
+            stats = self.stats[provider.name]
+            breaker = self.breakers[provider.name]
+            p50 = stats.percentile(0.5)
+            p95 = stats.percentile(0.95)
+            report[provider.name] = {
+                "configured": provider.enabled,
+                "circuit": breaker.state,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "error_rate": round(stats.error_rate, 3),
+                "window_samples": len(stats.outcomes),
+                "total_requests": stats.total_requests,
+                "total_errors": stats.total_errors,
+                "hedge_after_ms": round(self.hedge_delay(provider) * 1000, 1),
+            }
+        return report
@@ -1,12 +1,30 @@
 # /module_1_chatbot/app/main.py (Versi Diperbaiki)
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import json
 import logging
 import os
+import time
 
-from .rag_logic import get_ai_response
-from .schemas import ChatRequest, ChatResponse
+from .rag_logic import get_ai_response, stream_ai_response, init_resources, close_resources, llm_router
+from .whatsapp_handler import whatsapp_outbox
+from .whatsapp_inbound import whatsapp_inbound, parse_fonnte_payload, webhook_authorized
+from .http_client import outbound_http
+from .semantic_cache import semantic_cache
+from .embeddings import embedding_service
+from .catalog_cache import catalog_cache
+from .catalog_retrieval import catalog_retriever
+from .catalog_answers import catalog_answerer
+from .lexical_index import lexical_index
+from .prompt_assembly import prompt_assembler
+from .lifecycle import lifecycle
+from .coalescer import chat_coalescer, ChatOverloaded, CHAT_RETRY_AFTER_SEC
+from .timing import start_timings
+from . import metrics
+from .batch_chat import batch_chat_runner, CHAT_BATCH_MAX_ITEMS
+from .schemas import ChatRequest, ChatResponse, BatchChatRequest
 
 # Setup logging
 logging.basicConfig(
@@ -15,10 +33,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BUSY_TEXT = "Maaf, sistem sedang sibuk. Silakan coba lagi beberapa saat lagi."
+
+def _overloaded(reason: str) -> HTTPException:
+    logger.warning(f"🚦 Chat ditolak admission control: {reason}")
+    return HTTPException(
+        status_code=503,
+        detail=BUSY_TEXT,
+        headers={"Retry-After": str(CHAT_RETRY_AFTER_SEC)},
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resource berat (model, vector store, Redis, katalog) dimuat di background;
+    # server langsung menerima koneksi, kesiapan dilaporkan lewat /ready
+    await init_resources()
+    yield
+    await close_resources()
+
 app = FastAPI(
     title="Chatbot Haji & Umrah (Modul 1)",
     description="AI-powered chatbot dengan RAG",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -28,6 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 @app.get("/")
@@ -36,19 +74,33 @@ async def homepage():
 
 # ===== WEB CHAT ENDPOINT =====
 @app.post("/chat", response_model=ChatResponse)
-async def web_chat(request_data:ChatRequest):
+async def web_chat(request_data:ChatRequest, response: Response):
     try:
         if not request_data.message or not request_data.message.strip():
             raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
 
         logger.info(f"📩 Web chat from {request_data.user_id}: '{request_data.message}'")
 
-        result = get_ai_response(
-            user_id=request_data.user_id,
-            message=request_data.message,
-            channel="web",
-            user_contact=request_data.user_email
-        )
+        # Durasi per tahap -> histogram Prometheus & header Server-Timing
+        timings = start_timings()
+        started = time.perf_counter()
+        # Single-flight + urutan per user + admission global (lihat app.coalescer)
+        try:
+            result = await chat_coalescer.run(
+                request_data.user_id,
+                request_data.message,
+                lambda: get_ai_response(
+                    user_id=request_data.user_id,
+                    message=request_data.message,
+                    channel="web",
+                    user_contact=request_data.user_email
+                ),
+            )
+        except ChatOverloaded as e:
+            raise _overloaded(str(e))
+        total_ms = (time.perf_counter() - started) * 1000
+        metrics.observe_request("chat", timings, result["source"], total_ms)
+        response.headers["Server-Timing"] = metrics.server_timing(timings, total_ms)
 
         return ChatResponse(
             user_id=request_data.user_id,
@@ -67,11 +119,197 @@ async def web_chat(request_data:ChatRequest):
             detail="Terjadi error internal server saat memproses permintaan Anda."
         )
 
+# ===== WEB CHAT STREAMING (SSE) =====
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def web_chat_stream(request_data: ChatRequest):
+    """
+    Sama seperti /chat, tetapi token jawaban dikirim bertahap sebagai
+    Server-Sent Events: `token` berulang, lalu `done` berisi ChatResponse
+    lengkap (atau `error`).
+    """
+    if not request_data.message or not request_data.message.strip():
+        raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
+
+    logger.info(f"📩 Web chat (stream) from {request_data.user_id}: '{request_data.message}'")
+    # Tolak sebelum header SSE terkirim agar klien masih menerima 503 + Retry-After
+    if chat_coalescer.saturated():
+        raise _overloaded("slot & antrean chat penuh")
+
+    async def event_source():
+        # Komentar SSE dikirim segera agar header & byte pertama langsung sampai ke browser
+        yield ": connected\n\n"
+        # Header sudah terkirim: ringkasan Server-Timing dikirim sebagai komentar SSE terakhir
+        timings = start_timings()
+        started = time.perf_counter()
+        source = None
+        try:
+            async for event in chat_coalescer.stream(
+                request_data.user_id,
+                request_data.message,
+                lambda: stream_ai_response(
+                    user_id=request_data.user_id,
+                    message=request_data.message,
+                    channel="web",
+                    user_contact=request_data.user_email
+                ),
+            ):
+                if event["type"] == "token":
+                    yield _sse("token", {"text": event["text"]})
+                else:
+                    final = ChatResponse(
+                        user_id=request_data.user_id,
+                        response_text=event["response"],
+                        source=event["source"],
+                        escalated=event["escalated"],
+                        escalation_reason=event.get("escalation_reason")
+                    )
+                    source = event["source"]
+                    yield _sse(event["type"], final.model_dump())
+        except ChatOverloaded as e:
+            # Header 200 sudah terkirim: penolakan dikirim sebagai event `error`
+            logger.warning(f"🚦 Chat (stream) ditolak admission control: {e}")
+            source = "Overloaded"
+            yield _sse("error", ChatResponse(
+                user_id=request_data.user_id,
+                response_text=BUSY_TEXT,
+                source=source,
+                escalated=False
+            ).model_dump())
+        total_ms = (time.perf_counter() - started) * 1000
+        metrics.observe_request("chat_stream", timings, source, total_ms)
+        yield f": server-timing {metrics.server_timing(timings, total_ms)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ===== BATCH CHAT (BROADCAST / KAMPANYE) =====
+@app.post("/chat/batch")
+async def web_chat_batch(request_data: BatchChatRequest):
+    """
+    Banyak (user_id, message) sekaligus. Respons NDJSON: satu baris
+    BatchChatResult per item begitu selesai (urutan per user dijaga),
+    lalu satu baris {"type": "summary", ...}.
+    """
+    items = request_data.items
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch tidak boleh kosong.")
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Maksimal {CHAT_BATCH_MAX_ITEMS} pesan per batch.")
+    empty = [i for i, item in enumerate(items) if not item.message or not item.message.strip()]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Pesan kosong pada item {empty[:10]}.")
+
+    logger.info(f"📩 Batch chat: {len(items)} pesan")
+
+    async def lines():
+        async for result in batch_chat_runner.run(items, request_data.concurrency):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+# ===== WEBHOOK WHATSAPP MASUK (FONNTE) =====
+@app.post("/webhook/whatsapp")
+async def whatsapp_webhook(request: Request):
+    """
+    Pesan masuk dari Fonnte (JSON atau form). Hanya validasi + antre, ack
+    dalam milidetik; jawaban dikirim worker whatsapp_inbound lewat
+    send_whatsapp_message. Antrean penuh -> 503 + Retry-After.
+    """
+    started = time.perf_counter()
+    try:
+        token = request.query_params.get("token") or request.headers.get("X-Webhook-Token")
+        if not webhook_authorized(token):
+            metrics.inbound_event("unauthorized")
+            raise HTTPException(status_code=401, detail="Token webhook tidak valid.")
+        try:
+            if "application/json" in request.headers.get("content-type", ""):
+                payload = await request.json()
+            else:
+                payload = dict(await request.form())
+            msg = parse_fonnte_payload(payload)
+        except ValueError as e:
+            metrics.inbound_event("invalid")
+            raise HTTPException(status_code=400, detail=f"Payload webhook tidak valid: {e}")
+        if msg is None:
+            metrics.inbound_event("ignored")
+            return {"status": "ignored"}
+
+        status = await whatsapp_inbound.submit(msg)
+        if status == "full":
+            raise HTTPException(
+                status_code=503,
+                detail="Antrean pesan penuh, kirim ulang nanti.",
+                headers={"Retry-After": str(CHAT_RETRY_AFTER_SEC)},
+            )
+        return {"status": status, "id": msg.message_id}
+    finally:
+        metrics.WA_WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+
 # ===== HEALTH CHECK =====
 @app.get("/health")
 async def health_check():
+    """Liveness: proses hidup (belum tentu siap melayani, lihat /ready)"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 bila semua komponen wajib sudah dimuat, selain itu 503"""
+    report = lifecycle.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+# ===== STATUS PROVIDER LLM =====
+@app.get("/providers/health")
+async def providers_health():
+    """Latensi p50/p95, error rate & status circuit breaker tiap provider"""
+    return llm_router.health()
+
+@app.get("/http/stats")
+async def http_stats():
+    """Reuse koneksi, handshake & latensi per host tujuan (Groq, OpenRouter, Fonnte)"""
+    return outbound_http.stats()
+
+@app.get("/outbox/stats")
+async def outbox_stats():
+    """Kedalaman antrean, retry, dead-letter & latensi pengiriman notifikasi WA"""
+    return await whatsapp_outbox.health()
+
+@app.get("/whatsapp/inbound/stats")
+async def whatsapp_inbound_stats():
+    """Kedalaman antrean per backend, lag, worker sibuk, duplikat & dead-letter pesan WA masuk"""
+    return await whatsapp_inbound.health()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Giliran chat berjalan/antre, duplikat yang digabung & request yang ditolak"""
+    return {**chat_coalescer.snapshot(), "batch": batch_chat_runner.stats}
+
+# ===== METRIK PROMETHEUS =====
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Histogram per tahap, hit/miss cache, provider LLM, eskalasi & token"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# ===== STATISTIK CACHE =====
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss & ukuran semantic answer cache"""
+    return {
+        "semantic_cache": semantic_cache.stats(),
+        "query_embeddings": embedding_service.stats(),
+        "catalog": catalog_cache.stats,
+        "catalog_context": catalog_retriever.stats,
+        "catalog_answers": catalog_answerer.stats,
+        "prompt_tokens": prompt_assembler.stats,
+        "lexical_index": lexical_index.stats,
+    }
+
 # ===== ERROR HANDLERS =====
 @app.exception_handler(404)
 async def not_found_exception_handler(request: Request, exc: HTTPException):
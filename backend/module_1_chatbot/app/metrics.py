@@ -0,0 +1,120 @@
+# module_1_chatbot/app/metrics.py
+"""
+Metrik Prometheus pipeline chat (diekspor di GET /metrics):
+- chat_stage_seconds{endpoint,stage}   : durasi tiap tahap pipeline (dari app.timing)
+- chat_request_seconds{endpoint,source}: durasi total satu giliran chat
+- chat_cache_total{cache,result}       : packages (snapshot katalog), history,
+                                         semantic (jawaban), query_embedding
+- llm_calls_total{provider,outcome}    : tiap percobaan ke provider (ok/error/cancelled)
+- llm_call_seconds{provider}           : latensi panggilan provider yang berhasil
+- llm_responses_total{provider}        : provider yang akhirnya menjawab ("none" = semua gagal)
+- llm_fallbacks_total{kind}            : hedge (provider lambat) / failover (provider gagal)
+- llm_tokens_total{section}            : token prompt per bagian + completion; bagian system/context/
+                                         history/query tidak tumpang tindih (boleh dijumlahkan)
+- chat_escalations_total{reason}
+- chat_answers_total{path}             : llm / catalog_template / semantic_cache / system / error
+                                         (porsi jawaban tanpa LLM = semua path selain llm)
+- chat_retrieval_total{path}           : lexical (tanpa embedding) / hybrid / vector /
+                                         lexical_only (vektor tidak tersedia) / none
+- chat_admission_total{result}         : admitted / deduplicated / shed_global / shed_user
+- chat_inflight                        : giliran chat yang sedang berjalan (per worker)
+- whatsapp_inbound_total{result}       : webhook (queued / duplicate / full / invalid / unauthorized /
+                                         ignored) & worker (processed / retried / overloaded /
+                                         dead_lettered / reply_deferred)
+- whatsapp_inbound_depth               : pesan masuk yang menunggu (backpressure, 503 bila penuh)
+- whatsapp_inbound_busy_workers        : worker yang sedang menjalankan pipeline chat
+- whatsapp_inbound_lag_seconds         : jeda webhook diterima -> mulai diproses
+- whatsapp_webhook_seconds             : durasi endpoint webhook sampai ack
+
+Semua pencatatan hanya operasi counter/histogram in-memory (tanpa I/O),
+aman dibiarkan aktif di produksi.
+"""
+from typing import Dict, Iterable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Bucket latensi (detik): tahap in-process ~ms, LLM ~detik
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+REQUEST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+
+STAGE_SECONDS = Histogram(
+    "chat_stage_seconds", "Durasi tahap pipeline chat", ["endpoint", "stage"], buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chat_request_seconds", "Durasi total satu giliran chat", ["endpoint", "source"], buckets=REQUEST_BUCKETS,
+)
+CACHE_EVENTS = Counter("chat_cache_total", "Hit/miss cache di pipeline chat", ["cache", "result"])
+LLM_CALLS = Counter("llm_calls_total", "Percobaan panggilan ke provider LLM", ["provider", "outcome"])
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds", "Latensi panggilan provider LLM yang berhasil", ["provider"], buckets=REQUEST_BUCKETS,
+)
+LLM_RESPONSES = Counter("llm_responses_total", "Provider yang menjawab giliran chat", ["provider"])
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Pemanggilan provider cadangan", ["kind"])
+LLM_TOKENS = Counter("llm_tokens_total", "Token dikirim/diterima dari LLM per bagian", ["section"])
+ESCALATIONS = Counter("chat_escalations_total", "Eskalasi ke admin per alasan", ["reason"])
+ANSWERS = Counter("chat_answers_total", "Sumber jawaban giliran chat", ["path"])
+RETRIEVALS = Counter("chat_retrieval_total", "Jalur retrieval knowledge base", ["path"])
+CHAT_ADMISSION = Counter("chat_admission_total", "Keputusan admission/single-flight chat", ["result"])
+CHAT_INFLIGHT = Gauge("chat_inflight", "Giliran chat yang sedang berjalan")
+WA_INBOUND = Counter("whatsapp_inbound_total", "Pesan WhatsApp masuk per hasil (webhook & worker)", ["result"])
+WA_INBOUND_DEPTH = Gauge("whatsapp_inbound_depth", "Pesan WhatsApp masuk yang menunggu diproses")
+WA_INBOUND_BUSY = Gauge("whatsapp_inbound_busy_workers", "Worker WhatsApp masuk yang sedang memproses pesan")
+WA_INBOUND_LAG = Histogram(
+    "whatsapp_inbound_lag_seconds", "Jeda webhook diterima -> mulai diproses worker", buckets=REQUEST_BUCKETS,
+)
+WA_WEBHOOK_SECONDS = Histogram(
+    "whatsapp_webhook_seconds", "Durasi endpoint webhook WhatsApp sampai ack", buckets=STAGE_BUCKETS,
+)
+
+
+def cache_event(cache: str, result: str):
+    CACHE_EVENTS.labels(cache, result).inc()
+
+
+# source hasil get_ai_response -> label path chat_answers_total
+_ANSWER_PATHS = {"Hybrid": "llm", "Catalog": "catalog_template", "Cache": "semantic_cache",
+                 "System": "system", "Error": "error"}
+
+
+def record_answer(source: str):
+    ANSWERS.labels(_ANSWER_PATHS.get(source, "other")).inc()
+
+
+def inbound_event(result: str):
+    WA_INBOUND.labels(result).inc()
+
+
+def record_tokens(prompt_tokens: Dict[str, int], completion_tokens: Optional[int] = None):
+    for section in ("system", "context", "history", "query"):
+        if prompt_tokens.get(section):
+            LLM_TOKENS.labels(section).inc(prompt_tokens[section])
+    if completion_tokens:
+        LLM_TOKENS.labels("completion").inc(completion_tokens)
+
+
+def observe_request(endpoint: str, timings: Dict[str, float], source: str, total_ms: float):
+    """Masukkan hasil app.timing satu request ke histogram"""
+    for name, ms in timings.items():
+        STAGE_SECONDS.labels(endpoint, name).observe(ms / 1000)
+    REQUEST_SECONDS.labels(endpoint, source or "unknown").observe(total_ms / 1000)
+
+
+def percentile(values: Iterable[float], pct: float, scale: float = 1.0, ndigits: int = 3) -> Optional[float]:
+    """Persentil sederhana (nearest-rank) untuk ringkasan /health; None bila belum ada data"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * scale, ndigits)
+
+
+def server_timing(timings: Dict[str, float], total_ms: Optional[float] = None) -> str:
+    """Nilai header Server-Timing, mis. `fetch;dur=3.1, llm;dur=812.4, total;dur=830.2`"""
+    parts = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def render() -> tuple:
+    """(body, content_type) untuk endpoint /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
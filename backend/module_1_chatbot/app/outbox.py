@@ -0,0 +1,396 @@
+# module_1_chatbot/app/outbox.py
+"""
+Outbox tahan-lama untuk notifikasi keluar (WhatsApp admin via Fonnte).
+
+Pemanggil hanya menulis pesan ke antrean lalu langsung kembali; pengiriman
+dilakukan worker di background:
+- antrean utama: Redis stream + consumer group (pesan yang macet di worker
+  yang mati diambil alih lewat XAUTOCLAIM),
+- cadangan lokal: SQLite (dipakai bila Redis tidak tersedia / XADD gagal),
+- retry dengan exponential backoff + jitter (ZSET jadwal di Redis, kolom
+  due_at di SQLite),
+- rate limit per nomor tujuan (token bucket),
+- dead-letter setelah OUTBOX_MAX_ATTEMPTS percobaan,
+- statistik kedalaman antrean & latensi pengiriman (enqueue -> terkirim).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE_SEC = float(os.getenv("OUTBOX_BACKOFF_BASE_SEC", "2"))
+OUTBOX_BACKOFF_MAX_SEC = float(os.getenv("OUTBOX_BACKOFF_MAX_SEC", "300"))
+OUTBOX_RATE_PER_MIN = float(os.getenv("OUTBOX_RATE_PER_MIN", "20"))  # per nomor tujuan
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "1"))
+OUTBOX_CLAIM_IDLE_SEC = float(os.getenv("OUTBOX_CLAIM_IDLE_SEC", "120"))
+OUTBOX_SQLITE_PATH = os.getenv("OUTBOX_SQLITE_PATH", "./data/outbox.db")
+OUTBOX_DEAD_MAXLEN = 10_000
+
+
+@dataclass
+class OutboxMessage:
+    target: str
+    message: str
+    kind: str = "notification"
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    last_error: Optional[str] = None
+    ref: Optional[str] = None  # id di backend (stream id / rowid), tidak ikut diserialisasi
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data.pop("ref")
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str, ref: Optional[str] = None) -> "OutboxMessage":
+        return cls(**json.loads(raw), ref=ref)
+
+
+# --- BACKEND: REDIS STREAM ---
+class RedisStreamBackend:
+    name = "redis"
+
+    def __init__(self, redis_client, stream: str, group: str = "outbox-workers"):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.delayed_key = f"{stream}:delayed"
+        self.dead_stream = f"{stream}:dead"
+        self._last_autoclaim = 0.0
+
+    async def setup(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, msg: OutboxMessage):
+        await self.redis.xadd(self.stream, {"payload": msg.to_json()})
+
+    async def _promote_due(self):
+        """Pindahkan retry yang sudah jatuh tempo dari ZSET jadwal ke stream"""
+        due = await self.redis.zrangebyscore(self.delayed_key, 0, time.time(), start=0, num=20)
+        for raw in due:
+            # ZREM hanya berhasil di satu worker -> pesan tidak terduplikasi
+            if await self.redis.zrem(self.delayed_key, raw):
+                await self.redis.xadd(self.stream, {"payload": raw})
+
+    async def claim(self, consumer: str) -> Optional[OutboxMessage]:
+        await self._promote_due()
+        entries = []
+        if time.monotonic() - self._last_autoclaim > OUTBOX_CLAIM_IDLE_SEC / 2:
+            # Ambil alih pesan milik worker yang mati di tengah pengiriman
+            self._last_autoclaim = time.monotonic()
+            claimed = await self.redis.xautoclaim(
+                self.stream, self.group, consumer, min_idle_time=int(OUTBOX_CLAIM_IDLE_SEC * 1000), start_id="0-0", count=1
+            )
+            entries = claimed[1] if claimed else []
+        if not entries:
+            result = await self.redis.xreadgroup(self.group, consumer, {self.stream: ">"}, count=1)
+            entries = result[0][1] if result else []
+        for entry_id, fields in entries:
+            if fields and "payload" in fields:
+                return OutboxMessage.from_json(fields["payload"], ref=entry_id)
+            await self.ack(OutboxMessage("", "", ref=entry_id))  # entri rusak / sudah dihapus
+        return None
+
+    async def ack(self, msg: OutboxMessage):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, msg.ref)
+            pipe.xdel(self.stream, msg.ref)
+            await pipe.execute()
+
+    async def retry(self, msg: OutboxMessage, due_at: float):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.delayed_key, {msg.to_json(): due_at})
+            pipe.xack(self.stream, self.group, msg.ref)
+            pipe.xdel(self.stream, msg.ref)
+            await pipe.execute()
+
+    async def dead_letter(self, msg: OutboxMessage):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.dead_stream, {"payload": msg.to_json()}, maxlen=OUTBOX_DEAD_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, msg.ref)
+            pipe.xdel(self.stream, msg.ref)
+            await pipe.execute()
+
+    async def depth(self) -> Dict[str, int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xlen(self.stream)
+            pipe.xpending(self.stream, self.group)
+            pipe.zcard(self.delayed_key)
+            pipe.xlen(self.dead_stream)
+            ready, pending, delayed, dead = await pipe.execute()
+        inflight = pending["pending"] if isinstance(pending, dict) else 0
+        return {"ready": max(ready - inflight, 0), "inflight": inflight, "delayed": delayed, "dead": dead}
+
+    async def close(self):
+        pass
+
+
+# --- BACKEND: SQLITE (CADANGAN LOKAL) ---
+class SqliteBackend:
+    name = "sqlite"
+
+    def __init__(self, path: str = OUTBOX_SQLITE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _setup(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " rowid INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',"
+            " due_at REAL NOT NULL, claimed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, due_at)")
+
+    async def setup(self):
+        await asyncio.to_thread(self._setup)
+
+    def _run(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def enqueue(self, msg: OutboxMessage):
+        await asyncio.to_thread(self._run, "INSERT INTO outbox (payload, due_at) VALUES (?, ?)", (msg.to_json(), time.time()))
+
+    def _claim(self) -> Optional[OutboxMessage]:
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT rowid, payload FROM outbox WHERE (status = 'pending' AND due_at <= ?)"
+                    " OR (status = 'inflight' AND claimed_at < ?) ORDER BY due_at LIMIT 1",
+                    (now, now - OUTBOX_CLAIM_IDLE_SEC),
+                ).fetchone()
+                if row:
+                    conn.execute("UPDATE outbox SET status = 'inflight', claimed_at = ? WHERE rowid = ?", (now, row[0]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return OutboxMessage.from_json(row[1], ref=str(row[0])) if row else None
+
+    async def claim(self, consumer: str) -> Optional[OutboxMessage]:
+        return await asyncio.to_thread(self._claim)
+
+    async def ack(self, msg: OutboxMessage):
+        await asyncio.to_thread(self._run, "DELETE FROM outbox WHERE rowid = ?", (int(msg.ref),))
+
+    async def retry(self, msg: OutboxMessage, due_at: float):
+        await asyncio.to_thread(
+            self._run, "UPDATE outbox SET status = 'pending', payload = ?, due_at = ? WHERE rowid = ?",
+            (msg.to_json(), due_at, int(msg.ref)),
+        )
+
+    async def dead_letter(self, msg: OutboxMessage):
+        await asyncio.to_thread(
+            self._run, "UPDATE outbox SET status = 'dead', payload = ? WHERE rowid = ?", (msg.to_json(), int(msg.ref))
+        )
+
+    async def depth(self) -> Dict[str, int]:
+        now = time.time()
+        rows = await asyncio.to_thread(
+            self._run,
+            "SELECT CASE WHEN status = 'pending' AND due_at > ? THEN 'delayed' WHEN status = 'pending' THEN 'ready'"
+            " ELSE status END AS s, COUNT(*) FROM outbox GROUP BY s",
+            (now,),
+        )
+        counts = {"ready": 0, "inflight": 0, "delayed": 0, "dead": 0}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    async def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+# --- RATE LIMIT PER TUJUAN ---
+class TargetRateLimiter:
+    """Token bucket per nomor tujuan"""
+
+    def __init__(self, rate_per_min: float = OUTBOX_RATE_PER_MIN, burst: Optional[float] = None):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst or max(1.0, rate_per_min / 4)
+        self._buckets: Dict[str, List[float]] = {}  # target -> [tokens, updated_at]
+
+    def acquire(self, target: str) -> float:
+        """0 bila boleh kirim sekarang, selain itu detik yang perlu ditunggu"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(target, [self.burst, now])
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[target] = [tokens - 1, now]
+            return 0.0
+        self._buckets[target] = [tokens, now]
+        return (1 - tokens) / self.rate
+
+
+# --- OUTBOX + WORKER POOL ---
+class Outbox:
+    def __init__(self, name: str, sender: Callable[[str, str], Awaitable[bool]], workers: int = OUTBOX_WORKERS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, sqlite_path: str = OUTBOX_SQLITE_PATH):
+        self.name = name
+        self.sender = sender
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.local = SqliteBackend(sqlite_path)
+        self.primary: Optional[RedisStreamBackend] = None
+        self.limiter = TargetRateLimiter()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._latencies: deque = deque(maxlen=500)
+        self.stats = {"enqueued": 0, "enqueued_local": 0, "delivered": 0, "retried": 0,
+                      "dead_lettered": 0, "rate_limited": 0, "worker_errors": 0}
+
+    @property
+    def backends(self) -> list:
+        return [b for b in (self.primary, self.local) if b is not None]
+
+    # --- LIFECYCLE ---
+    async def start(self, redis_client=None):
+        await self.local.setup()
+        if redis_client:
+            backend = RedisStreamBackend(redis_client, f"outbox:{self.name}")
+            try:
+                await backend.setup()
+                self.primary = backend
+            except Exception as e:
+                logger.warning(f"⚠️ Stream outbox Redis tidak aktif, memakai SQLite lokal: {e}")
+        self._tasks = [asyncio.create_task(self._worker(f"{self.name}-{os.getpid()}-{i}")) for i in range(self.workers)]
+        logger.info(f"✅ Outbox '{self.name}' aktif ({'+'.join(b.name for b in self.backends)}, {self.workers} worker).")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.primary = None
+        await self.local.close()
+
+    # --- ENQUEUE (dipanggil di jalur request, tidak menunggu pengiriman) ---
+    async def enqueue(self, target: str, message: str, kind: str = "notification") -> OutboxMessage:
+        msg = OutboxMessage(target=target, message=message, kind=kind)
+        try:
+            if not self.primary:
+                raise RuntimeError("stream Redis tidak aktif")
+            await self.primary.enqueue(msg)
+        except Exception as e:
+            if self.primary:
+                logger.warning(f"⚠️ XADD outbox gagal ({e}), disimpan ke SQLite lokal.")
+            await self.local.enqueue(msg)
+            self.stats["enqueued_local"] += 1
+        self.stats["enqueued"] += 1
+        self._wakeup.set()
+        return msg
+
+    # --- WORKER ---
+    async def _claim(self, consumer: str):
+        for backend in self.backends:
+            try:
+                msg = await backend.claim(consumer)
+            except Exception as e:
+                # Redis putus di tengah jalan: antrean SQLite lokal tetap diproses
+                if backend is self.local:
+                    raise
+                logger.warning(f"⚠️ Claim dari {backend.name} gagal: {e}")
+                continue
+            if msg:
+                return backend, msg
+        return None, None
+
+    async def _worker(self, consumer: str):
+        while True:
+            try:
+                backend, msg = await self._claim(consumer)
+                if not msg:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SEC)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._deliver(backend, msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["worker_errors"] += 1
+                logger.error(f"❌ Worker outbox {consumer} error: {e}")
+                await asyncio.sleep(OUTBOX_POLL_SEC)
+
+    async def _deliver(self, backend, msg: OutboxMessage):
+        wait = self.limiter.acquire(msg.target)
+        if wait > 0:
+            # Tunda tanpa menghitung sebagai percobaan gagal
+            self.stats["rate_limited"] += 1
+            await backend.retry(msg, time.time() + wait)
+            return
+
+        try:
+            ok = await self.sender(msg.target, msg.message)
+            error = None if ok else "pengiriman ditolak"
+        except Exception as e:
+            ok, error = False, str(e)
+
+        if ok:
+            await backend.ack(msg)
+            latency = time.time() - msg.enqueued_at
+            self._latencies.append(latency)
+            self.stats["delivered"] += 1
+            logger.info(f"📨 Outbox {msg.id} terkirim setelah {msg.attempts + 1} percobaan ({latency:.1f}s).")
+            return
+
+        msg.attempts += 1
+        msg.last_error = error
+        if msg.attempts >= self.max_attempts:
+            await backend.dead_letter(msg)
+            self.stats["dead_lettered"] += 1
+            logger.error(f"💀 Outbox {msg.id} ke {msg.target} masuk dead-letter: {error}")
+            return
+        delay = min(OUTBOX_BACKOFF_MAX_SEC, OUTBOX_BACKOFF_BASE_SEC * 2 ** (msg.attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        await backend.retry(msg, time.time() + delay)
+        self.stats["retried"] += 1
+        logger.warning(f"⚠️ Outbox {msg.id} gagal ({error}), retry ke-{msg.attempts} dalam {delay:.1f}s.")
+
+    # --- OBSERVABILITAS ---
+    async def health(self) -> Dict:
+        depth = {}
+        for backend in self.backends:
+            try:
+                depth[backend.name] = await backend.depth()
+            except Exception as e:
+                depth[backend.name] = {"error": str(e)}
+        latencies = list(self._latencies)
+        return {
+            "backends": [b.name for b in self.backends],
+            "workers": len(self._tasks),
+            "depth": depth,
+            "delivery_latency_sec": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95)},
+            **self.stats,
+        }
@@ -0,0 +1,205 @@
+# module_1_chatbot/app/prompt_assembly.py
+"""
+Perakitan prompt dengan anggaran token per bagian:
+- system  : instruksi persona/aturan (ditambah ringkasan percakapan lama),
+- context : katalog (jalur komersial) atau potongan RAG (jalur umum),
+- history : giliran terbaru verbatim, per pesan dipotong bila terlalu panjang,
+- query   : pesan user (pesan WA panjang dipotong tengahnya).
+
+Giliran lama tidak dibuang begitu saja: saat keluar dari history Redis,
+giliran itu diringkas menjadi satu baris dan ditambahkan ke ringkasan
+berjalan yang disimpan di hash percakapan (lihat conversation_store).
+
+Token dihitung dengan tiktoken bila terpasang (opsional), selain itu dengan
+perkiraan karakter. Jumlah token akhir tiap request dilaporkan lewat
+AssembledPrompt agar bisa dikaitkan dengan latensi LLM.
+"""
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ANGGARAN TOKEN ---
+PROMPT_BUDGET_SYSTEM = int(os.getenv("PROMPT_BUDGET_SYSTEM", "400"))
+PROMPT_BUDGET_CONTEXT = int(os.getenv("PROMPT_BUDGET_CONTEXT", "700"))
+PROMPT_BUDGET_HISTORY = int(os.getenv("PROMPT_BUDGET_HISTORY", "600"))
+PROMPT_BUDGET_QUERY = int(os.getenv("PROMPT_BUDGET_QUERY", "300"))
+PROMPT_HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("PROMPT_HISTORY_MESSAGE_MAX_TOKENS", "150"))
+PROMPT_SUMMARY_MAX_TOKENS = int(os.getenv("PROMPT_SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_SNIPPET_WORDS = 20
+TRUNCATION_MARK = " […] "
+
+# --- PENGHITUNG TOKEN ---
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken opsional / encoding tidak bisa diunduh
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Perkiraan: ~3.5 karakter per token untuk teks Indonesia
+    return math.ceil(len(text) / 3.5)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """Potong teks agar <= max_tokens; keep_tail=True mempertahankan awal & akhir"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Anggaran terlalu kecil untuk bagian akhir (tail 0) -> potong biasa saja;
+    # ids[-0:] / text[-0:] akan mengembalikan seluruh teks
+    if _encoding is not None:
+        ids = _encoding.encode(text)
+        tail = max(max_tokens // 3 - 2, 0)
+        if keep_tail and tail:
+            return _encoding.decode(ids[: max_tokens * 2 // 3]) + TRUNCATION_MARK + _encoding.decode(ids[-tail:])
+        return _encoding.decode(ids[: max(max_tokens - 1, 0)]) + "…"
+    max_chars = int(max_tokens * 3.5)
+    tail = max(max_chars // 3 - len(TRUNCATION_MARK), 0)
+    if keep_tail and tail:
+        return text[: max_chars * 2 // 3] + TRUNCATION_MARK + text[-tail:]
+    return text[: max(max_chars - 1, 0)] + "…"
+
+
+def condense_turn(user_message: str, ai_message: str) -> str:
+    """Satu giliran -> satu baris ringkasan (cuplikan awal pertanyaan & jawaban)"""
+    def snippet(text: str) -> str:
+        text = re.sub(r"\s+", " ", text).strip()
+        first_sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+        words = first_sentence.split()
+        return " ".join(words[:SUMMARY_SNIPPET_WORDS]) + ("…" if len(words) > SUMMARY_SNIPPET_WORDS else "")
+    return f"- User: {snippet(user_message)} → Asisten: {snippet(ai_message)}"
+
+
+@dataclass
+class AssembledPrompt:
+    messages: List[Dict[str, str]]
+    tokens: Dict[str, int] = field(default_factory=dict)  # per bagian (tidak tumpang tindih) + "total"
+    trimmed: List[str] = field(default_factory=list)       # bagian yang dipotong/dipadatkan
+
+    @property
+    def total_tokens(self) -> int:
+        return self.tokens.get("total", 0)
+
+
+class PromptAssembler:
+    def __init__(self, system_budget: int = PROMPT_BUDGET_SYSTEM, context_budget: int = PROMPT_BUDGET_CONTEXT,
+                 history_budget: int = PROMPT_BUDGET_HISTORY, query_budget: int = PROMPT_BUDGET_QUERY,
+                 message_max_tokens: int = PROMPT_HISTORY_MESSAGE_MAX_TOKENS,
+                 summary_max_tokens: int = PROMPT_SUMMARY_MAX_TOKENS):
+        self.system_budget = system_budget
+        self.context_budget = context_budget
+        self.history_budget = history_budget
+        self.query_budget = query_budget
+        self.message_max_tokens = message_max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.stats = {"requests": 0, "total_tokens": 0, "max_tokens": 0, "trimmed": 0}
+
+    # --- QUERY & KONTEKS (sebelum build_prompt) ---
+    def fit_query(self, message: str) -> str:
+        return truncate_tokens(message, self.query_budget, keep_tail=True)
+
+    def fit_chunks(self, chunks: List[str]) -> List[str]:
+        """Potongan RAG berurutan relevansi, dipotong agar muat di anggaran konteks"""
+        fitted, used = [], 0
+        for chunk in chunks:
+            remaining = self.context_budget - used
+            if remaining <= 0:
+                break
+            chunk = truncate_tokens(chunk, remaining)
+            fitted.append(chunk)
+            used += count_tokens(chunk)
+        return fitted
+
+    # --- RINGKASAN BERJALAN ---
+    def roll_summary(self, summary: str, evicted: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Tambahkan giliran yang akan keluar dari history ke ringkasan.
+        Return None bila tidak ada yang berubah. Baris tertua dibuang bila
+        ringkasan melebihi anggaran.
+        """
+        if not evicted:
+            return None
+        lines = [l for l in (summary or "").split("\n") if l]
+        for i in range(0, len(evicted) - 1, 2):
+            lines.append(condense_turn(evicted[i]["content"], evicted[i + 1]["content"]))
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _fit_history(self, history: List[Dict[str, str]], summary: str) -> Tuple[List[Dict[str, str]], str, bool]:
+        """Giliran terbaru verbatim; yang tidak muat dipadatkan ke ringkasan prompt ini"""
+        budget = self.history_budget - count_tokens(summary)
+        kept: List[Dict[str, str]] = []
+        trimmed = False
+        # Per pasangan (user, asisten) dari yang terbaru agar peran tetap berselang-seling
+        pairs = [history[i:i + 2] for i in range(0, len(history) - 1, 2)]
+        overflow: List[Dict[str, str]] = []
+        for pair in reversed(pairs):
+            fitted = []
+            for msg in pair:
+                content = truncate_tokens(msg["content"], self.message_max_tokens)
+                trimmed |= content != msg["content"]
+                fitted.append({"role": msg["role"], "content": content})
+            cost = sum(count_tokens(m["content"]) for m in fitted)
+            if overflow or cost > budget:
+                overflow = pair + overflow
+                continue
+            kept = fitted + kept
+            budget -= cost
+        if overflow:
+            trimmed = True
+            summary = self.roll_summary(summary, overflow) or summary
+        return kept, summary, trimmed
+
+    # --- RAKIT PROMPT FINAL ---
+    def assemble(self, sys_prompt: str, usr_prompt: str, history: List[Dict[str, str]],
+                 summary: str = "", context_tokens: int = 0, context_in: str = "system") -> AssembledPrompt:
+        """
+        context_tokens: token konteks (katalog / chunk RAG) yang sudah tertanam di
+        sys_prompt (context_in="system", jalur komersial) atau usr_prompt
+        (context_in="user", jalur RAG). Bagian "system" & "query" di tokens tidak
+        menghitung ulang konteks, sehingga semua bagian bisa dijumlahkan.
+        """
+        trimmed: List[str] = []
+        history_msgs, summary, history_trimmed = self._fit_history(history, summary or "")
+        if history_trimmed:
+            trimmed.append("history")
+
+        system_content = sys_prompt
+        if summary:
+            system_content += f"\n\nRingkasan percakapan sebelumnya:\n{summary}"
+
+        messages = [{"role": "system", "content": system_content}] + history_msgs + [{"role": "user", "content": usr_prompt}]
+
+        system_tokens = count_tokens(system_content)
+        user_tokens = count_tokens(usr_prompt)
+        history_tokens = sum(count_tokens(m["content"]) for m in history_msgs)
+        in_system = context_in == "system"
+        tokens = {
+            "system": max(0, system_tokens - context_tokens) if in_system else system_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "query": user_tokens if in_system else max(0, user_tokens - context_tokens),
+            # Overhead format chat ~4 token per pesan
+            "total": system_tokens + history_tokens + user_tokens + 4 * len(messages),
+        }
+        if tokens["system"] > self.system_budget + self.summary_max_tokens:
+            logger.warning(f"⚠️ Instruksi system prompt melebihi anggaran ({tokens['system']} token)")
+
+        self.stats["requests"] += 1
+        self.stats["total_tokens"] += tokens["total"]
+        self.stats["max_tokens"] = max(self.stats["max_tokens"], tokens["total"])
+        self.stats["trimmed"] += int(bool(trimmed))
+        return AssembledPrompt(messages=messages, tokens=tokens, trimmed=trimmed)
+
+
+prompt_assembler = PromptAssembler()
@@ -1,138 +1,197 @@
 # module_1_chatbot/app/rag_logic.py (FINAL FIX: ESKALASI & NO GHOST DATA)
 import os
-import requests
-import chromadb
-from sentence_transformers import SentenceTransformer
+import asyncio
+import time
 from dotenv import load_dotenv
 import logging
-from typing import Tuple, Optional, Dict, List
-import json
-import redis 
+from typing import Tuple, Optional, Dict, List, AsyncIterator
+import redis.asyncio as aioredis
 import re 
-from sqlalchemy import text 
 
 # --- IMPORTS DATABASE & WA ---
-from .whatsapp_handler import notify_admin_whatsapp
-from .database import get_db 
+from .whatsapp_handler import notify_admin_whatsapp, whatsapp_outbox, whatsapp_warmup_urls
+from .whatsapp_inbound import whatsapp_inbound
+from .http_client import outbound_http, HostConfig
+from .lifecycle import lifecycle
+from .timing import stage, record as record_stage
+from .metrics import ESCALATIONS, LLM_RESPONSES, RETRIEVALS, record_answer, record_tokens
+from .catalog_cache import catalog_cache
+from .catalog_retrieval import catalog_retriever, format_packages
+from .catalog_answers import catalog_answerer
+from .prompt_assembly import prompt_assembler, count_tokens
+from .conversation_store import conversation_store, Conversation, STATE_KEEP, STATE_SET, STATE_CLEAR
+from .intent_router import intent_router, IntentResult
+from .llm_router import LLMRouter, LLMProvider, AllProvidersFailed
+from .semantic_cache import semantic_cache
+from .embeddings import embedding_service
+from .retriever import build_retriever, RETRIEVER_BACKEND
+from .lexical_index import lexical_index, fuse_rankings, LexicalResult
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 # --- KONEKSI REDIS (CACHE & STATE) ---
-redis_client = None
-try:
-    redis_client = redis.Redis(
-        host=os.getenv("REDIS_HOST", "redis-cache"), 
-        port=6379, 
-        db=0, 
-        decode_responses=True
-    )
-    redis_client.ping()
-    logger.info("✅ Koneksi ke Redis berhasil.")
-except Exception as e:
-    logger.error(f"❌ Gagal koneksi ke Redis: {e}. Fitur history & state non-aktif.")
-    redis_client = None
-
-# --- KONSTANTA ---
-HISTORY_KEY_PREFIX = "chat_history:"
-HISTORY_MAX_TURNS = 4 
-ESCALATION_KEY_PREFIX = "escalation_pending:"
-ESCALATION_STATE_PREFIX = "escalation_state:" 
-ESCALATION_EXPIRE_SEC = 900
-SQL_CACHE_KEY = "packages_cache"
-SQL_CACHE_TTL = 300
+# Client async dibuat saat startup (lihat init_resources), bukan saat import,
+# karena ping async butuh event loop yang sedang berjalan.
+redis_client: Optional[aioredis.Redis] = None
 
 # --- KONFIGURASI API AI ---
+# URL bisa di-override via env agar router bisa diuji terhadap stub server lokal
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama-3.1-8b-instant" # Pakai model cepat
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 OPENROUTER_MODEL = "openai/gpt-3.5-turbo"
 
-# --- INISIALISASI MODEL RAG ---
+# --- HTTP CLIENT (LLM) ---
+# Pool koneksi persisten per host dari lapisan HTTP bersama (lihat http_client.py)
+for _llm_url in (GROQ_URL, OPENROUTER_URL):
+    outbound_http.configure(_llm_url, HostConfig(max_connections=200, max_keepalive=50))
+
+# --- ROUTER PROVIDER LLM ---
+llm_router = LLMRouter(
+    providers=[
+        LLMProvider("groq", GROQ_URL, GROQ_API_KEY, GROQ_MODEL, timeout=8, extra_body={"temperature": 0.1}),
+        LLMProvider("openrouter", OPENROUTER_URL, OPENROUTER_API_KEY, OPENROUTER_MODEL, timeout=15),
+    ],
+    http_client=outbound_http,
+)
+
+# --- RESOURCE RAG ---
+# Satu model embedding (embedding_service) untuk ingest & query. Chroma tidak
+# diberi embedding function sehingga tidak memuat model kedua; query selalu
+# dikirim sebagai query_embeddings. Backend retriever dipilih via RETRIEVER_BACKEND
+# (chroma / numpy); Chroma hanya dibuka bila memang dipakai.
+# Semua dimuat di background oleh lifecycle (lihat init_resources), bukan saat import.
 model = None
 collection = None 
-try:
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    client = chromadb.PersistentClient(path="./chroma_db")
-    collection = client.get_or_create_collection(name="haji_umrah_kb")
-    logger.info("✅ ChromaDB & Model Loaded.")
-except Exception as e:
-    logger.error(f"FATAL: Error inisialisasi RAG: {e}")
+retriever = None
+
+async def _load_embedding_model() -> Dict:
+    global model
+    # Model lokal (+ warmup) atau koneksi ke server embedding bersama (EMBEDDING_BACKEND=remote)
+    detail = await embedding_service.start()
+    model = embedding_service
+    return detail
+
+def _open_retriever():
+    col = None
+    if RETRIEVER_BACKEND == "chroma":
+        import chromadb  # import berat, hanya bila backend chroma dipakai
+        client = chromadb.PersistentClient(path="./chroma_db")
+        col = client.get_or_create_collection(name="haji_umrah_kb", embedding_function=None)
+    return col, build_retriever(col)
+
+async def _load_retriever() -> Dict:
+    global collection, retriever
+    collection, retriever = await asyncio.to_thread(_open_retriever)
+    return {"backend": RETRIEVER_BACKEND, "chunks": await asyncio.to_thread(retriever.count)}
+
+async def _load_lexical_index() -> Dict:
+    # Opsional: tanpa index BM25 retrieval tetap jalan lewat vektor saja
+    return await asyncio.to_thread(lexical_index.load)
+
+async def _connect_redis() -> Dict:
+    global redis_client
+    client = aioredis.Redis(
+        host=os.getenv("REDIS_HOST", "redis-cache"), 
+        port=6379, 
+        db=0, 
+        decode_responses=True
+    )
+    try:
+        await client.ping()
+    except Exception as e:
+        logger.error(f"❌ Gagal koneksi ke Redis: {e}. Fitur history & state non-aktif.")
+        await client.aclose()
+        raise
+    redis_client = client
+    return {"host": os.getenv("REDIS_HOST", "redis-cache")}
+
+async def _start_services() -> Dict:
+    # Dijalankan setelah percobaan Redis selesai (berhasil maupun gagal)
+    # History & state eskalasi per user (1 hash Redis)
+    conversation_store.start(redis_client)
+    # Snapshot katalog: tier Redis + listener invalidasi dari module_2
+    await catalog_cache.start(redis_client)
+    # Worker outbox notifikasi WA (Redis stream, cadangan SQLite lokal)
+    await whatsapp_outbox.start(redis_client)
+    # Worker pesan WA masuk (antrean per pengirim di Redis, cadangan SQLite lokal)
+    await whatsapp_inbound.start(redis_client)
+    # Buka koneksi TCP+TLS ke provider LLM & Fonnte lebih awal (background)
+    outbound_http.start_warmup([p.url for p in llm_router.providers if p.enabled] + whatsapp_warmup_urls())
+    return {"redis": redis_client is not None}
+
+async def _warm_catalog() -> Dict:
+    snapshot = await catalog_cache.get()
+    return {"packages": len(snapshot.rows), "version": snapshot.version}
+
+# --- LIFECYCLE RESOURCE ASYNC ---
+async def init_resources():
+    """Daftarkan & mulai pemuatan resource di background (dipanggil dari lifespan FastAPI)"""
+    lifecycle.add("embedding_model", _load_embedding_model)
+    lifecycle.add("retriever", _load_retriever)
+    lifecycle.add("lexical_index", _load_lexical_index, required=False)
+    lifecycle.add("redis", _connect_redis, required=False)
+    lifecycle.add("services", _start_services, after=("redis",))
+    lifecycle.add("catalog", _warm_catalog, required=False, after=("services",))
+    lifecycle.start()
+
+async def close_resources():
+    """Tutup koneksi Redis & HTTP saat shutdown"""
+    global redis_client
+    await lifecycle.stop()
+    await whatsapp_inbound.stop()
+    await whatsapp_outbox.stop()
+    await catalog_cache.stop()
+    conversation_store.stop()
+    await embedding_service.close()
+    if redis_client:
+        await redis_client.aclose()
+        redis_client = None
+    await outbound_http.aclose()
 
 # --- SQL QUERY (SUMBER KEBENARAN) ---
-def get_packages_from_sql() -> str:
-    """Mengambil data paket (Cached)"""
-    if redis_client:
-        try:
-            cached = redis_client.get(SQL_CACHE_KEY)
-            if cached: return cached
-        except: pass
-    
+async def get_packages_from_sql() -> str:
+    """Mengambil data paket dari snapshot katalog (in-process -> Redis -> Postgres)"""
     try:
-        with get_db() as db:
-            query = text("SELECT name, duration, price, airline, features, description FROM packages")
-            result = db.execute(query).fetchall()
-            
-            if not result:
-                return "⚠️ SAAT INI DATA PAKET KOSONG DI DATABASE."
-            
-            package_list = []
-            for row in result:
-                try:
-                    price_fmt = f"Rp {int(row.price):,}".replace(",", ".")
-                except:
-                    price_fmt = str(row.price)
-                
-                features_str = ", ".join(row.features) if row.features else "-"
-
-                info = (
-                    f"📦 {row.name}\n"
-                    f"   - Durasi: {row.duration}\n"
-                    f"   - Harga: {price_fmt}\n"
-                    f"   - Maskapai: {row.airline}\n"
-                    f"   - Hotel/Fasilitas: {features_str}"
-                )
-                package_list.append(info)
-            
-            result_text = "\n\n".join(package_list)
-            
-            if redis_client:
-                redis_client.set(SQL_CACHE_KEY, result_text, ex=SQL_CACHE_TTL)
-            
-            return result_text
+        snapshot = await catalog_cache.get()
+        # Teks prompt diformat sekali per versi katalog
+        if "prompt_text" not in snapshot.derived:
+            snapshot.derived["prompt_text"] = format_packages(snapshot.rows)
+        return snapshot.derived["prompt_text"]
             
     except Exception as e:
         logger.error(f"❌ SQL Error: {e}")
         return "Gagal mengambil data paket dari database."
 
-# --- HELPER LOGIC ---
-def _is_customization_request(query: str, packages_data: str) -> bool:
-    """Cek apakah ini permintaan Custom/Aneh-aneh"""
-    query_lower = query.lower()
-    packages_lower = packages_data.lower()
-    
-    # Keywords yang memicu Custom
-    triggers = [
-        'kustom', 'custom', 'request', 'ubah', 'ganti', 'sesuaikan',
-        'sendiri', 'private', 'rombongan', 'keluarga besar', 'diet',
-        'sakit', 'kursi roda', 'lansia', 'bayi', 'hamil',
-        'turki', 'aqsa', 'eropa', 'dubai', 'mesir' # Destinasi non-standar
-    ]
-    
-    # Cek apakah destinasi tersebut MEMANG TIDAK ADA di data paket SQL
-    for word in triggers:
-        if word in query_lower:
-            # Jika kata tersebut tidak ada di deskripsi paket SQL, berarti ini Custom request
-            if word not in packages_lower:
-                return True
-                
-    return False
+async def get_catalog_context(query: str, query_embedding=None) -> str:
+    """Hanya paket yang relevan dengan pertanyaan (filter + ranking, dibatasi token)"""
+    try:
+        snapshot = await catalog_cache.get()
+        selection = await catalog_retriever.select(snapshot, query, query_embedding)
+        logger.info(
+            f"📦 Konteks katalog: {len(selection.rows)}/{selection.total} paket, ~{selection.tokens} token, "
+            f"filter={selection.filters.active()}"
+        )
+        return selection.text
+    except Exception as e:
+        logger.error(f"❌ SQL Error: {e}")
+        return "Gagal mengambil data paket dari database."
 
-def _is_commercial_query(query: str) -> bool:
-    keywords = ['paket', 'harga', 'biaya', 'tarif', 'promo', 'sedia', 'ada apa', 'list', 'daftar']
-    return any(k in query.lower() for k in keywords)
+async def get_catalog_answer(query: str) -> Optional[str]:
+    """Jawaban template dari baris katalog (tanpa LLM), None bila pola pertanyaan tidak dikenali"""
+    try:
+        snapshot = await catalog_cache.get()
+        answer = catalog_answerer.answer(snapshot, query)
+    except Exception as e:
+        logger.error(f"❌ Gagal menyusun jawaban katalog: {e}")
+        return None
+    if answer:
+        logger.info(f"🧾 Jawaban template katalog ({answer.kind}, {len(answer.rows)} paket), LLM dilewati")
+        return answer.text
+    return None
 
 # --- KONTAK & AFFIRMATION (FIXED REGEX) ---
 PHONE_REGEX = re.compile(r'((\+62|62|0)8[1-9][0-9]{7,10})\b')
@@ -160,62 +219,60 @@ def _is_affirmation(msg: str) -> bool:
     
     return False
 
-# --- STATE MANAGEMENT ---
-def get_escalation_state(user_id: str) -> Optional[str]:
-    if not redis_client: return None
-    return redis_client.get(f"{ESCALATION_STATE_PREFIX}{user_id}")
-
-def set_escalation_state(user_id: str, state: str, data: Dict = None):
-    if not redis_client: return
-    redis_client.set(f"{ESCALATION_STATE_PREFIX}{user_id}", state, ex=ESCALATION_EXPIRE_SEC)
-    if data:
-        redis_client.set(f"{ESCALATION_KEY_PREFIX}{user_id}", json.dumps(data), ex=ESCALATION_EXPIRE_SEC)
-
-def clear_escalation_state(user_id: str):
-    if not redis_client: return
-    redis_client.delete(f"{ESCALATION_STATE_PREFIX}{user_id}", f"{ESCALATION_KEY_PREFIX}{user_id}")
-
-def get_escalation_data(user_id: str) -> Optional[Dict]:
-    if not redis_client: return None
-    data = redis_client.get(f"{ESCALATION_KEY_PREFIX}{user_id}")
-    return json.loads(data) if data else None
-
-# --- HISTORY ---
-def get_chat_history(user_id: str) -> List[Dict]:
-    if not redis_client: return []
-    try:
-        key = f"{HISTORY_KEY_PREFIX}{user_id}"
-        hist = [json.loads(x) for x in redis_client.lrange(key, 0, (HISTORY_MAX_TURNS * 2) - 1)]
-        hist.reverse()
-        return hist
-    except: return []
-
-def save_chat_history(user_id: str, user_message: str, ai_message: str):
-    if not redis_client: return
-    try:
-        key = f"{HISTORY_KEY_PREFIX}{user_id}"
-        redis_client.lpush(key, json.dumps({"role": "assistant", "content": ai_message}))
-        redis_client.lpush(key, json.dumps({"role": "user", "content": user_message}))
-        redis_client.ltrim(key, 0, (HISTORY_MAX_TURNS * 2) - 1)
-    except: pass
-
 # --- RAG SEARCH ---
-def search_knowledge(query: str) -> list[str]:
-    if not collection: return []
+async def embed_query(query: str):
+    """Embedding query (di-cache LRU); None bila model tidak tersedia"""
+    if not model: return None
     try:
-        res = collection.query(query_texts=[query], n_results=2)
-        return res['documents'][0] if res['documents'] else []
-    except: return []
+        return await embedding_service.aembed_query(query)
+    except Exception as e:
+        logger.error(f"❌ Gagal embedding query: {e}")
+        return None
+
+RAG_TOP_K = 2
+
+async def search_knowledge(query: str, query_embedding=None, lexical: Optional[LexicalResult] = None) -> list[str]:
+    """
+    Retrieval hibrida: BM25 (lexical_index) + vektor, difusikan dengan RRF.
+    Match leksikal yang confident dipakai langsung tanpa embedding; bila model
+    atau vector store tidak tersedia, hasil BM25 saja yang dipakai.
+    """
+    if lexical is None:
+        lexical = lexical_index.search(query, RAG_TOP_K * 2)
+    if lexical.confident:
+        RETRIEVALS.labels("lexical").inc()
+        return lexical.documents[:RAG_TOP_K]
+
+    vector_docs = []
+    if retriever:
+        try:
+            if query_embedding is None:
+                query_embedding = await embed_query(query)
+            if query_embedding is not None:
+                # Retrieval (sinkron) dijalankan di thread pool, memakai embedding yang sudah dihitung
+                vector_docs = await asyncio.to_thread(retriever.search, query_embedding, RAG_TOP_K * 2)
+        except Exception as e:
+            logger.error(f"❌ Retrieval vektor gagal: {e}")
+
+    if vector_docs and lexical.documents:
+        RETRIEVALS.labels("hybrid").inc()
+        return fuse_rankings([lexical.documents, vector_docs], RAG_TOP_K)
+    if vector_docs:
+        RETRIEVALS.labels("vector").inc()
+        return vector_docs[:RAG_TOP_K]
+    RETRIEVALS.labels("lexical_only" if lexical.documents else "none").inc()
+    return lexical.documents[:RAG_TOP_K]
 
 # --- PROMPT BUILDER (FIXED GHOST DATA) ---
-def build_prompt(query: str, context_chunks: list[str], sql_data: str) -> Tuple[str, str]:
+def build_prompt(query: str, context_chunks: list[str], sql_data: str, intent: Optional[IntentResult] = None,
+                 catalog_context: Optional[str] = None) -> Tuple[str, str]:
     
-    # Deteksi Intent
-    is_commercial = _is_commercial_query(query)
-    is_custom = _is_customization_request(query, sql_data)
+    # Deteksi Intent (dihitung sekali per pesan oleh intent_router)
+    if intent is None:
+        intent = intent_router.classify(query, sql_data)
 
     # --- LOGIC 1: CUSTOM REQUEST ---
-    if is_custom:
+    if intent.is_custom:
         # Prompt khusus untuk menghandle penolakan halus dan tawaran eskalasi
         system_prompt = """Anda adalah 'Asisten Inara'.
 Tugas: Mengidentifikasi kebutuhan khusus user yang TIDAK ADA di daftar paket standar.
@@ -232,7 +289,7 @@ Contoh Respon:
         rag_context = "" # Kosongkan RAG biar tidak halusinasi
 
     # --- LOGIC 2: TANYA PAKET (COMMERCIAL) ---
-    elif is_commercial:
+    elif intent.is_commercial:
         # FIX 2: JANGAN GUNAKAN RAG CONTEXT DISINI! 
         # Kita hanya mau pakai SQL Data agar 'Paket Haji Plus' (dummy) tidak muncul.
         rag_context = "" 
@@ -240,7 +297,7 @@ Contoh Respon:
         system_prompt = f"""Anda adalah 'Asisten Inara'.
 Berikut adalah KATALOG RESMI yang tersedia saat ini (Live Database):
 
-{sql_data}
+{catalog_context or sql_data}
 
 ATURAN MENJAWAB:
 1. HANYA sebutkan paket yang tertulis di atas.
@@ -266,106 +323,248 @@ Pertanyaan User: "{query}"
     return system_prompt, user_prompt
 
 # --- AI CALL ---
-def call_ai_with_fallback(sys_prompt: str, usr_prompt: str, history: List[Dict]) -> str:
-    msgs = [{"role": "system", "content": sys_prompt}] + history + [{"role": "user", "content": usr_prompt}]
-    
-    # Groq (Fast)
-    if GROQ_API_KEY:
-        try:
-            res = requests.post(GROQ_URL, headers={"Authorization": f"Bearer {GROQ_API_KEY}"}, 
-                                json={"model": GROQ_MODEL, "messages": msgs, "temperature": 0.1}, timeout=8)
-            if res.status_code == 200: return res.json()["choices"][0]["message"]["content"]
-        except: pass
+AI_FALLBACK_TEXT = "Maaf, sedang ada gangguan koneksi AI."
 
-    # OpenRouter (Backup)
-    if OPENROUTER_API_KEY:
-        try:
-            res = requests.post(OPENROUTER_URL, headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"},
-                                json={"model": OPENROUTER_MODEL, "messages": msgs}, timeout=15)
-            if res.status_code == 200: return res.json()["choices"][0]["message"]["content"]
-        except: pass
+async def call_ai_with_fallback(msgs: List[Dict]) -> str:
+    # Router memilih provider tersehat (Groq/OpenRouter), hedging & deadline per chat
+    try:
+        response_text, provider = await llm_router.complete(msgs)
+        LLM_RESPONSES.labels(provider).inc()
+        return response_text
+    except AllProvidersFailed as e:
+        logger.error(f"❌ Semua provider LLM gagal: {e}")
+        LLM_RESPONSES.labels("none").inc()
         
-    return "Maaf, sedang ada gangguan koneksi AI."
+    return AI_FALLBACK_TEXT
 
 # --- MAIN LOGIC ---
-def get_ai_response(user_id: str, message: str, channel: str = "web", user_contact: Optional[str] = None) -> Dict:
-    try:
-        # 1. CEK STATE ESKALASI
-        state = get_escalation_state(user_id)
-        
-        # A. MENUNGGU KONTAK
-        if state == "AWAITING_CONTACT":
-            contact = _find_dynamic_contact(message, user_contact)
-            if contact != "Tidak Diberikan":
-                data = get_escalation_data(user_id) or {}
-                notify_admin_whatsapp(user_id, contact, data.get("original_message", message), "Kontak Diterima")
-                clear_escalation_state(user_id)
+async def _prepare_turn(user_id: str, message: str, user_contact: Optional[str],
+                        conversation: Optional[Conversation] = None) -> Dict:
+    """
+    Tahap sebelum LLM: cek state eskalasi, ambil data & susun prompt.
+    Return {"result": {...}} bila giliran selesai tanpa LLM (alur eskalasi),
+    atau {"messages", "prompt_tokens", "sql_data", ...} untuk dipanggil ke LLM.
+    History & state dibaca sekali (1 round trip) dari conversation_store,
+    kecuali sudah dimuat di depan (`conversation`, mis. oleh /chat/batch).
+    """
+    # 1. CEK STATE ESKALASI
+    with stage("conversation_load"):
+        conv = conversation if conversation is not None else await conversation_store.load(user_id)
+    state = conv.state
+    state_mode = STATE_KEEP  # perubahan state yang ikut disimpan bersama history
+    # Giliran yang akan terpangkas dari history diringkas, bukan dibuang
+    summary = prompt_assembler.roll_summary(conv.summary, conversation_store.evicted_by_next_save(conv.history))
+    
+    # A. MENUNGGU KONTAK
+    if state == "AWAITING_CONTACT":
+        contact = _find_dynamic_contact(message, user_contact)
+        if contact != "Tidak Diberikan":
+            with stage("escalation"):
+                await notify_admin_whatsapp(user_id, contact, conv.escalation.get("original_message", message), "Kontak Diterima")
                 res = "Terima kasih! Data kontak sudah diterima. Tim kami akan segera menghubungi via WhatsApp. 🙏"
-                save_chat_history(user_id, message, res)
-                return {"response": res, "source": "System", "escalated": True, "escalation_reason": "Selesai"}
-            else:
-                return {"response": "Mohon informasikan Nomor WhatsApp atau Email Anda (Contoh: 0812xxxx).", "source": "System", "escalated": True}
-
-        # B. MENUNGGU KONFIRMASI (DISINI TADI ERORNYA)
-        if state == "AWAITING_CONFIRM":
-            if _is_affirmation(message):
-                # User setuju ("Boleh, silakan")
-                set_escalation_state(user_id, "AWAITING_CONTACT", get_escalation_data(user_id))
-                
-                # Langsung return response minta WA
-                quick_res = "Baik. Boleh dibantu informasikan Nomor WhatsApp atau Email Anda yang aktif?"
-                save_chat_history(user_id, message, quick_res)
-                return {"response": quick_res, "source": "System", "escalated": True}
-            else:
-                # User nolak/ngomong lain, hapus state dan lanjut ke normal flow
-                clear_escalation_state(user_id)
-
-        # 2. NORMAL FLOW
-        sql_data = get_packages_from_sql()
-        context_chunks = search_knowledge(message)
-        history = get_chat_history(user_id)
-        
-        # Build Prompt (Dengan filter ghost data)
-        sys_prompt, usr_prompt = build_prompt(message, context_chunks, sql_data)
+                await conversation_store.save_turn(user_id, message, res, STATE_CLEAR, summary=summary)
+            return {"result": {"response": res, "source": "System", "escalated": True, "escalation_reason": "Selesai"}}
+        else:
+            return {"result": {"response": "Mohon informasikan Nomor WhatsApp atau Email Anda (Contoh: 0812xxxx).", "source": "System", "escalated": True}}
+
+    # B. MENUNGGU KONFIRMASI (DISINI TADI ERORNYA)
+    if state == "AWAITING_CONFIRM":
+        if _is_affirmation(message):
+            # User setuju ("Boleh, silakan") -> payload eskalasi dipertahankan
+            quick_res = "Baik. Boleh dibantu informasikan Nomor WhatsApp atau Email Anda yang aktif?"
+            with stage("escalation"):
+                await conversation_store.save_turn(user_id, message, quick_res, STATE_SET, "AWAITING_CONTACT", summary=summary)
+            return {"result": {"response": quick_res, "source": "System", "escalated": True}}
+        else:
+            # User nolak/ngomong lain, hapus state (disimpan bersama history) dan lanjut ke normal flow
+            state_mode = STATE_CLEAR
+
+    # 2. NORMAL FLOW
+    # Jalur cepat leksikal: query kata kunci yang cocok penuh di index BM25
+    # tidak perlu embedding (hanya dihitung nanti bila jalur komersial butuh)
+    with stage("lexical"):
+        lexical = lexical_index.search(message, RAG_TOP_K * 2)
+
+    # Sumber data saling independen -> ambil secara paralel
+    with stage("fetch"):
+        sql_data, query_embedding, _ = await asyncio.gather(
+            get_packages_from_sql(),
+            asyncio.sleep(0) if lexical.confident else embed_query(message),  # sleep(0) -> None
+            semantic_cache.sync_kb_version(redis_client),
+        )
+
+    # Klasifikasi intent satu lintasan, dipakai ulang sampai _finalize_turn.
+    # Semantic cache & RAG hanya untuk pertanyaan umum; jalur komersial/custom
+    # selalu memakai data SQL live.
+    with stage("intent"):
+        intent = intent_router.classify(message, sql_data)
+    context_chunks = []
+    catalog_context = None
+    cacheable = not conv.history and not conv.summary
+    if intent.is_commercial and not intent.is_custom:
+        # Pola umum (daftar, termurah/termahal, di bawah X, detail paket) dijawab
+        # langsung dari baris katalog lewat template -- harga persis, tanpa LLM
+        if not intent.wants_admin:
+            with stage("catalog_answer"):
+                answer = await get_catalog_answer(message)
+                if answer:
+                    await conversation_store.save_turn(user_id, message, answer, state_mode, summary=summary)
+                    return {"result": {"response": answer, "source": "Catalog", "escalated": False, "escalation_reason": None}}
+        # Selain itu hanya paket yang relevan yang masuk prompt (bukan seluruh tabel)
+        with stage("catalog_context"):
+            if query_embedding is None and lexical.confident:
+                query_embedding = await embed_query(message)  # ranking paket tetap semantik
+            catalog_context = await get_catalog_context(message, query_embedding)
+    elif intent.is_general:
+        with stage("semantic_cache"):
+            # Cache dipakai bersama semua user dan dikunci teks pertanyaan saja, padahal
+            # jawaban LLM ikut memakai history/ringkasan -> hanya untuk percakapan baru
+            # (pertanyaan lanjutan seperti "berapa lama?" bergantung konteks user)
+            cached = None
+            if cacheable and query_embedding is not None:
+                cached = semantic_cache.lookup(query_embedding)
+            elif cacheable:
+                # Tanpa embedding (jalur leksikal / model tidak tersedia) -> cocokkan kunci leksikal
+                cached = semantic_cache.lookup_key(lexical.key)
+            if cached:
+                await conversation_store.save_turn(user_id, message, cached, state_mode, summary=summary)
+                return {"result": {"response": cached, "source": "Cache", "escalated": False, "escalation_reason": None}}
+        with stage("rag_search"):
+            context_chunks = prompt_assembler.fit_chunks(await search_knowledge(message, query_embedding, lexical))
+    
+    # Build Prompt (Dengan filter ghost data) lalu rakit dengan anggaran token per bagian
+    with stage("prompt"):
+        sys_prompt, usr_prompt = build_prompt(prompt_assembler.fit_query(message), context_chunks, sql_data, intent, catalog_context)
+        context_tokens = count_tokens(catalog_context or "\n".join(context_chunks))
+        # Katalog masuk system prompt; chunk RAG masuk user prompt (lihat build_prompt)
+        assembled = prompt_assembler.assemble(sys_prompt, usr_prompt, conv.history, conv.summary, context_tokens,
+                                              context_in="system" if catalog_context else "user")
+    return {
+        "messages": assembled.messages, "prompt_tokens": assembled.tokens, "sql_data": sql_data,
+        "intent": intent, "query_embedding": query_embedding, "lexical_key": lexical.key,
+        "cacheable": cacheable, "state_mode": state_mode, "summary": summary,
+    }
+
+async def _finalize_turn(user_id: str, message: str, response_text: str, turn: Dict) -> Dict:
+    """Tahap setelah LLM: deteksi eskalasi baru, isi semantic cache & simpan history + state (atomik)"""
+    intent: IntentResult = turn["intent"]
+    # Cek Trigger Eskalasi Baru
+    escalated = False
+    reason = None
+    
+    # Deteksi Custom Request (hasil intent_router)
+    if intent.is_custom:
+        escalated = True
+        reason = "Permintaan Custom"
+    
+    # Deteksi Keyword User Minta Admin
+    if intent.wants_admin:
+        escalated = True
+        reason = "Request User"
+
+    # Deteksi Jawaban AI (AI menawarkan bantuan)
+    if "hubungkan" in response_text.lower() and "admin" in response_text.lower() and "bagaimana" in response_text.lower():
+        escalated = True
+        reason = "AI Offer"
+
+    if escalated:
+        ESCALATIONS.labels(reason).inc()
+        # Pastikan kalimat tanya ada
+        if "boleh saya" not in response_text.lower() and "bagaimana" not in response_text.lower():
+            response_text += "\n\nApakah boleh saya hubungkan Anda ke Admin untuk detailnya?"
+
+        await conversation_store.save_turn(
+            user_id, message, response_text, STATE_SET, "AWAITING_CONFIRM",
+            {"original_message": message, "reason": reason}, summary=turn["summary"],
+        )
+    else:
+        if intent.is_general and turn["cacheable"] and (turn["query_embedding"] is not None or turn["lexical_key"]) \
+                and response_text != AI_FALLBACK_TEXT:
+            semantic_cache.store(message, turn["query_embedding"], response_text, key=turn["lexical_key"])
+        await conversation_store.save_turn(user_id, message, response_text, turn["state_mode"], summary=turn["summary"])
+    
+    return {
+        "response": response_text,
+        "source": "Hybrid",
+        "escalated": escalated,
+        "escalation_reason": reason
+    }
+
+def _log_prompt_usage(turn: Dict, llm_seconds: float, response_text: str):
+    """Jumlah token input per request beserta latensi LLM-nya (log + metrik)"""
+    tokens = turn["prompt_tokens"]
+    record_tokens(tokens, count_tokens(response_text))
+    logger.info(
+        f"🧮 Prompt {tokens['total']} token (system={tokens['system']}, context={tokens['context']}, "
+        f"history={tokens['history']}, query={tokens['query']}) -> LLM {llm_seconds * 1000:.0f} ms"
+    )
+
+async def get_ai_response(user_id: str, message: str, channel: str = "web", user_contact: Optional[str] = None,
+                          conversation: Optional[Conversation] = None) -> Dict:
+    try:
+        turn = await _prepare_turn(user_id, message, user_contact, conversation)
+        if "result" in turn:
+            record_answer(turn["result"]["source"])
+            return turn["result"]
         
         # Call AI
-        response_text = call_ai_with_fallback(sys_prompt, usr_prompt, history)
-        
-        # Cek Trigger Eskalasi Baru
-        escalated = False
-        reason = None
+        started = time.perf_counter()
+        with stage("llm"):
+            response_text = await call_ai_with_fallback(turn["messages"])
+        _log_prompt_usage(turn, time.perf_counter() - started, response_text)
         
-        # Deteksi Custom Request (via Helper)
-        if _is_customization_request(message, sql_data):
-            escalated = True
-            reason = "Permintaan Custom"
-        
-        # Deteksi Keyword User Minta Admin
-        if "admin" in message.lower() and "hubun" in message.lower():
-            escalated = True
-            reason = "Request User"
-
-        # Deteksi Jawaban AI (AI menawarkan bantuan)
-        if "hubungkan" in response_text.lower() and "admin" in response_text.lower() and "bagaimana" in response_text.lower():
-            escalated = True
-            reason = "AI Offer"
-
-        if escalated:
-            # Pastikan kalimat tanya ada
-            if "boleh saya" not in response_text.lower() and "bagaimana" not in response_text.lower():
-                response_text += "\n\nApakah boleh saya hubungkan Anda ke Admin untuk detailnya?"
-            
-            set_escalation_state(user_id, "AWAITING_CONFIRM", {"original_message": message, "reason": reason})
+        with stage("finalize"):
+            result = await _finalize_turn(user_id, message, response_text, turn)
+        record_answer(result["source"])
+        return result
 
-        save_chat_history(user_id, message, response_text)
-        
-        return {
-            "response": response_text,
-            "source": "Hybrid",
-            "escalated": escalated,
-            "escalation_reason": reason
-        }
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        record_answer("Error")
+        return {"response": "Maaf, sistem sedang sibuk.", "source": "Error", "escalated": False}
+
+async def stream_ai_response(user_id: str, message: str, channel: str = "web", user_contact: Optional[str] = None) -> AsyncIterator[Dict]:
+    """
+    Versi streaming dari get_ai_response. Menghasilkan event:
+    {"type": "token", "text": ...} berulang, lalu satu {"type": "done", ...hasil}
+    (atau {"type": "error", ...}). Deteksi eskalasi & simpan history
+    dijalankan setelah stream LLM selesai.
+    """
+    try:
+        turn = await _prepare_turn(user_id, message, user_contact)
+        if "result" in turn:
+            record_answer(turn["result"]["source"])
+            yield {"type": "token", "text": turn["result"]["response"]}
+            yield {"type": "done", **turn["result"]}
+            return
+
+        parts: List[str] = []
+        meta: Dict = {}
+        started = time.perf_counter()
+        try:
+            async for token in llm_router.stream(turn["messages"], meta=meta):
+                parts.append(token)
+                yield {"type": "token", "text": token}
+        except AllProvidersFailed as e:
+            logger.error(f"❌ Stream LLM gagal: {e}")
+            if not parts:
+                meta["provider"] = "none"
+                parts.append(AI_FALLBACK_TEXT)
+                yield {"type": "token", "text": AI_FALLBACK_TEXT}
+
+        record_stage("llm", (time.perf_counter() - started) * 1000)
+        streamed = "".join(parts)
+        LLM_RESPONSES.labels(meta.get("provider", "none")).inc()
+        _log_prompt_usage(turn, time.perf_counter() - started, streamed)
+        with stage("finalize"):
+            result = await _finalize_turn(user_id, message, streamed, turn)
+        # Tawaran eskalasi yang ditambahkan setelah stream ikut dikirim sebagai token
+        if len(result["response"]) > len(streamed):
+            yield {"type": "token", "text": result["response"][len(streamed):]}
+        record_answer(result["source"])
+        yield {"type": "done", **result}
 
     except Exception as e:
         logger.error(f"Error: {e}")
-        return {"response": "Maaf, sistem sedang sibuk.", "source": "Error", "escalated": False}
\ No newline at end of file
+        record_answer("Error")
+        yield {"type": "error", "response": "Maaf, sistem sedang sibuk.", "source": "Error", "escalated": False}
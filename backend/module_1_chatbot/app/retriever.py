@@ -0,0 +1,145 @@
+# module_1_chatbot/app/retriever.py
+"""
+Backend retriever yang bisa ditukar (env RETRIEVER_BACKEND):
+- "chroma": collection Chroma PersistentClient (default),
+- "numpy" : index in-process berupa matriks float32 kontigu (opsional
+            memory-mapped) yang ditulis oleh scripts/ingest_knowledge.py;
+            top-k dihitung dengan satu perkalian matriks-vektor dan index
+            dimuat ulang otomatis saat file hasil ingest berubah.
+Keduanya menerima embedding query yang sudah dihitung (lihat embeddings.py).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./chroma_db/numpy_index")
+VECTOR_INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "true").lower() == "true"
+VECTOR_INDEX_RELOAD_SEC = float(os.getenv("VECTOR_INDEX_RELOAD_SEC", "2"))
+
+MATRIX_FILE = "embeddings.npy"
+META_FILE = "documents.json"  # ditulis terakhir -> penanda index baru selesai
+
+
+class Retriever(ABC):
+    name = "base"
+
+    @abstractmethod
+    def search(self, query_embedding: np.ndarray, k: int = 2) -> List[str]:
+        """Dokumen top-k untuk embedding query (ternormalisasi L2)."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Jumlah chunk di index."""
+
+
+class ChromaRetriever(Retriever):
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, query_embedding: np.ndarray, k: int = 2) -> List[str]:
+        res = self.collection.query(query_embeddings=[np.asarray(query_embedding).tolist()], n_results=k)
+        return res['documents'][0] if res['documents'] else []
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class NumpyRetriever(Retriever):
+    name = "numpy"
+
+    def __init__(self, index_dir: str = VECTOR_INDEX_DIR, mmap: bool = VECTOR_INDEX_MMAP,
+                 reload_interval: float = VECTOR_INDEX_RELOAD_SEC):
+        self.index_dir = index_dir
+        self.mmap = mmap
+        self.reload_interval = reload_interval
+        self._matrix: Optional[np.ndarray] = None
+        self._documents: List[str] = []
+        self._loaded_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.index_dir, META_FILE)
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.meta_path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            try:
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                matrix = np.load(os.path.join(self.index_dir, MATRIX_FILE),
+                                 mmap_mode="r" if self.mmap else None)
+                if matrix.shape[0] != len(meta["documents"]):
+                    raise ValueError("jumlah embedding & dokumen tidak sama")
+                self._matrix, self._documents = matrix, meta["documents"]
+                self._loaded_mtime = mtime
+                logger.info(f"✅ Index NumPy dimuat: {matrix.shape[0]} chunk (mmap={self.mmap}).")
+            except Exception as e:
+                logger.error(f"❌ Gagal memuat index NumPy dari {self.index_dir}: {e}")
+
+    def search(self, query_embedding: np.ndarray, k: int = 2) -> List[str]:
+        self._maybe_reload()
+        matrix, documents = self._matrix, self._documents
+        if matrix is None or not documents:
+            return []
+        scores = matrix @ np.asarray(query_embedding, dtype=np.float32)
+        k = min(k, len(documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [documents[i] for i in top]
+
+    def count(self) -> int:
+        self._maybe_reload()
+        return len(self._documents)
+
+
+def write_numpy_index(embeddings: np.ndarray, documents: List[str], ids: List[str],
+                      metadatas: Optional[List[Dict]] = None, index_dir: str = VECTOR_INDEX_DIR):
+    """
+    Tulis index untuk NumpyRetriever secara atomik (file sementara + os.replace).
+    File metadata ditulis terakhir agar pembaca tidak pernah melihat index setengah jadi.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    tmp_matrix = os.path.join(index_dir, f".{MATRIX_FILE}.tmp")
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_matrix, os.path.join(index_dir, MATRIX_FILE))
+
+    tmp_meta = os.path.join(index_dir, f".{META_FILE}.tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas or []}, f, ensure_ascii=False)
+    os.replace(tmp_meta, os.path.join(index_dir, META_FILE))
+
+
+def build_retriever(collection=None, backend: str = RETRIEVER_BACKEND) -> Optional[Retriever]:
+    if backend == "numpy":
+        return NumpyRetriever()
+    if collection is not None:
+        return ChromaRetriever(collection)
+    return None
@@ -1,6 +1,6 @@
 # /module_1_chatbot/app/schemas.py (Versi Diperbaiki)
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 # Schema untuk endpoint /chat di main.py
 class ChatRequest(BaseModel):
@@ -14,3 +14,19 @@ class ChatResponse(BaseModel):
     source: str
     escalated: bool
     escalation_reason: Optional[str] = None
+
+# Schema untuk endpoint /chat/batch (broadcast / kampanye)
+class BatchChatItem(BaseModel):
+    user_id: str
+    message: str
+    user_email: Optional[str] = None
+    id: Optional[str] = None # ID dari pemanggil, dikembalikan apa adanya
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    concurrency: Optional[int] = None # Default CHAT_BATCH_CONCURRENCY
+
+class BatchChatResult(ChatResponse):
+    index: int # Posisi item di request
+    id: Optional[str] = None
+    latency_ms: float
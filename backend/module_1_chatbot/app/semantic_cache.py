@@ -0,0 +1,176 @@
+# module_1_chatbot/app/semantic_cache.py
+"""
+Cache jawaban semantik untuk pertanyaan umum (jalur RAG).
+Pertanyaan yang embedding-nya cukup mirip (cosine >= threshold) dengan
+pertanyaan yang pernah dijawab langsung memakai jawaban tersimpan, tanpa
+query Chroma maupun panggilan LLM.
+
+Hanya untuk jalur umum: jalur komersial & custom TIDAK boleh memakai cache
+ini agar harga dari SQL tetap menjadi sumber kebenaran. Cache dipakai bersama
+semua user, jadi hanya giliran tanpa history/ringkasan percakapan yang dibaca &
+diisi (jawaban yang dibangun dari konteks satu user tidak bocor ke user lain).
+
+Entri juga diberi kunci leksikal (LexicalResult.key = cache_key(), app/lexical_index.py)
+sehingga jalur cepat BM25 -- yang tidak menghitung embedding -- tetap bisa memakai
+jawaban tersimpan untuk teks pertanyaan yang sama setelah normalisasi (kata tanya
+& negasi ikut dibandingkan, hanya sapaan yang diabaikan).
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from .metrics import cache_event
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL_SEC = float(os.getenv("SEMANTIC_CACHE_TTL_SEC", "3600"))
+# Versi knowledge base dinaikkan oleh scripts/ingest_knowledge.py
+KB_VERSION_KEY = "kb_version:haji_umrah_kb"
+KB_VERSION_CHECK_SEC = float(os.getenv("KB_VERSION_CHECK_SEC", "5"))
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    embedding: Optional[np.ndarray]  # None untuk entri dari jalur leksikal
+    answer: str
+    created_at: float
+    key: Optional[str] = None
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl_sec: float = SEMANTIC_CACHE_TTL_SEC):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()  # urutan = LRU
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None  # embedding tertumpuk, dibangun ulang saat berubah
+        self._matrix_ids: list = []
+        self._keys: Dict[str, int] = {}  # kunci leksikal -> id entri
+        self.kb_version: Optional[str] = None
+        self._kb_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _purge_expired(self):
+        cutoff = time.monotonic() - self.ttl_sec
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._drop(key)
+        if expired:
+            self._matrix = None
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        if entry.key is not None and self._keys.get(entry.key) == entry_id:
+            del self._keys[entry.key]
+
+    def _ensure_matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = [k for k, entry in self._entries.items() if entry.embedding is not None]
+            if self._matrix_ids:
+                self._matrix = np.stack([self._entries[k].embedding for k in self._matrix_ids])
+
+    def lookup(self, embedding) -> Optional[str]:
+        """Jawaban tersimpan bila ada pertanyaan cukup mirip, selain itu None."""
+        self._purge_expired()
+        self._ensure_matrix()
+        if self._matrix is None:
+            self.misses += 1
+            cache_event("semantic", "miss")
+            return None
+
+        scores = self._matrix @ self._normalize(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            cache_event("semantic", "miss")
+            return None
+
+        return self._hit(self._matrix_ids[best], f"sim={scores[best]:.3f}")
+
+    def lookup_key(self, key: str) -> Optional[str]:
+        """Jawaban tersimpan untuk kunci leksikal yang sama persis (jalur cepat BM25)."""
+        self._purge_expired()
+        entry_id = self._keys.get(key) if key else None
+        if entry_id is None:
+            self.misses += 1
+            cache_event("semantic", "miss")
+            return None
+        return self._hit(entry_id, f"kunci '{key}'")
+
+    def _hit(self, entry_id: int, detail: str) -> str:
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        cache_event("semantic", "hit")
+        logger.info(f"🎯 Semantic cache hit ({detail}): '{self._entries[entry_id].query}'")
+        return self._entries[entry_id].answer
+
+    def store(self, query: str, embedding, answer: str, key: Optional[str] = None):
+        vector = self._normalize(embedding) if embedding is not None else None
+        self._entries[self._next_id] = CacheEntry(query, vector, answer, time.monotonic(), key or None)
+        if key:
+            self._keys[key] = self._next_id
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        self._matrix = None
+
+    def invalidate(self, reason: str = ""):
+        if self._entries:
+            logger.info(f"🧹 Semantic cache dikosongkan ({reason or 'manual'}).")
+        self._entries.clear()
+        self._keys.clear()
+        self._matrix = None
+        self.invalidations += 1
+
+    async def sync_kb_version(self, redis_client):
+        """Kosongkan cache bila knowledge base di-ingest ulang (dicek maks. tiap KB_VERSION_CHECK_SEC)."""
+        if not redis_client or time.monotonic() - self._kb_checked_at < KB_VERSION_CHECK_SEC:
+            return
+        self._kb_checked_at = time.monotonic()
+        try:
+            version = await redis_client.get(KB_VERSION_KEY)
+        except Exception:
+            return
+        if version != self.kb_version:
+            if self.kb_version is not None:
+                self.invalidate(f"kb_version {self.kb_version} -> {version}")
+            self.kb_version = version
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_sec": self.ttl_sec,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "kb_version": self.kb_version,
+        }
+
+
+semantic_cache = SemanticCache()
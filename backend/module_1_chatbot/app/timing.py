@@ -0,0 +1,46 @@
+# module_1_chatbot/app/timing.py
+"""
+Pencatat durasi per tahap pipeline chat (ms), per request.
+
+Pemanggil (endpoint / load generator) memulai pencatatan dengan
+start_timings(); kode pipeline cukup membungkus tiap tahap dengan
+`with stage("nama"):`. Tanpa start_timings() stage() tidak mencatat apa pun.
+Dict yang sama dipakai bersama oleh task turunan (asyncio.gather menyalin
+context, bukan isi dict-nya).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _timings.get()
+
+
+@contextmanager
+def stage(name: str):
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def record(name: str, ms: float):
+    """Catat durasi yang diukur sendiri (mis. stream LLM yang diselingi yield)"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + ms
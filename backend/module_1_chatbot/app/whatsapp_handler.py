@@ -1,36 +1,47 @@
 # app/whatsapp_handler.py (Versi Diperbaiki - Hanya Mengirim)
 import logging
-import requests
 import os
 import re
 from typing import Optional
 
+from .http_client import outbound_http
+from .outbox import Outbox
+
 logger = logging.getLogger(__name__)
 
 # --- Konfigurasi ---
 FONNTE_API_KEY = os.getenv("FONNTE_API_KEY", "")
 ADMIN_WHATSAPP = os.getenv("ADMIN_WHATSAPP_NUMBER", "") # Nomor WA Admin
+FONNTE_URL = os.getenv("FONNTE_URL", "https://api.fonnte.com/send")
+FONNTE_TIMEOUT_SEC = 10
 
-def send_whatsapp_message(phone: str, message: str) -> bool:
-    """Kirim pesan WhatsApp via Fonnte API"""
-    if not FONNTE_API_KEY:
-        logger.error("FONNTE_API_KEY tidak diatur. Notifikasi admin gagal.")
-        return False
+def whatsapp_warmup_urls() -> list:
+    """Host Fonnte ikut di-warmup hanya bila notifikasi WA aktif"""
+    return [FONNTE_URL] if FONNTE_API_KEY else []
 
-    # Bersihkan nomor telepon
+def normalize_phone(phone: str) -> str:
+    """Bersihkan nomor telepon ke format 62xxx (dipakai pengirim & webhook masuk)"""
     phone = re.sub(r'[^\d]', '', phone)
     if not phone.startswith('62'):
         if phone.startswith('0'):
             phone = '62' + phone[1:]
         elif phone.startswith('8'):
             phone = '62' + phone
+    return phone
 
-    url = "https://api.fonnte.com/send"  # Diperbaiki: Hapus spasi
+async def send_whatsapp_message(phone: str, message: str) -> bool:
+    """Kirim pesan WhatsApp via Fonnte API"""
+    if not FONNTE_API_KEY:
+        logger.error("FONNTE_API_KEY tidak diatur. Notifikasi admin gagal.")
+        return False
+
+    phone = normalize_phone(phone)
     headers = {"Authorization": FONNTE_API_KEY}
     payload = {"target": phone, "message": message}
 
     try:
-        response = requests.post(url, headers=headers, data=payload, timeout=10)
+        # Pool koneksi bersama (keep-alive) dari lapisan HTTP keluar
+        response = await outbound_http.post(FONNTE_URL, headers=headers, data=payload, timeout=FONNTE_TIMEOUT_SEC)
         response.raise_for_status()
 
         result = response.json()
@@ -44,13 +55,16 @@ def send_whatsapp_message(phone: str, message: str) -> bool:
         logger.error(f"❌ Gagal kirim ke {phone}: {e}")
         return False
 
-def notify_admin_whatsapp(
+# Notifikasi admin lewat outbox: request chat tidak pernah menunggu Fonnte
+whatsapp_outbox = Outbox("whatsapp", send_whatsapp_message)
+
+async def notify_admin_whatsapp(
     user_id: str,
     user_contact: Optional[str],
     user_message: str,
     reason: str
 ):
-    """Notifikasi admin via WhatsApp"""
+    """Notifikasi admin via WhatsApp (dimasukkan ke antrean, dikirim worker outbox)"""
     if not ADMIN_WHATSAPP:
         logger.warning("ADMIN_WHATSAPP_NUMBER tidak diatur. Tidak bisa eskalasi.")
         return
@@ -69,4 +83,4 @@ def notify_admin_whatsapp(
 ---
 Harap segera tindak lanjuti."""
 
-    send_whatsapp_message(ADMIN_WHATSAPP, admin_msg)
+    await whatsapp_outbox.enqueue(ADMIN_WHATSAPP, admin_msg, kind="escalation")
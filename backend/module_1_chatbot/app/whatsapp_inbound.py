@@ -0,0 +1,630 @@
+# module_1_chatbot/app/whatsapp_inbound.py
+"""
+Pesan WhatsApp masuk (webhook gaya Fonnte, POST /webhook/whatsapp).
+
+Webhook provider punya timeout pendek, jadi endpoint hanya memvalidasi
+payload, mencatat id pesan dan menaruhnya di antrean -- ack dalam hitungan
+milidetik. Pipeline chat & balasan dikerjakan worker di background:
+- antrean per pengirim (Redis list) + ZSET pengirim yang siap diproses.
+  Satu pengirim dipegang satu worker sekaligus (lease), jadi pesannya
+  diproses berurutan; pengirim berbeda diproses paralel. Lease yang
+  kedaluwarsa (worker mati) dikembalikan ke antrean siap,
+- idempotensi: id pesan provider dicatat SET NX + TTL sehingga retry webhook
+  tidak diproses dua kali,
+- pesan yang gagal tetap di kepala antrean pengirimnya (backoff) agar urutan
+  tidak berubah, lalu dead-letter setelah WA_INBOUND_MAX_ATTEMPTS,
+- backpressure: antrean penuh (WA_INBOUND_MAX_DEPTH) -> 503 + Retry-After
+  agar provider mengirim ulang nanti; kedalaman, lag & worker sibuk
+  diekspor ke Prometheus,
+- cadangan lokal SQLite bila Redis tidak tersedia (semantik sama).
+Operasi antrean di Redis atomik lewat skrip Lua (satu round trip).
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+from .coalescer import chat_coalescer, ChatOverloaded, CHAT_RETRY_AFTER_SEC
+from .timing import start_timings
+from .whatsapp_handler import normalize_phone, send_whatsapp_message, whatsapp_outbox
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+WHATSAPP_WEBHOOK_TOKEN = os.getenv("WHATSAPP_WEBHOOK_TOKEN", "")  # ?token=... / header X-Webhook-Token
+# Hanya untuk uji lokal: terima webhook tanpa token. Tanpa token & tanpa opt-in ini webhook selalu 401
+WHATSAPP_WEBHOOK_INSECURE = os.getenv("WHATSAPP_WEBHOOK_INSECURE", "0") == "1"
+WA_INBOUND_WORKERS = int(os.getenv("WA_INBOUND_WORKERS", "8"))
+WA_INBOUND_MAX_DEPTH = int(os.getenv("WA_INBOUND_MAX_DEPTH", "5000"))
+WA_INBOUND_MAX_ATTEMPTS = int(os.getenv("WA_INBOUND_MAX_ATTEMPTS", "4"))
+WA_INBOUND_BACKOFF_BASE_SEC = float(os.getenv("WA_INBOUND_BACKOFF_BASE_SEC", "2"))
+WA_INBOUND_BACKOFF_MAX_SEC = float(os.getenv("WA_INBOUND_BACKOFF_MAX_SEC", "60"))
+WA_INBOUND_LEASE_SEC = float(os.getenv("WA_INBOUND_LEASE_SEC", "120"))  # > durasi maks satu giliran chat
+WA_INBOUND_POLL_SEC = float(os.getenv("WA_INBOUND_POLL_SEC", "0.5"))
+WA_INBOUND_DEDUP_TTL_SEC = int(os.getenv("WA_INBOUND_DEDUP_TTL_SEC", "86400"))
+# Payload tanpa id pesan: dedup dari isi, jendela pendek agar pesan sama yang disengaja tetap masuk
+WA_INBOUND_DEDUP_FALLBACK_SEC = int(os.getenv("WA_INBOUND_DEDUP_FALLBACK_SEC", "30"))
+WA_INBOUND_MAX_CHARS = int(os.getenv("WA_INBOUND_MAX_CHARS", "4096"))
+WA_INBOUND_SQLITE_PATH = os.getenv("WA_INBOUND_SQLITE_PATH", "./data/whatsapp_inbound.db")
+WA_INBOUND_DEAD_MAXLEN = 10_000
+
+# Hasil enqueue selain kedalaman antrean
+DUPLICATE = -1
+FULL = -2
+
+
+@dataclass
+class InboundMessage:
+    sender: str
+    text: str
+    message_id: str
+    name: Optional[str] = None
+    device: Optional[str] = None
+    received_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    last_error: Optional[str] = None
+    ref: Optional[str] = None  # rowid di SQLite, tidak ikut diserialisasi
+    lease: Optional[str] = None  # token lease pengirim saat diproses worker
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data.pop("ref")
+        data.pop("lease")
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str, ref: Optional[str] = None, lease: Optional[str] = None) -> "InboundMessage":
+        return cls(**json.loads(raw), ref=ref, lease=lease)
+
+    @property
+    def dedup_ttl(self) -> int:
+        return WA_INBOUND_DEDUP_FALLBACK_SEC if self.message_id.startswith("hash:") else WA_INBOUND_DEDUP_TTL_SEC
+
+
+# --- VALIDASI WEBHOOK ---
+def webhook_authorized(token: Optional[str]) -> bool:
+    """
+    Fail closed: tanpa WHATSAPP_WEBHOOK_TOKEN semua request ditolak, kecuali
+    WHATSAPP_WEBHOOK_INSECURE=1 (uji lokal) -- webhook ini memicu LLM dan
+    pengiriman WA atas nama akun Fonnte perusahaan.
+    """
+    if not WHATSAPP_WEBHOOK_TOKEN:
+        return WHATSAPP_WEBHOOK_INSECURE
+    return bool(token) and hmac.compare_digest(token, WHATSAPP_WEBHOOK_TOKEN)
+
+
+def parse_fonnte_payload(data) -> Optional[InboundMessage]:
+    """
+    Payload webhook Fonnte (sender, message, device, name, member, inboxid/id)
+    -> InboundMessage. None untuk pesan yang diabaikan (grup, media tanpa
+    teks, pesan dari nomor device sendiri); ValueError bila tidak valid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("payload harus berupa objek")
+    raw_sender = str(data.get("sender") or "").strip()
+    if not raw_sender:
+        raise ValueError("field 'sender' wajib diisi")
+    if "@g.us" in raw_sender or data.get("member") or str(data.get("isgroup", "")).lower() in ("1", "true"):
+        return None  # pesan grup tidak dijawab bot
+    sender = normalize_phone(raw_sender)
+    if not 8 <= len(sender) <= 15:
+        raise ValueError(f"nomor pengirim tidak valid: {raw_sender!r}")
+    device = normalize_phone(str(data.get("device") or "")) or None
+    if device == sender:
+        return None
+
+    text = str(data.get("message") or data.get("text") or "").strip()
+    if not text:
+        return None  # stiker / gambar / lokasi tanpa teks
+    text = text[:WA_INBOUND_MAX_CHARS]
+
+    message_id = next((str(data[k]).strip() for k in ("id", "inboxid", "message_id") if data.get(k)), "")[:128]
+    if not message_id:
+        message_id = "hash:" + hashlib.sha1(f"{device}|{sender}|{text}".encode("utf-8")).hexdigest()
+    name = str(data.get("name") or "").strip()[:100] or None
+    return InboundMessage(sender=sender, text=text, message_id=message_id, name=name, device=device)
+
+
+# --- BACKEND: REDIS (ANTREAN PER PENGIRIM) ---
+# KEYS: seen, queue, ready, leases, depth | ARGV: payload, sender, now, max_depth, seen_ttl
+_ENQUEUE_LUA = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[5]) then
+    return -1
+end
+local depth = tonumber(redis.call('GET', KEYS[5]) or '0')
+if depth >= tonumber(ARGV[4]) then
+    redis.call('DEL', KEYS[1])
+    return -2
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+if not redis.call('ZSCORE', KEYS[4], ARGV[2]) then
+    redis.call('ZADD', KEYS[3], 'NX', ARGV[3], ARGV[2])
+end
+return redis.call('INCR', KEYS[5])
+"""
+
+# KEYS: ready, leases, owners | ARGV: now, lease_sec, queue_prefix, token
+_CLAIM_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 20)
+for _, sender in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], sender)
+    redis.call('HDEL', KEYS[3], sender)
+    redis.call('ZADD', KEYS[1], ARGV[1], sender)
+end
+while true do
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+    if #due == 0 then
+        return false
+    end
+    local sender = due[1]
+    redis.call('ZREM', KEYS[1], sender)
+    local head = redis.call('LINDEX', ARGV[3] .. sender, 0)
+    if head then
+        redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[2]), sender)
+        redis.call('HSET', KEYS[3], sender, ARGV[4])
+        return {sender, head}
+    end
+end
+"""
+
+# KEYS: ready, leases, owners, depth, dead
+# ARGV: sender, queue_prefix, mode (ack/retry/dead), token, now, payload, due_at, dead_maxlen
+_FINISH_LUA = """
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[4] then
+    return -1
+end
+local queue = ARGV[2] .. ARGV[1]
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+if ARGV[3] == 'retry' then
+    redis.call('LSET', queue, 0, ARGV[6])
+    redis.call('ZADD', KEYS[1], ARGV[7], ARGV[1])
+    return tonumber(redis.call('GET', KEYS[4]) or '0')
+end
+redis.call('LPOP', queue)
+if ARGV[3] == 'dead' then
+    redis.call('RPUSH', KEYS[5], ARGV[6])
+    redis.call('LTRIM', KEYS[5], -tonumber(ARGV[8]), -1)
+end
+if redis.call('LLEN', queue) > 0 then
+    redis.call('ZADD', KEYS[1], ARGV[5], ARGV[1])
+end
+return redis.call('DECR', KEYS[4])
+"""
+
+
+class RedisInboundBackend:
+    name = "redis"
+
+    def __init__(self, redis_client, prefix: str = "wa_inbound"):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.queue_prefix = f"{prefix}:q:"
+        self.ready_key = f"{prefix}:ready"
+        self.leases_key = f"{prefix}:leases"
+        self.owners_key = f"{prefix}:owners"
+        self.depth_key = f"{prefix}:depth"
+        self.dead_key = f"{prefix}:dead"
+        self._enqueue = redis_client.register_script(_ENQUEUE_LUA)
+        self._claim = redis_client.register_script(_CLAIM_LUA)
+        self._finish = redis_client.register_script(_FINISH_LUA)
+
+    async def setup(self):
+        await self.redis.ping()
+
+    async def enqueue(self, msg: InboundMessage, max_depth: int) -> int:
+        return int(await self._enqueue(
+            keys=[f"{self.prefix}:seen:{msg.message_id}", self.queue_prefix + msg.sender, self.ready_key,
+                  self.leases_key, self.depth_key],
+            args=[msg.to_json(), msg.sender, time.time(), max_depth, msg.dedup_ttl],
+        ))
+
+    async def claim(self) -> Optional[InboundMessage]:
+        token = uuid.uuid4().hex
+        result = await self._claim(
+            keys=[self.ready_key, self.leases_key, self.owners_key],
+            args=[time.time(), WA_INBOUND_LEASE_SEC, self.queue_prefix, token],
+        )
+        if not result:
+            return None
+        return InboundMessage.from_json(result[1], lease=token)
+
+    async def _finish_call(self, msg: InboundMessage, mode: str, due_at: float = 0.0) -> int:
+        return int(await self._finish(
+            keys=[self.ready_key, self.leases_key, self.owners_key, self.depth_key, self.dead_key],
+            args=[msg.sender, self.queue_prefix, mode, msg.lease, time.time(), msg.to_json(), due_at,
+                  WA_INBOUND_DEAD_MAXLEN],
+        ))
+
+    async def ack(self, msg: InboundMessage) -> int:
+        return await self._finish_call(msg, "ack")
+
+    async def retry(self, msg: InboundMessage, due_at: float) -> int:
+        return await self._finish_call(msg, "retry", due_at)
+
+    async def dead_letter(self, msg: InboundMessage) -> int:
+        return await self._finish_call(msg, "dead")
+
+    async def depth(self) -> Dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.depth_key)
+            pipe.zcard(self.ready_key)
+            pipe.zcard(self.leases_key)
+            pipe.llen(self.dead_key)
+            pipe.zrange(self.ready_key, 0, 0, withscores=True)
+            queued, ready, inflight, dead, oldest = await pipe.execute()
+        return {
+            "queued": int(queued or 0),
+            "senders_ready": ready,
+            "senders_inflight": inflight,
+            "dead": dead,
+            "oldest_wait_sec": round(max(0.0, time.time() - oldest[0][1]), 1) if oldest else 0.0,
+        }
+
+    async def close(self):
+        pass
+
+
+# --- BACKEND: SQLITE (CADANGAN LOKAL) ---
+class SqliteInboundBackend:
+    name = "sqlite"
+
+    def __init__(self, path: str = WA_INBOUND_SQLITE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._enqueued = 0
+
+    def _setup(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inbound ("
+            " rowid INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending', due_at REAL NOT NULL, claimed_at REAL, lease TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_inbound_sender ON inbound (sender, status, rowid)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_inbound_due ON inbound (status, due_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inbound_seen (message_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+
+    async def setup(self):
+        await asyncio.to_thread(self._setup)
+
+    def _transaction(self, fn):
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _enqueue(self, msg: InboundMessage, max_depth: int) -> int:
+        now = time.time()
+
+        def tx(conn) -> int:
+            # Baris seen yang sudah kedaluwarsa ditimpa; rowcount 0 = duplikat
+            cur = conn.execute(
+                "INSERT INTO inbound_seen (message_id, expires_at) VALUES (?, ?) ON CONFLICT(message_id)"
+                " DO UPDATE SET expires_at = excluded.expires_at WHERE inbound_seen.expires_at < ?",
+                (msg.message_id, now + msg.dedup_ttl, now),
+            )
+            if cur.rowcount == 0:
+                return DUPLICATE
+            depth = conn.execute("SELECT COUNT(*) FROM inbound WHERE status != 'dead'").fetchone()[0]
+            if depth >= max_depth:
+                conn.execute("DELETE FROM inbound_seen WHERE message_id = ?", (msg.message_id,))
+                return FULL
+            conn.execute("INSERT INTO inbound (sender, payload, due_at) VALUES (?, ?, ?)",
+                         (msg.sender, msg.to_json(), now))
+            self._enqueued += 1
+            if self._enqueued % 500 == 0:
+                conn.execute("DELETE FROM inbound_seen WHERE expires_at < ?", (now,))
+            return depth + 1
+
+        return self._transaction(tx)
+
+    async def enqueue(self, msg: InboundMessage, max_depth: int) -> int:
+        return await asyncio.to_thread(self._enqueue, msg, max_depth)
+
+    def _claim(self) -> Optional[InboundMessage]:
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def tx(conn):
+            # Hanya kepala antrean tiap pengirim yang boleh diambil (urutan per pengirim)
+            row = conn.execute(
+                "SELECT m.rowid, m.payload FROM inbound m"
+                " WHERE ((m.status = 'pending' AND m.due_at <= ?) OR (m.status = 'inflight' AND m.claimed_at < ?))"
+                " AND m.rowid = (SELECT MIN(h.rowid) FROM inbound h WHERE h.sender = m.sender AND h.status != 'dead')"
+                " ORDER BY m.due_at LIMIT 1",
+                (now, now - WA_INBOUND_LEASE_SEC),
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE inbound SET status = 'inflight', claimed_at = ?, lease = ? WHERE rowid = ?",
+                             (now, token, row[0]))
+            return row
+
+        row = self._transaction(tx)
+        return InboundMessage.from_json(row[1], ref=str(row[0]), lease=token) if row else None
+
+    async def claim(self) -> Optional[InboundMessage]:
+        return await asyncio.to_thread(self._claim)
+
+    def _finish(self, sql: str, params: tuple) -> int:
+        def tx(conn) -> int:
+            if conn.execute(sql, params).rowcount == 0:
+                return -1  # lease sudah diambil alih worker lain
+            return conn.execute("SELECT COUNT(*) FROM inbound WHERE status != 'dead'").fetchone()[0]
+
+        return self._transaction(tx)
+
+    async def ack(self, msg: InboundMessage) -> int:
+        return await asyncio.to_thread(
+            self._finish, "DELETE FROM inbound WHERE rowid = ? AND lease = ?", (int(msg.ref), msg.lease)
+        )
+
+    async def retry(self, msg: InboundMessage, due_at: float) -> int:
+        return await asyncio.to_thread(
+            self._finish,
+            "UPDATE inbound SET status = 'pending', payload = ?, due_at = ?, lease = NULL WHERE rowid = ? AND lease = ?",
+            (msg.to_json(), due_at, int(msg.ref), msg.lease),
+        )
+
+    async def dead_letter(self, msg: InboundMessage) -> int:
+        return await asyncio.to_thread(
+            self._finish,
+            "UPDATE inbound SET status = 'dead', payload = ?, lease = NULL WHERE rowid = ? AND lease = ?",
+            (msg.to_json(), int(msg.ref), msg.lease),
+        )
+
+    def _depth(self) -> Dict:
+        with self._lock:
+            queued, senders, inflight, oldest = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT sender), SUM(status = 'inflight'), MIN(due_at)"
+                " FROM inbound WHERE status != 'dead'"
+            ).fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM inbound WHERE status = 'dead'").fetchone()[0]
+        return {
+            "queued": queued,
+            "senders_ready": senders - (inflight or 0),
+            "senders_inflight": inflight or 0,
+            "dead": dead,
+            "oldest_wait_sec": round(max(0.0, time.time() - oldest), 1) if oldest else 0.0,
+        }
+
+    async def depth(self) -> Dict:
+        return await asyncio.to_thread(self._depth)
+
+    async def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+# --- PENANGAN PESAN (DIJALANKAN WORKER) ---
+async def answer_whatsapp_message(msg: InboundMessage) -> bool:
+    """Pipeline chat untuk satu pesan masuk lalu kirim balasannya; False bila balasan dititipkan ke outbox"""
+    from .rag_logic import get_ai_response  # rag_logic memulai/menghentikan worker modul ini
+
+    timings = start_timings()
+    started = time.perf_counter()
+    result = await chat_coalescer.run(
+        msg.sender,
+        msg.text,
+        lambda: get_ai_response(user_id=msg.sender, message=msg.text, channel="whatsapp", user_contact=msg.sender),
+    )
+    metrics.observe_request("whatsapp", timings, result["source"], (time.perf_counter() - started) * 1000)
+
+    # Kirim langsung agar balasan berurutan; bila gagal pipeline TIDAK diulang,
+    # balasan diserahkan ke outbox (retry + dead-letter)
+    if await send_whatsapp_message(msg.sender, result["response"]):
+        return True
+    await whatsapp_outbox.enqueue(msg.sender, result["response"], kind="reply")
+    return False
+
+
+# --- ANTREAN + WORKER POOL ---
+class WhatsAppInbound:
+    def __init__(self, handler: Callable[[InboundMessage], Awaitable[bool]], workers: int = WA_INBOUND_WORKERS,
+                 max_depth: int = WA_INBOUND_MAX_DEPTH, max_attempts: int = WA_INBOUND_MAX_ATTEMPTS,
+                 sqlite_path: str = WA_INBOUND_SQLITE_PATH):
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.local = SqliteInboundBackend(sqlite_path)
+        self.primary: Optional[RedisInboundBackend] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._busy = 0
+        self._lags: deque = deque(maxlen=500)
+        self.stats = {"queued": 0, "queued_local": 0, "duplicates": 0, "rejected_full": 0, "processed": 0,
+                      "retried": 0, "overloaded": 0, "dead_lettered": 0, "replies_deferred": 0,
+                      "lease_lost": 0, "worker_errors": 0}
+
+    @property
+    def backends(self) -> list:
+        return [b for b in (self.primary, self.local) if b is not None]
+
+    # --- LIFECYCLE ---
+    async def start(self, redis_client=None):
+        await self.local.setup()
+        if redis_client:
+            backend = RedisInboundBackend(redis_client)
+            try:
+                await backend.setup()
+                self.primary = backend
+            except Exception as e:
+                logger.warning(f"⚠️ Antrean WA masuk di Redis tidak aktif, memakai SQLite lokal: {e}")
+        if not WHATSAPP_WEBHOOK_TOKEN:
+            if WHATSAPP_WEBHOOK_INSECURE:
+                logger.warning("⚠️ WHATSAPP_WEBHOOK_INSECURE=1: webhook WA menerima request tanpa token (hanya untuk lokal).")
+            else:
+                logger.warning("⚠️ WHATSAPP_WEBHOOK_TOKEN tidak diatur: semua request webhook WA ditolak (401).")
+        self._tasks = [asyncio.create_task(self._worker(f"wa-inbound-{os.getpid()}-{i}")) for i in range(self.workers)]
+        logger.info(f"✅ Webhook WA masuk aktif ({'+'.join(b.name for b in self.backends)}, {self.workers} worker).")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.primary = None
+        await self.local.close()
+
+    # --- ENQUEUE (dipanggil endpoint webhook) ---
+    async def submit(self, msg: InboundMessage) -> str:
+        """"queued" / "duplicate" / "full" -- tidak menunggu pipeline chat"""
+        try:
+            if not self.primary:
+                raise RuntimeError("Redis tidak aktif")
+            result = await self.primary.enqueue(msg, self.max_depth)
+        except Exception as e:
+            if self.primary:
+                logger.warning(f"⚠️ Enqueue WA masuk ke Redis gagal ({e}), disimpan ke SQLite lokal.")
+            result = await self.local.enqueue(msg, self.max_depth)
+            if result > 0:
+                self.stats["queued_local"] += 1
+
+        if result == DUPLICATE:
+            self.stats["duplicates"] += 1
+            status = "duplicate"
+        elif result == FULL:
+            self.stats["rejected_full"] += 1
+            logger.warning(f"🚦 Antrean WA masuk penuh ({self.max_depth}), pesan {msg.message_id} ditolak.")
+            status = "full"
+        else:
+            self.stats["queued"] += 1
+            metrics.WA_INBOUND_DEPTH.set(result)
+            self._wakeup.set()
+            status = "queued"
+        metrics.inbound_event(status)
+        return status
+
+    # --- WORKER ---
+    async def _claim(self):
+        for backend in self.backends:
+            try:
+                msg = await backend.claim()
+            except Exception as e:
+                if backend is self.local:
+                    raise
+                logger.warning(f"⚠️ Claim WA masuk dari {backend.name} gagal: {e}")
+                continue
+            if msg:
+                return backend, msg
+        return None, None
+
+    async def _worker(self, consumer: str):
+        while True:
+            try:
+                backend, msg = await self._claim()
+                if not msg:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=WA_INBOUND_POLL_SEC)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self._busy += 1
+                metrics.WA_INBOUND_BUSY.set(self._busy)
+                try:
+                    await self._process(backend, msg)
+                finally:
+                    self._busy -= 1
+                    metrics.WA_INBOUND_BUSY.set(self._busy)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["worker_errors"] += 1
+                logger.error(f"❌ Worker WA masuk {consumer} error: {e}")
+                await asyncio.sleep(WA_INBOUND_POLL_SEC)
+
+    def _settled(self, msg: InboundMessage, depth: int):
+        if depth < 0:
+            self.stats["lease_lost"] += 1
+            logger.warning(f"⚠️ Lease pengirim {msg.sender} sudah diambil alih worker lain (pesan {msg.message_id}).")
+        else:
+            metrics.WA_INBOUND_DEPTH.set(depth)
+
+    async def _process(self, backend, msg: InboundMessage):
+        if msg.attempts == 0:
+            lag = time.time() - msg.received_at
+            self._lags.append(lag)
+            metrics.WA_INBOUND_LAG.observe(lag)
+
+        try:
+            sent = await self.handler(msg)
+            error = None
+        except ChatOverloaded:
+            # Admission control penuh: tunda tanpa menghitung sebagai percobaan gagal
+            self.stats["overloaded"] += 1
+            metrics.inbound_event("overloaded")
+            self._settled(msg, await backend.retry(msg, time.time() + CHAT_RETRY_AFTER_SEC))
+            return
+        except Exception as e:
+            sent, error = False, str(e) or type(e).__name__
+
+        if error is None:
+            self._settled(msg, await backend.ack(msg))
+            self.stats["processed"] += 1
+            metrics.inbound_event("processed")
+            if not sent:
+                self.stats["replies_deferred"] += 1
+                metrics.inbound_event("reply_deferred")
+            return
+
+        msg.attempts += 1
+        msg.last_error = error
+        if msg.attempts >= self.max_attempts:
+            self._settled(msg, await backend.dead_letter(msg))
+            self.stats["dead_lettered"] += 1
+            metrics.inbound_event("dead_lettered")
+            logger.error(f"💀 Pesan WA {msg.message_id} dari {msg.sender} masuk dead-letter: {error}")
+            return
+        delay = min(WA_INBOUND_BACKOFF_MAX_SEC, WA_INBOUND_BACKOFF_BASE_SEC * 2 ** (msg.attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        self._settled(msg, await backend.retry(msg, time.time() + delay))
+        self.stats["retried"] += 1
+        metrics.inbound_event("retried")
+        logger.warning(f"⚠️ Pesan WA {msg.message_id} gagal ({error}), retry ke-{msg.attempts} dalam {delay:.1f}s.")
+
+    # --- OBSERVABILITAS ---
+    async def health(self) -> Dict:
+        depth = {}
+        for backend in self.backends:
+            try:
+                depth[backend.name] = await backend.depth()
+            except Exception as e:
+                depth[backend.name] = {"error": str(e)}
+        lags = list(self._lags)
+        return {
+            "backends": [b.name for b in self.backends],
+            "workers": len(self._tasks),
+            "busy_workers": self._busy,
+            "max_depth": self.max_depth,
+            "depth": depth,
+            "lag_sec": {"p50": metrics.percentile(lags, 0.5), "p95": metrics.percentile(lags, 0.95)},
+            **self.stats,
+        }
+
+
+whatsapp_inbound = WhatsAppInbound(answer_whatsapp_message)
@@ -0,0 +1,100 @@
+# module_1_chatbot/scripts/batch_chat.py
+"""
+Runner CLI untuk POST /chat/batch: baca pesan masuk (JSONL atau CSV dengan
+kolom user_id, message, opsional user_email & id), kirim per chunk ke API,
+tulis hasil NDJSON begitu tiap item selesai. Ringkasan per chunk ke stderr.
+
+    python -m scripts.batch_chat inbound.jsonl --out replies.ndjson
+    python -m scripts.batch_chat inbound.csv --url http://localhost:8008 --concurrency 32 --chunk-size 1000
+    cat inbound.jsonl | python -m scripts.batch_chat - > replies.ndjson
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import httpx
+
+FIELDS = ("user_id", "message", "user_email", "id")
+
+
+def read_items(path: str) -> Iterator[Dict]:
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(handle):
+                yield {k: row[k] for k in FIELDS if row.get(k)}
+        else:
+            for line in handle:
+                if line.strip():
+                    row = json.loads(line)
+                    yield {k: str(row[k]) for k in FIELDS if row.get(k) is not None}
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def chunks(items: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk: List[Dict] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_chunk(client: httpx.Client, url: str, items: List[Dict], concurrency: int, offset: int, out) -> Dict:
+    summary: Dict = {}
+    with client.stream("POST", url, json={"items": items, "concurrency": concurrency}) as response:
+        if response.status_code != 200:
+            response.read()
+            raise SystemExit(f"❌ {url} -> {response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            if result.get("type") == "summary":
+                summary = result
+                continue
+            result["index"] += offset  # index global di seluruh file input
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kirim pesan massal ke /chat/batch")
+    parser.add_argument("input", help="file .jsonl / .csv, atau - untuk stdin (JSONL)")
+    parser.add_argument("--url", default="http://localhost:8008")
+    parser.add_argument("--out", default="-", help="file NDJSON hasil (default stdout)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="item per request (maks CHAT_BATCH_MAX_ITEMS)")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + "/chat/batch"
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    started = time.perf_counter()
+    total = errors = 0
+    try:
+        with httpx.Client(timeout=httpx.Timeout(args.timeout, connect=10)) as client:
+            for chunk in chunks(read_items(args.input), args.chunk_size):
+                summary = run_chunk(client, url, chunk, args.concurrency, total, out)
+                total += len(chunk)
+                errors += summary.get("errors", 0)
+                print(f"  {total} item terkirim, chunk: {summary.get('items_per_sec')} item/s, "
+                      f"sumber {summary.get('sources')}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"✅ {total} pesan dalam {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s), {errors} error",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# module_1_chatbot/scripts/bench_embedding_server.py
+"""
+Benchmark encode query: in-process (satu request = satu inferensi) vs server
+embedding bersama (app.embedding_server, micro-batching) yang diakses
+beberapa "worker" sekaligus lewat Unix socket.
+
+Default memakai encoder simulasi agar bisa jalan tanpa torch: satu inferensi
+berjalan eksklusif (memakai semua core) dengan biaya tetap per panggilan +
+biaya per teks, mendekati perilaku SentenceTransformer di CPU.
+--real-model memakai model asli (butuh sentence-transformers).
+
+    python -m scripts.bench_embedding_server
+    python -m scripts.bench_embedding_server --workers 4 --concurrency 16 --queries 2000
+    python -m scripts.bench_embedding_server --real-model
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from app.embedding_server import EmbeddingClient, EmbeddingOverloaded, EmbeddingServer
+
+DIM = 384
+
+
+class SimulatedEncoder:
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self._lock = threading.Lock()  # satu inferensi pada satu waktu
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        vecs = np.random.default_rng(len(texts)).standard_normal((len(texts), DIM)).astype(np.float32)
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def make_encoder(args):
+    if not args.real_model:
+        return SimulatedEncoder(args.call_ms, args.text_ms)
+    from app.embeddings import EmbeddingService
+    service = EmbeddingService()
+    service.embed_documents(["warmup"])
+    lock = threading.Lock()
+
+    def encode(texts: List[str]) -> np.ndarray:
+        with lock:
+            return service.embed_documents(texts)
+    return encode
+
+
+def _summary(latencies: List[float], wall: float) -> str:
+    latencies.sort()
+    return (f"{len(latencies) / wall:8.1f} q/s   p50 {statistics.median(latencies):7.1f} ms   "
+            f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:7.1f} ms")
+
+
+async def _drive(call, queries: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    counter = iter(range(queries))
+
+    async def loop():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await call(f"pertanyaan nomor {i} tentang paket umroh")
+            except EmbeddingOverloaded:
+                continue  # ditolak server (backpressure), dihitung di statistik server
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies
+
+
+async def bench_inprocess(args) -> str:
+    encode = make_encoder(args)
+
+    async def call(text: str):
+        await asyncio.to_thread(encode, [text])
+
+    started = time.perf_counter()
+    latencies = await _drive(call, args.queries, args.workers * args.concurrency)
+    return _summary(latencies, time.perf_counter() - started)
+
+
+async def bench_server(args, socket_path: str) -> str:
+    clients = [EmbeddingClient(socket_path) for _ in range(args.workers)]
+    for client in clients:
+        await client.ping()
+
+    per_worker = args.queries // args.workers
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        _drive(lambda t, c=client: c.embed([t]), per_worker, args.concurrency) for client in clients
+    ))
+    wall = time.perf_counter() - started
+    stats = await clients[0].ping()
+    for client in clients:
+        await client.close()
+    latencies = [ms for r in results for ms in r]
+    return (f"{_summary(latencies, wall)}   batch rata-rata {stats['avg_batch_texts']} teks, "
+            f"ditolak {stats['rejected']}")
+
+
+def serve(args):
+    server = EmbeddingServer(make_encoder(args), "bench", args.socket, max_batch=args.max_batch,
+                             max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+    asyncio.run(server.serve_forever())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server embedding (micro-batching)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="jumlah worker API (koneksi klien)")
+    parser.add_argument("--concurrency", type=int, default=8, help="request bersamaan per worker")
+    parser.add_argument("--call-ms", type=float, default=8.0, help="simulasi: biaya tetap per inferensi")
+    parser.add_argument("--text-ms", type=float, default=0.4, help="simulasi: biaya per teks")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--real-model", action="store_true")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    print(f"{args.queries} query, {args.workers} worker x {args.concurrency} concurrent")
+    print(f"in-process  : {asyncio.run(bench_inprocess(args))}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "embedding.sock")
+        cmd = [sys.executable, "-m", "scripts.bench_embedding_server", "--serve", "--socket", socket_path,
+               "--call-ms", str(args.call_ms), "--text-ms", str(args.text_ms), "--max-batch", str(args.max_batch),
+               "--max-wait-ms", str(args.max_wait_ms), "--max-queue", str(args.max_queue)]
+        if args.real_model:
+            cmd.append("--real-model")
+        proc = subprocess.Popen(cmd)
+        try:
+            deadline = time.monotonic() + 120
+            while not os.path.exists(socket_path):
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("server embedding tidak siap")
+                time.sleep(0.1)
+            print(f"server      : {asyncio.run(bench_server(args, socket_path))}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# module_1_chatbot/scripts/bench_intent.py
+"""
+Micro-benchmark intent router vs deteksi lama (substring scan berulang).
+
+Pipeline lama per pesan: _is_customization_request dua kali (build_prompt &
+deteksi eskalasi), _is_commercial_query sekali, cek "admin"/"hubun" sekali,
+masing-masing me-lowercase pesan/katalog lagi. Router baru: satu lintasan.
+Script juga memastikan kedua cara memberi hasil yang sama untuk tiap pesan.
+
+    python -m scripts.bench_intent
+    python -m scripts.bench_intent --messages 20000 --catalog-size 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.intent_router import intent_router
+
+# --- IMPLEMENTASI LAMA (disalin dari rag_logic sebelum intent_router) ---
+def legacy_is_customization_request(query: str, packages_data: str) -> bool:
+    query_lower = query.lower()
+    packages_lower = packages_data.lower()
+    triggers = [
+        'kustom', 'custom', 'request', 'ubah', 'ganti', 'sesuaikan',
+        'sendiri', 'private', 'rombongan', 'keluarga besar', 'diet',
+        'sakit', 'kursi roda', 'lansia', 'bayi', 'hamil',
+        'turki', 'aqsa', 'eropa', 'dubai', 'mesir'
+    ]
+    for word in triggers:
+        if word in query_lower:
+            if word not in packages_lower:
+                return True
+    return False
+
+def legacy_is_commercial_query(query: str) -> bool:
+    keywords = ['paket', 'harga', 'biaya', 'tarif', 'promo', 'sedia', 'ada apa', 'list', 'daftar']
+    return any(k in query.lower() for k in keywords)
+
+def legacy_pipeline(message: str, catalog: str):
+    is_commercial = legacy_is_commercial_query(message)   # build_prompt
+    is_custom = legacy_is_customization_request(message, catalog)  # build_prompt
+    is_custom_again = legacy_is_customization_request(message, catalog)  # deteksi eskalasi
+    wants_admin = "admin" in message.lower() and "hubun" in message.lower()
+    return is_custom or is_custom_again, is_commercial, wants_admin
+
+def router_pipeline(message: str, catalog: str):
+    intent = intent_router.classify(message, catalog)
+    return intent.is_custom, intent.is_commercial, intent.wants_admin
+
+
+# --- KORPUS PESAN ---
+TEMPLATES = [
+    "Assalamualaikum, {q}",
+    "{q} ya kak?",
+    "Permisi min, {q}",
+    "{q}",
+    "Halo, mau tanya {q} terima kasih",
+    "kak {q}??",
+]
+QUESTIONS = [
+    "paket umrah bulan desember ada apa saja",
+    "berapa harga paket silver",
+    "biaya umrah dari surabaya berapa",
+    "ada promo ramadhan tidak",
+    "list paket yang tersedia dong",
+    "syarat visa umrah apa saja",
+    "vaksin meningitis wajib tidak",
+    "miqat untuk jamaah indonesia di mana",
+    "bagasi maksimal berapa kg",
+    "bisa paket private untuk keluarga besar",
+    "saya mau umrah plus turki",
+    "ibu saya pakai kursi roda, bisa dibantu",
+    "istri saya sedang hamil 5 bulan boleh ikut",
+    "bisa ganti hotel yang lebih dekat",
+    "tolong hubungkan ke admin",
+    "mau hubungi admin untuk pembayaran",
+    "umrah ke aqsa ada tidak",
+    "bayi umur 1 tahun bayar berapa",
+    "doa masuk masjidil haram apa",
+    "cara cicilan bagaimana",
+    "jadwal manasik kapan",
+    "rombongan 40 orang dapat diskon",
+]
+
+
+def build_corpus(n: int, rng: random.Random):
+    return [rng.choice(TEMPLATES).format(q=rng.choice(QUESTIONS)) for _ in range(n)]
+
+
+def build_catalog(size: int, rng: random.Random) -> str:
+    names = ["Premium", "Silver", "Bronze", "Hemat", "Keluarga", "Plus Dubai", "Ramadhan", "Syawal"]
+    airlines = ["Garuda Indonesia", "Saudi Arabian Airlines", "Batik Air", "Lion Air", "Emirates"]
+    blocks = []
+    for i in range(size):
+        blocks.append(
+            f"📦 Paket {rng.choice(names)} {i}\n"
+            f"   - Durasi: {rng.choice([9, 10, 12, 15])} Hari\n"
+            f"   - Harga: Rp {rng.randint(18, 95)}.000.000\n"
+            f"   - Maskapai: {rng.choice(airlines)}\n"
+            f"   - Hotel/Fasilitas: Hotel Bintang {rng.choice([3, 4, 5])}, Ziarah Lengkap, Breakfast Only"
+        )
+    return "\n\n".join(blocks)
+
+
+def bench(fn, corpus, catalog, rounds: int):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for message in corpus:
+            fn(message, catalog)
+        timings.append((time.perf_counter() - started) / len(corpus) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark intent router")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--catalog-size", type=int, default=5, help="jumlah paket di katalog")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = build_corpus(args.messages, rng)
+    catalog = build_catalog(args.catalog_size, rng)
+
+    mismatches = [m for m in corpus if legacy_pipeline(m, catalog) != router_pipeline(m, catalog)]
+    print(f"Korpus: {len(corpus)} pesan, katalog {args.catalog_size} paket ({len(catalog)} karakter)")
+    print(f"Hasil berbeda: {len(mismatches)}")
+    for m in mismatches[:5]:
+        print(f"  ! {m!r}: lama={legacy_pipeline(m, catalog)} baru={router_pipeline(m, catalog)}")
+
+    legacy_us = bench(legacy_pipeline, corpus, catalog, args.rounds)
+    router_us = bench(router_pipeline, corpus, catalog, args.rounds)
+    print(f"{'lama (substring scan)':<26}{legacy_us:>10.2f} µs/pesan")
+    print(f"{'intent_router':<26}{router_us:>10.2f} µs/pesan")
+    print(f"{'speedup':<26}{legacy_us / router_us:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
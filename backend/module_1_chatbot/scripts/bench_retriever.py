@@ -0,0 +1,104 @@
+# module_1_chatbot/scripts/bench_retriever.py
+"""
+Benchmark retriever: NumpyRetriever (matriks in-process, mmap) vs Chroma
+pada 100, 10k dan 100k chunk dengan embedding sintetis (dimensi 384, sama
+dengan all-MiniLM-L6-v2). Tidak butuh model embedding maupun Redis.
+
+    python -m scripts.bench_retriever
+    python -m scripts.bench_retriever --sizes 100 10000 --queries 500 --skip-chroma
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.retriever import NumpyRetriever, ChromaRetriever, write_numpy_index
+
+DIM = 384
+CHROMA_BATCH = 5000  # batas batch insert Chroma (SQLite)
+
+
+def _random_unit_vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    vecs = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _measure(search, queries: np.ndarray, k: int) -> dict:
+    search(queries[0], k)  # warmup
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        search(q, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "qps": len(latencies) / (sum(latencies) / 1000),
+    }
+
+
+def bench_numpy(embeddings, documents, ids, queries, k, mmap):
+    with tempfile.TemporaryDirectory() as index_dir:
+        started = time.perf_counter()
+        write_numpy_index(embeddings, documents, ids, index_dir=index_dir)
+        retriever = NumpyRetriever(index_dir=index_dir, mmap=mmap)
+        build_s = time.perf_counter() - started
+        result = _measure(retriever.search, queries, k)
+        result["build_s"] = build_s
+        return result
+
+
+def bench_chroma(embeddings, documents, ids, queries, k):
+    import chromadb
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        client = chromadb.PersistentClient(path=db_dir)
+        collection = client.get_or_create_collection(name="bench", embedding_function=None)
+        started = time.perf_counter()
+        for i in range(0, len(ids), CHROMA_BATCH):
+            collection.add(
+                ids=ids[i:i + CHROMA_BATCH],
+                documents=documents[i:i + CHROMA_BATCH],
+                embeddings=embeddings[i:i + CHROMA_BATCH].tolist(),
+            )
+        build_s = time.perf_counter() - started
+        result = _measure(ChromaRetriever(collection).search, queries, k)
+        result["build_s"] = build_s
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NumpyRetriever vs Chroma")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    queries = _random_unit_vectors(rng, args.queries)
+
+    print(f"{'backend':<14}{'chunks':>9}{'build_s':>10}{'p50_ms':>10}{'p95_ms':>10}{'qps':>12}")
+    for size in args.sizes:
+        embeddings = _random_unit_vectors(rng, size)
+        documents = [f"chunk {i}" for i in range(size)]
+        ids = [f"doc_{i}" for i in range(size)]
+
+        runs = [
+            ("numpy", lambda: bench_numpy(embeddings, documents, ids, queries, args.k, mmap=False)),
+            ("numpy-mmap", lambda: bench_numpy(embeddings, documents, ids, queries, args.k, mmap=True)),
+        ]
+        if not args.skip_chroma:
+            runs.append(("chroma", lambda: bench_chroma(embeddings, documents, ids, queries, args.k)))
+
+        for name, run in runs:
+            r = run()
+            print(f"{name:<14}{size:>9}{r['build_s']:>10.2f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['qps']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
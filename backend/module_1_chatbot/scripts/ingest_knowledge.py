@@ -1,55 +1,152 @@
+# Jalankan dari root modul: python -m scripts.ingest_knowledge
+#
+# Ingest inkremental knowledge base ke ChromaDB:
+# - file dibaca baris demi baris (streaming), dipotong per paragraf,
+# - tiap chunk diberi ID dari hash isinya -> chunk yang tidak berubah dilewati,
+# - chunk baru di-embed & di-upsert per batch besar,
+# - chunk yang teksnya sudah hilang dari file dihapus dari collection.
+# Ingest ulang tanpa perubahan tidak memuat model embedding sama sekali.
+# Setiap ada perubahan, index NumPy & index leksikal BM25 ikut ditulis ulang.
+import argparse
+import hashlib
 import os
+import time
 import chromadb
-from sentence_transformers import SentenceTransformer
+import redis
 import logging
+from typing import Iterator, List, Tuple
+
+from app.embeddings import embedding_service
+from app.retriever import write_numpy_index, VECTOR_INDEX_DIR, META_FILE
+from app.lexical_index import write_lexical_index, LEXICAL_INDEX_DIR, LEXICAL_FILE
 
 logger = logging.getLogger(__name__)
 
-# 1. Inisialisasi ChromaDB
+# 1. Konfigurasi ChromaDB & Knowledge Base
 db_path = "./chroma_db"
-client = chromadb.PersistentClient(path=db_path)
-
-# 2. Buat atau dapatkan Collection (tabel)
 collection_name = "haji_umrah_kb" # <-- KITA AKAN PAKAI NAMA INI
-try:
-    collection = client.get_collection(name=collection_name)
-    logger.info(f"Collection '{collection_name}' sudah ada.")
-except Exception:
-    collection = client.create_collection(name=collection_name)
-    logger.info(f"Collection '{collection_name}' telah dibuat.")
-
-# 3. Path ke Knowledge Base Anda
 kb_path = "./knowledge_base" # <-- Pastikan folder ini ada dan berisi .txt
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+ID_PAGE_SIZE = 10_000  # ambil ID existing per halaman agar hemat memori
+
+# 2. Buat atau dapatkan Collection (tabel)
+def get_collection():
+    client = chromadb.PersistentClient(path=db_path)
+    # Embedding dihitung oleh embedding_service (model yang sama dengan query chatbot)
+    return client.get_or_create_collection(name=collection_name, embedding_function=None)
 
-# 4. Fungsi untuk membaca dan memproses file
-def ingest_data():
-    doc_id = 1
+# 3. Baca file secara streaming -> (source, chunk)
+def iter_chunks(path: str) -> Iterator[Tuple[str, str]]:
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".txt"):
+            continue
+        logger.info(f"Memproses file: {filename}...")
+        paragraph: List[str] = []
+        with open(os.path.join(path, filename), 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    paragraph.append(line.rstrip("\n"))
+                elif paragraph:
+                    yield filename, "\n".join(paragraph).strip()
+                    paragraph = []
+        if paragraph:
+            yield filename, "\n".join(paragraph).strip()
+
+def chunk_id(source: str, chunk: str) -> str:
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+    return f"{source}:{digest}"
+
+def existing_ids(collection) -> set:
+    ids, offset = set(), 0
+    while True:
+        page = collection.get(include=[], limit=ID_PAGE_SIZE, offset=offset)["ids"]
+        ids.update(page)
+        if len(page) < ID_PAGE_SIZE:
+            return ids
+        offset += ID_PAGE_SIZE
+
+# 4. Ingest inkremental
+def ingest_data(collection, batch_size: int = BATCH_SIZE) -> Tuple[int, int, int]:
+    """Return (jumlah_ditambah, jumlah_dihapus, jumlah_tidak_berubah)"""
     if not os.path.exists(kb_path):
         logger.warning(f"Folder '{kb_path}' tidak ditemukan. Tidak ada data untuk ingest.")
-        return
-
-    for filename in os.listdir(kb_path):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(kb_path, filename)
-            logger.info(f"Memproses file: {filename}...")
-            with open(filepath, 'r', encoding='utf-8') as f:
-                chunks = f.read().split('\n\n')
-                
-                for i, chunk in enumerate(chunks):
-                    if chunk.strip(): 
-                        unique_id = f"doc_{doc_id}_{i}"
-                        
-                        collection.add(
-                            documents=[chunk.strip()],
-                            metadatas=[{"source": filename}],
-                            ids=[unique_id]
-                        )
-                        doc_id += 1 # Pindahkan increment ke sini agar ID unik
-                        
-    logger.info("Semua dokumen berhasil diproses dan disimpan ke Vector DB.")
+        return 0, 0, 0
+
+    known = existing_ids(collection)
+    seen = set()
+    batch_ids, batch_docs, batch_meta = [], [], []
+    added = 0
+
+    def flush():
+        nonlocal added
+        if not batch_ids:
+            return
+        embeddings = embedding_service.embed_documents(batch_docs, batch_size=batch_size)
+        collection.upsert(ids=batch_ids, documents=batch_docs, metadatas=batch_meta,
+                          embeddings=embeddings.tolist())
+        added += len(batch_ids)
+        logger.info(f"Batch {len(batch_ids)} chunk di-upsert (total {added}).")
+        batch_ids.clear(); batch_docs.clear(); batch_meta.clear()
+
+    for source, chunk in iter_chunks(kb_path):
+        uid = chunk_id(source, chunk)
+        if uid in seen:
+            continue  # paragraf duplikat dalam file yang sama
+        seen.add(uid)
+        if uid in known:
+            continue
+        batch_ids.append(uid)
+        batch_docs.append(chunk)
+        batch_meta.append({"source": source, "content_hash": uid.split(":", 1)[1]})
+        if len(batch_ids) >= batch_size:
+            flush()
+    flush()
+
+    stale = list(known - seen)
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    if stale:
+        logger.info(f"{len(stale)} chunk usang dihapus.")
+
+    return added, len(stale), len(seen) - added
+
+# 5. Tandai versi knowledge base baru agar semantic cache chatbot dikosongkan
+KB_VERSION_KEY = f"kb_version:{collection_name}"
+
+def bump_kb_version():
+    try:
+        r = redis.Redis(host=os.getenv("REDIS_HOST", "redis-cache"), port=6379, db=0)
+        version = r.incr(KB_VERSION_KEY)
+        logger.info(f"Versi knowledge base dinaikkan ke {version}.")
+    except Exception as e:
+        logger.warning(f"Gagal menaikkan versi knowledge base di Redis: {e}")
+
+# 6. Ekspor isi collection ke index NumPy (RETRIEVER_BACKEND=numpy) & index leksikal BM25
+def export_numpy_index(collection):
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    write_numpy_index(data["embeddings"], data["documents"], data["ids"], data["metadatas"])
+    logger.info(f"Index NumPy ditulis ke '{VECTOR_INDEX_DIR}' ({len(data['ids'])} chunk).")
+    write_lexical_index(data["documents"], data["ids"])
+    logger.info(f"Index leksikal BM25 ditulis ke '{LEXICAL_INDEX_DIR}'.")
 
 if __name__ == "__main__":
-    if collection.count() == 0:
-        ingest_data()
-    else:
-        logger.info("Data sudah ada di Vector DB, proses ingest dilewati.")
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Ingest inkremental knowledge base ke ChromaDB")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    collection = get_collection()
+    added, deleted, unchanged = ingest_data(collection, args.batch_size)
+
+    if added or deleted:
+        export_numpy_index(collection)
+        bump_kb_version()
+    elif not os.path.exists(os.path.join(VECTOR_INDEX_DIR, META_FILE)) \
+            or not os.path.exists(os.path.join(LEXICAL_INDEX_DIR, LEXICAL_FILE)):
+        export_numpy_index(collection)
+
+    logger.info(
+        f"Ingest selesai dalam {time.perf_counter() - started:.2f}s: "
+        f"{added} baru/berubah, {deleted} dihapus, {unchanged} tidak berubah."
+    )
@@ -0,0 +1,468 @@
+# module_1_chatbot/scripts/loadtest.py
+"""
+Load test offline untuk pipeline chat (get_ai_response) tanpa layanan eksternal.
+Semua dependensi diganti stand-in lokal:
+- LLM       : scripts.stub_llm_server (subprocess, latensi & error diatur)
+- Fonnte    : scripts.stub_fonnte_server (subprocess, pesan dihitung)
+- Redis     : fakeredis in-process (dengan Lua), plus Redis "mati" untuk skenario redis_down
+- Postgres  : loader katalog sintetis (latensi diatur)
+- Embedding : embedder hashing deterministik (--real-embeddings untuk model asli)
+- Vector DB : NumpyRetriever + index BM25 dari ./knowledge_base di direktori sementara
+
+Skenario: commercial, custom, general (RAG + semantic cache), escalation
+(AWAITING_CONFIRM -> AWAITING_CONTACT -> notifikasi admin) dan redis_down.
+Laporan per skenario: throughput, p50/p95/p99, error, dan rata-rata ms per
+tahap (app.timing). Hasil bisa disimpan sebagai baseline lalu dibandingkan
+pada run berikutnya (exit code 1 bila ada regresi di luar toleransi).
+
+    pip install -r scripts/requirements-loadtest.txt
+    python -m scripts.loadtest --save-baseline
+    python -m scripts.loadtest
+    python -m scripts.loadtest --conversations 200 --concurrency 50 --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "loadtest_baseline.json")
+KB_PATH = "./knowledge_base"
+DIM = 384
+ADMIN_NUMBER = "6281100000000"
+
+
+# --- SKENARIO ---
+@dataclass
+class Turn:
+    message: str
+    escalated: bool = False
+    sources: Tuple[str, ...] = ("Hybrid",)
+    reason: Optional[str] = None
+
+
+SCENARIOS: Dict[str, List[Turn]] = {
+    "commercial": [
+        # Pola katalog umum dijawab template (tanpa LLM); pertanyaan lain tetap ke LLM
+        Turn("Ada paket umroh 9 hari dari Jakarta di bawah 35 juta?", sources=("Catalog",)),
+        Turn("Kalau paket yang pakai Garuda berapa harganya?", sources=("Catalog",)),
+        Turn("Mana yang lebih cocok untuk orang tua, paket 9 atau 12 hari?"),
+    ],
+    "custom": [
+        Turn("Saya mau umroh private untuk keluarga besar, jadwal sendiri bisa?",
+             escalated=True, reason="Permintaan Custom"),
+        Turn("Tidak usah, info paket reguler saja"),
+    ],
+    "general": [
+        Turn("Syarat visa apa saja?", sources=("Hybrid", "Cache")),
+        Turn("Bagaimana cara pembayaran?", sources=("Hybrid", "Cache")),
+        Turn("Apa saja fasilitasnya?", sources=("Hybrid", "Cache")),
+        Turn("syarat paspor", sources=("Hybrid", "Cache")),  # jalur cepat BM25 (tanpa embedding)
+    ],
+    "escalation": [
+        Turn("Tolong hubungkan saya ke admin", escalated=True, reason="Request User"),
+        Turn("Boleh, silakan", escalated=True, sources=("System",)),
+        Turn("Nomor saya 081234567890", escalated=True, sources=("System",), reason="Selesai"),
+    ],
+    # Redis mati: history/state/cache bersama tidak tersedia, jawaban harus tetap keluar
+    "redis_down": [
+        Turn("Ada paket umroh 12 hari dari Surabaya?", sources=("Catalog",)),
+        Turn("Syarat visa apa saja?", sources=("Hybrid", "Cache")),
+    ],
+}
+
+
+# --- STAND-IN ---
+class HashingEmbedder:
+    """Pengganti SentenceTransformer: bag-of-words di-hash ke 384 dimensi (deterministik, tanpa torch)"""
+
+    def encode(self, texts, batch_size: int = 64, normalize_embeddings: bool = True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(word.encode("utf-8"))
+                out[i, h % DIM] += 1.0 if (h >> 16) & 1 else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1, norms)
+        return out[0] if single else out
+
+
+class _RealEmbedder:
+    """Adapter agar index knowledge base dibangun dengan model embedding asli"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def encode(self, texts):
+        return self.service.embed_documents(list(texts))
+
+
+class _DownPipeline:
+    async def __aenter__(self):
+        raise ConnectionError("redis down (stand-in)")
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _DownPubSub:
+    async def subscribe(self, *channels):
+        raise ConnectionError("redis down (stand-in)")
+
+    async def reset(self):
+        pass
+
+
+class DownRedis:
+    """Redis yang tidak bisa dihubungi: setiap perintah gagal seperti koneksi terputus"""
+
+    def __getattr__(self, name):
+        async def fail(*args, **kwargs):
+            raise ConnectionError("redis down (stand-in)")
+        return fail
+
+    def register_script(self, script):
+        return self.__getattr__("evalsha")
+
+    def pipeline(self, *args, **kwargs):
+        return _DownPipeline()
+
+    def pubsub(self):
+        return _DownPubSub()
+
+
+def synthetic_packages(n: int) -> List[Dict]:
+    cities = ["Jakarta", "Surabaya", "Medan", "Makassar"]
+    airlines = ["Garuda Indonesia", "Saudia", "Lion Air", "Emirates"]
+    categories = ["Umroh", "Umroh Plus", "Haji Plus"]
+    rows = []
+    for i in range(n):
+        days = (9, 12, 16)[i % 3]
+        rows.append({
+            "package_id": i + 1,
+            "name": f"Paket {categories[i % 3]} {days} Hari #{i + 1}",
+            "duration": f"{days} Hari",
+            "duration_days": days,
+            "price": 25_000_000 + (i * 1_750_000) % 40_000_000,
+            "features": ["Hotel bintang 5", "Muthawif", "Makan 3x sehari"],
+            "image_url": None,
+            "featured": i % 7 == 0,
+            "description": f"Keberangkatan dari {cities[i % 4]} dengan hotel dekat Masjidil Haram.",
+            "airline": airlines[i % 4],
+            "departure_city": cities[i % 4],
+            "hotel_info": "Makkah 4*, Madinah 4*",
+            "destination": "Makkah, Madinah",
+            "category": categories[i % 3],
+        })
+    return rows
+
+
+def build_knowledge_index(index_dir: str, embedder: HashingEmbedder):
+    from app.lexical_index import write_lexical_index
+    from app.retriever import write_numpy_index
+
+    docs, ids = [], []
+    for filename in sorted(os.listdir(KB_PATH)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(KB_PATH, filename), encoding="utf-8") as f:
+            for j, chunk in enumerate(p.strip() for p in f.read().split("\n\n") if p.strip()):
+                docs.append(chunk)
+                ids.append(f"{filename}:{j}")
+    write_numpy_index(embedder.encode(docs), docs, ids, index_dir=index_dir)
+    write_lexical_index(docs, ids, index_dir=index_dir)
+    return len(docs)
+
+
+# --- PROSES STUB ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(module: str, port: int, *extra: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module, "--port", str(port), *extra])
+
+
+def _wait_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Stub server di port {port} tidak siap dalam {timeout:.0f}s")
+
+
+def configure_env(args, llm_port: int, fonnte_port: int, tmpdir: str):
+    """Harus dipanggil sebelum modul app di-import (konfigurasi dibaca saat import)"""
+    llm_url = f"http://127.0.0.1:{llm_port}/v1/chat/completions"
+    os.environ.update({
+        "GROQ_URL": llm_url,
+        "OPENROUTER_URL": llm_url.replace("127.0.0.1", "localhost"),
+        "GROQ_API_KEY": "stub",
+        "OPENROUTER_API_KEY": "stub",
+        "FONNTE_URL": f"http://127.0.0.1:{fonnte_port}/send",
+        "FONNTE_API_KEY": "stub",
+        "ADMIN_WHATSAPP_NUMBER": ADMIN_NUMBER,
+        "RETRIEVER_BACKEND": "numpy",
+        "VECTOR_INDEX_DIR": os.path.join(tmpdir, "numpy_index"),
+        "OUTBOX_SQLITE_PATH": os.path.join(tmpdir, "outbox.db"),
+        "OUTBOX_RATE_PER_MIN": "1000000",  # semua eskalasi menuju satu nomor admin
+        "OUTBOX_POLL_SEC": "0.2",
+    })
+
+
+# --- PENGUKURAN ---
+def _pct(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+
+class PhaseResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.errors = 0
+        self.mismatches: List[str] = []
+        self.wall_sec = 0.0
+
+    def summary(self) -> Dict:
+        n = len(self.latencies)
+        return {
+            "turns": n,
+            "errors": self.errors,
+            "mismatches": len(self.mismatches),
+            "throughput_rps": round(n / self.wall_sec, 1) if self.wall_sec else 0.0,
+            "p50_ms": _pct(self.latencies, 0.5),
+            "p95_ms": _pct(self.latencies, 0.95),
+            "p99_ms": _pct(self.latencies, 0.99),
+            "stages_ms": {k: round(statistics.fmean(v), 2) for k, v in sorted(self.stages.items())},
+        }
+
+
+async def run_conversation(rag_logic, timing, user_id: str, turns: List[Turn], result: PhaseResult):
+    for i, turn in enumerate(turns):
+        timings = timing.start_timings()
+        started = time.perf_counter()
+        res = await rag_logic.get_ai_response(user_id, turn.message)
+        result.latencies.append((time.perf_counter() - started) * 1000)
+        for name, ms in timings.items():
+            result.stages.setdefault(name, []).append(ms)
+
+        if res.get("source") == "Error":
+            result.errors += 1
+        problems = []
+        if res.get("source") not in turn.sources:
+            problems.append(f"source={res.get('source')}")
+        if bool(res.get("escalated")) != turn.escalated:
+            problems.append(f"escalated={res.get('escalated')}")
+        if turn.reason and res.get("escalation_reason") != turn.reason:
+            problems.append(f"reason={res.get('escalation_reason')}")
+        if problems:
+            result.mismatches.append(f"{user_id} giliran {i + 1}: {', '.join(problems)}")
+
+
+async def run_phase(rag_logic, timing, name: str, conversations: int, concurrency: int) -> PhaseResult:
+    result = PhaseResult(name)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await run_conversation(rag_logic, timing, f"lt-{name}-{i}", SCENARIOS[name], result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(conversations)))
+    result.wall_sec = time.perf_counter() - started
+    return result
+
+
+async def wait_outbox_drained(outbox, expected: int, timeout: float = 30.0) -> int:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and outbox.stats["delivered"] < expected:
+        await asyncio.sleep(0.1)
+    return outbox.stats["delivered"]
+
+
+# --- LAPORAN & BASELINE ---
+def print_report(summaries: Dict[str, Dict]):
+    print(f"\n{'skenario':<12} {'turns':>6} {'err':>4} {'miss':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, s in summaries.items():
+        print(f"{name:<12} {s['turns']:>6} {s['errors']:>4} {s['mismatches']:>5} {s['throughput_rps']:>8} "
+              f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}")
+    print("\nRata-rata per tahap (ms):")
+    for name, s in summaries.items():
+        stages = "  ".join(f"{k}={v}" for k, v in s["stages_ms"].items())
+        print(f"  {name:<12} {stages}")
+
+
+def compare_baseline(summaries: Dict[str, Dict], baseline: Dict, tolerance: float, slack_ms: float) -> List[str]:
+    """Regresi = lebih lambat dari baseline melebihi toleransi relatif DAN slack absolut (ms)"""
+    regressions = []
+    for name, s in summaries.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if base.get(key) and s[key] is not None and s[key] > max(base[key] * (1 + tolerance), base[key] + slack_ms):
+                regressions.append(f"{name}.{key}: {s[key]} > {base[key]} (+{tolerance:.0%})")
+        if base.get("throughput_rps") and s["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}.throughput_rps: {s['throughput_rps']} < {base['throughput_rps']} (-{tolerance:.0%})")
+    return regressions
+
+
+# --- MAIN ---
+async def run(args, tmpdir: str) -> Dict[str, Dict]:
+    import fakeredis.aioredis
+
+    from app import rag_logic, timing
+    from app.catalog_cache import catalog_cache
+    from app.conversation_store import conversation_store
+    from app.embeddings import embedding_service
+    from app.lexical_index import lexical_index
+    from app.retriever import NumpyRetriever
+    from app.whatsapp_handler import whatsapp_outbox
+
+    # Embedding & vector index
+    embedder = HashingEmbedder()
+    if not args.real_embeddings:
+        embedding_service._model = embedder
+    chunks = build_knowledge_index(os.environ["VECTOR_INDEX_DIR"], embedder if not args.real_embeddings
+                                   else _RealEmbedder(embedding_service))
+    await rag_logic._load_embedding_model()
+    rag_logic.retriever = NumpyRetriever(index_dir=os.environ["VECTOR_INDEX_DIR"])
+    lexical_index.load()
+
+    # Katalog "Postgres" dengan latensi query
+    packages = synthetic_packages(args.packages)
+
+    async def load_packages():
+        await asyncio.sleep(args.db_latency_ms / 1000)
+        return [dict(p) for p in packages]
+
+    catalog_cache.loader = load_packages
+
+    # Redis in-process
+    fake_redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    rag_logic.redis_client = fake_redis
+    await rag_logic._start_services()
+    await rag_logic._warm_catalog()
+    print(f"Knowledge base: {chunks} chunk, katalog: {len(packages)} paket, stub LLM {args.llm_latency_ms:.0f} ms")
+
+    summaries: Dict[str, Dict] = {}
+    mismatches: List[str] = []
+    for name in args.scenarios:
+        if name == "redis_down":
+            down = DownRedis()
+            rag_logic.redis_client = down
+            conversation_store.start(down)
+            catalog_cache.redis = down
+            catalog_cache.invalidate()  # paksa refresh katalog tanpa Redis (fallback ke DB)
+            if whatsapp_outbox.primary:
+                whatsapp_outbox.primary.redis = down
+
+        result = await run_phase(rag_logic, timing, name, args.conversations, args.concurrency)
+        summaries[name] = result.summary()
+        mismatches.extend(result.mismatches)
+        if name == "escalation":
+            # Tunggu worker outbox selama Redis masih hidup (sebelum fase redis_down)
+            delivered = await wait_outbox_drained(whatsapp_outbox, args.conversations)
+            print(f"Notifikasi admin terkirim: {delivered}/{args.conversations} (outbox: {whatsapp_outbox.stats})")
+            if delivered < args.conversations:
+                mismatches.append(f"outbox: hanya {delivered}/{args.conversations} notifikasi terkirim")
+
+    print_report(summaries)
+    if mismatches:
+        print(f"\n⚠️ {len(mismatches)} hasil tidak sesuai skenario, contoh:")
+        for line in mismatches[:10]:
+            print(f"  - {line}")
+    summaries["_mismatches"] = len(mismatches)
+
+    rag_logic.redis_client = fake_redis  # close_resources menutup client ini
+    await rag_logic.close_resources()
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test offline pipeline chat")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--conversations", type=int, default=50, help="percakapan per skenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--packages", type=int, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--fonnte-latency-ms", type=float, default=100)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--real-embeddings", action="store_true", help="pakai model SentenceTransformer asli")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="toleransi regresi relatif (0.2 = 20%%)")
+    parser.add_argument("--slack-ms", type=float, default=10, help="selisih latensi absolut yang diabaikan")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    llm_port, fonnte_port = _free_port(), _free_port()
+    procs = [
+        _spawn("scripts.stub_llm_server", llm_port, "--latency-ms", str(args.llm_latency_ms),
+               "--jitter-ms", str(args.llm_jitter_ms), "--error-rate", str(args.llm_error_rate)),
+        _spawn("scripts.stub_fonnte_server", fonnte_port, "--latency-ms", str(args.fonnte_latency_ms)),
+    ]
+    try:
+        _wait_port(llm_port)
+        _wait_port(fonnte_port)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            configure_env(args, llm_port, fonnte_port, tmpdir)
+            summaries = asyncio.run(run(args, tmpdir))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=5)
+
+    failed = summaries.pop("_mismatches") > 0
+    config = {k: getattr(args, k) for k in ("conversations", "concurrency", "packages", "llm_latency_ms",
+                                            "llm_jitter_ms", "db_latency_ms", "real_embeddings")}
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "scenarios": summaries}, f, indent=2)
+        print(f"\nBaseline disimpan ke {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("\nKonfigurasi berbeda dengan baseline, perbandingan dilewati.")
+        else:
+            regressions = compare_baseline(summaries, baseline, args.tolerance, args.slack_ms)
+            if regressions:
+                print("\n❌ Regresi terhadap baseline:")
+                for line in regressions:
+                    print(f"  - {line}")
+                failed = True
+            else:
+                print(f"\n✅ Tidak ada regresi terhadap baseline (toleransi {args.tolerance:.0%}).")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
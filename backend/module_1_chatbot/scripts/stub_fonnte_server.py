@@ -0,0 +1,109 @@
+# module_1_chatbot/scripts/stub_fonnte_server.py
+"""
+Stub endpoint Fonnte (POST /send) untuk uji lokal notifikasi admin tanpa
+mengirim WhatsApp sungguhan. Pesan yang diterima dihitung & bisa dibaca di
+GET /_stats (balasan per nomor di GET /_replies).
+
+Juga bisa berperan sebagai provider untuk pesan masuk: POST /_inbound
+{"sender", "message", "id"?} diteruskan sebagai webhook Fonnte ke
+--webhook-url (mis. /webhook/whatsapp), status & latensi ack dikembalikan.
+
+    python -m scripts.stub_fonnte_server --port 9003 --latency-ms 150 \
+        --webhook-url "http://localhost:8008/webhook/whatsapp?token=rahasia"
+    FONNTE_URL=http://localhost:9003/send FONNTE_API_KEY=stub WHATSAPP_WEBHOOK_TOKEN=rahasia \
+        uvicorn app.main:app --port 8008
+    curl -X POST localhost:9003/_inbound -H 'Content-Type: application/json' \
+        -d '{"sender": "081234567890", "message": "Ada paket umrah 9 hari?"}'
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import deque
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float = 100, error_rate: float = 0.0, keep_last: int = 50,
+               webhook_url: str = "", device: str = "6280000000000") -> FastAPI:
+    app = FastAPI(title="Stub Fonnte")
+    app.state.config = {"latency_ms": latency_ms, "error_rate": error_rate, "webhook_url": webhook_url,
+                        "device": device}
+    app.state.received = 0
+    app.state.failed = 0
+    app.state.last = deque(maxlen=keep_last)
+    app.state.replies = {}  # nomor tujuan -> isi pesan terkirim, urut diterima
+    app.state.webhook_client = httpx.AsyncClient(timeout=30)
+
+    @app.post("/send")
+    async def send(request: Request):
+        cfg = app.state.config
+        form = await request.form()
+        await asyncio.sleep(cfg["latency_ms"] / 1000)
+        if random.random() < cfg["error_rate"]:
+            app.state.failed += 1
+            return JSONResponse(status_code=500, content={"status": False, "reason": "injected failure"})
+        app.state.received += 1
+        app.state.last.append({"target": form.get("target"), "message": form.get("message")})
+        app.state.replies.setdefault(form.get("target"), []).append(form.get("message"))
+        return {"status": True, "detail": "success! message in queue", "id": [str(app.state.received)]}
+
+    @app.get("/_stats")
+    async def stats():
+        return {"received": app.state.received, "failed": app.state.failed, "last": list(app.state.last)}
+
+    @app.get("/_replies")
+    async def replies():
+        return app.state.replies
+
+    @app.post("/_inbound")
+    async def inbound(request: Request):
+        """Kirim satu pesan masuk ke webhook seperti Fonnte (payload JSON)"""
+        cfg = app.state.config
+        if not cfg["webhook_url"]:
+            return JSONResponse(status_code=400, content={"error": "webhook_url belum diatur"})
+        body = await request.json()
+        payload = {
+            "device": cfg["device"],
+            "sender": body["sender"],
+            "message": body["message"],
+            "member": "",
+            "name": body.get("name", "Stub User"),
+            "location": "",
+            "inboxid": body.get("id") or uuid.uuid4().hex,
+        }
+        started = time.perf_counter()
+        response = await app.state.webhook_client.post(cfg["webhook_url"], json=payload)
+        return {
+            "status": response.status_code,
+            "ack_ms": round((time.perf_counter() - started) * 1000, 2),
+            "body": response.json() if response.headers.get("content-type", "").startswith("application/json") else None,
+        }
+
+    @app.post("/_config")
+    async def update_config(request: Request):
+        app.state.config.update(await request.json())
+        return app.state.config
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Fonnte WhatsApp API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9003)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--webhook-url", default="", help="tujuan webhook pesan masuk (POST /_inbound)")
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.error_rate, webhook_url=args.webhook_url)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# module_1_chatbot/scripts/stub_llm_server.py
+"""
+Stub server OpenAI-compatible (/v1/chat/completions) untuk menguji router LLM
+secara lokal tanpa memanggil Groq/OpenRouter sungguhan.
+
+Contoh (dua provider, Groq dibuat lambat & sering error):
+    python -m scripts.stub_llm_server --port 9001 --latency-ms 6000 --error-rate 0.3
+    python -m scripts.stub_llm_server --port 9002 --latency-ms 400
+    GROQ_URL=http://localhost:9001/v1/chat/completions \\
+    OPENROUTER_URL=http://localhost:9002/v1/chat/completions \\
+    GROQ_API_KEY=stub OPENROUTER_API_KEY=stub uvicorn app.main:app --port 8008
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency_ms: float = 300, jitter_ms: float = 0, error_rate: float = 0.0,
+               error_status: int = 503, reply: str = "Ini jawaban dari stub LLM.",
+               token_ms: float = 20) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    app.state.config = {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "reply": reply,
+        "token_ms": token_ms,  # jeda antar token saat stream=true
+    }
+
+    async def stream_reply(model: str, reply: str, token_ms: float):
+        for i, word in enumerate(reply.split(" ")):
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(token_ms / 1000)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        cfg = app.state.config
+        body = await request.json()
+        delay = max(0.0, cfg["latency_ms"] + random.uniform(-cfg["jitter_ms"], cfg["jitter_ms"])) / 1000
+        await asyncio.sleep(delay)
+        if random.random() < cfg["error_rate"]:
+            return JSONResponse(status_code=cfg["error_status"], content={"error": "injected failure"})
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_reply(body.get("model", "stub"), cfg["reply"], cfg["token_ms"]),
+                media_type="text/event-stream",
+            )
+        return {
+            "id": f"stub-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": cfg["reply"]},
+                "finish_reason": "stop",
+            }],
+        }
+
+    # Ubah latensi/error saat server berjalan (mis. simulasi provider degradasi)
+    @app.post("/_config")
+    async def update_config(request: Request):
+        app.state.config.update(await request.json())
+        return app.state.config
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--reply", default="Ini jawaban dari stub LLM.")
+    parser.add_argument("--token-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.reply, args.token_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# module_1_chatbot/scripts/whatsapp_e2e.py
+"""
+Uji end-to-end webhook WhatsApp masuk tanpa layanan eksternal:
+
+    provider palsu (scripts.stub_fonnte_server, POST /_inbound)
+      -> POST /webhook/whatsapp (app.main, uvicorn in-process)
+      -> antrean whatsapp_inbound + worker -> pipeline chat (stub LLM)
+      -> send_whatsapp_message -> POST /send di provider palsu
+
+Redis, katalog, embedding & vector index memakai stand-in yang sama dengan
+scripts/loadtest.py. Tiap pengirim mengirim beberapa pesan beruntun (tanpa
+menunggu balasan); sebagian webhook dikirim ulang dengan id yang sama.
+Dicek: semua webhook di-ack (p50/p95), duplikat tidak diproses ulang, tiap
+pengirim menerima tepat satu balasan per pesan, dan urutan pesan di history
+percakapan sama dengan urutan kirim. Exit code 1 bila ada yang gagal.
+
+    python -m scripts.whatsapp_e2e
+    python -m scripts.whatsapp_e2e --senders 200 --messages 4 --llm-latency-ms 800 --workers 16
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from scripts.loadtest import (
+    HashingEmbedder, _free_port, _pct, _spawn, _wait_port, build_knowledge_index, configure_env, synthetic_packages,
+)
+
+QUESTIONS = [
+    "Syarat visa apa saja?",
+    "Ada paket umroh 12 hari dari Surabaya?",
+    "Bagaimana cara pembayaran?",
+    "Apa saja fasilitasnya?",
+]
+WEBHOOK_TOKEN = "e2e-token"
+
+
+def build_plan(senders: int, messages: int) -> Dict[str, List[str]]:
+    # Akhiran huruf membuat tiap pesan unik (tidak digabung single-flight) tanpa angka yang terbaca filter katalog
+    return {
+        f"62812{i:07d}": [f"{QUESTIONS[j % len(QUESTIONS)]} [{chr(ord('a') + j)}]" for j in range(messages)]
+        for i in range(senders)
+    }
+
+
+async def drive(client: httpx.AsyncClient, plan: Dict[str, List[str]], duplicate_rate: float) -> Dict:
+    acks: List[float] = []
+    failures: List[str] = []
+    duplicates = {"sent": 0, "detected": 0}
+
+    async def one_sender(sender: str, texts: List[str]):
+        await asyncio.sleep(random.uniform(0, 0.2))
+        for j, text in enumerate(texts):
+            message_id = f"{sender}-{j}"
+            r = (await client.post("/_inbound", json={"sender": sender, "message": text, "id": message_id})).json()
+            acks.append(r["ack_ms"])
+            if r["status"] != 200 or (r["body"] or {}).get("status") != "queued":
+                failures.append(f"{sender} pesan {j}: {r['status']} {r['body']}")
+            if random.random() < duplicate_rate:
+                # Provider mengirim ulang webhook yang sama (mis. ack dianggap timeout)
+                dup = (await client.post("/_inbound", json={"sender": sender, "message": text, "id": message_id})).json()
+                duplicates["sent"] += 1
+                duplicates["detected"] += int((dup["body"] or {}).get("status") == "duplicate")
+
+    await asyncio.gather(*(one_sender(s, texts) for s, texts in plan.items()))
+    return {"acks": acks, "failures": failures, "duplicates": duplicates}
+
+
+async def wait_replies(client: httpx.AsyncClient, plan: Dict[str, List[str]], timeout: float) -> Dict[str, List[str]]:
+    expected = sum(len(texts) for texts in plan.values())
+    deadline = time.monotonic() + timeout
+    while True:
+        replies = (await client.get("/_replies")).json()
+        got = sum(len(replies.get(sender, [])) for sender in plan)
+        if got >= expected or time.monotonic() > deadline:
+            return replies
+        await asyncio.sleep(0.2)
+
+
+async def run(args, tmpdir: str, fonnte_port: int, api_port: int) -> int:
+    import fakeredis.aioredis
+    import uvicorn
+
+    from app import rag_logic
+    from app.catalog_cache import catalog_cache
+    from app.conversation_store import conversation_store, HISTORY_MAX_TURNS
+    from app.embeddings import embedding_service
+    from app.lexical_index import lexical_index
+    from app.main import app
+    from app.retriever import NumpyRetriever
+    from app.whatsapp_inbound import whatsapp_inbound
+
+    embedder = HashingEmbedder()
+    embedding_service._model = embedder
+    build_knowledge_index(os.environ["VECTOR_INDEX_DIR"], embedder)
+    await rag_logic._load_embedding_model()
+    rag_logic.retriever = NumpyRetriever(index_dir=os.environ["VECTOR_INDEX_DIR"])
+    lexical_index.load()
+    packages = synthetic_packages(40)
+
+    async def load_packages():
+        return [dict(p) for p in packages]
+
+    catalog_cache.loader = load_packages
+    rag_logic.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    whatsapp_inbound.workers = args.workers
+    await rag_logic._start_services()
+    await rag_logic._warm_catalog()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=api_port, lifespan="off", log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    plan = build_plan(args.senders, args.messages)
+    total = args.senders * args.messages
+    problems: List[str] = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{fonnte_port}", timeout=60,
+                                     limits=httpx.Limits(max_connections=200)) as client:
+            started = time.perf_counter()
+            sent = await drive(client, plan, args.duplicate_rate)
+            ingest_elapsed = time.perf_counter() - started
+            replies = await wait_replies(client, plan, args.timeout)
+            elapsed = time.perf_counter() - started
+
+        problems.extend(sent["failures"])
+        dups = sent["duplicates"]
+        if dups["detected"] != dups["sent"]:
+            problems.append(f"duplikat: hanya {dups['detected']}/{dups['sent']} dikenali")
+        for sender, texts in plan.items():
+            got = len(replies.get(sender, []))
+            if got != len(texts):
+                problems.append(f"{sender}: {got} balasan untuk {len(texts)} pesan")
+            conv = await conversation_store.load(sender)
+            history = [m["content"] for m in conv.history if m["role"] == "user"]
+            if history != texts[-HISTORY_MAX_TURNS:]:
+                problems.append(f"{sender}: urutan history {history} != {texts}")
+        health = await whatsapp_inbound.health()
+
+        acks = sent["acks"]
+        print(f"\nWebhook: {len(acks)} request ({dups['sent']} duplikat) dalam {ingest_elapsed:.2f}s, "
+              f"ack p50 {_pct(acks, 0.5)} ms / p95 {_pct(acks, 0.95)} ms / maks {max(acks):.1f} ms")
+        print(f"Balasan: {sum(len(replies.get(s, [])) for s in plan)}/{total} dalam {elapsed:.2f}s "
+              f"({total / elapsed:.1f} pesan/s, {args.workers} worker, stub LLM {args.llm_latency_ms:.0f} ms)")
+        print(f"Antrean: lag p50 {health['lag_sec']['p50']}s / p95 {health['lag_sec']['p95']}s, "
+              f"processed {health['processed']}, duplikat {health['duplicates']}, retry {health['retried']}, "
+              f"dead {health['dead_lettered']}, depth {health['depth']}")
+    finally:
+        server.should_exit = True
+        await serve
+        await rag_logic.close_resources()
+
+    if problems:
+        print(f"\n❌ {len(problems)} masalah, contoh:")
+        for line in problems[:10]:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ Semua pesan di-ack, diproses sekali & berurutan per pengirim.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji end-to-end webhook WhatsApp masuk")
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=4, help="pesan per pengirim (maks 26)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="porsi webhook yang dikirim ulang")
+    parser.add_argument("--workers", type=int, default=8, help="WA_INBOUND_WORKERS")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--fonnte-latency-ms", type=float, default=50)
+    parser.add_argument("--timeout", type=float, default=120, help="batas tunggu semua balasan (detik)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    args.messages = max(1, min(args.messages, 26))
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    llm_port, fonnte_port, api_port = _free_port(), _free_port(), _free_port()
+    webhook_url = f"http://127.0.0.1:{api_port}/webhook/whatsapp?token={WEBHOOK_TOKEN}"
+    procs = [
+        _spawn("scripts.stub_llm_server", llm_port, "--latency-ms", str(args.llm_latency_ms)),
+        _spawn("scripts.stub_fonnte_server", fonnte_port, "--latency-ms", str(args.fonnte_latency_ms),
+               "--webhook-url", webhook_url),
+    ]
+    try:
+        _wait_port(llm_port)
+        _wait_port(fonnte_port)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            configure_env(args, llm_port, fonnte_port, tmpdir)
+            os.environ.update({
+                "WHATSAPP_WEBHOOK_TOKEN": WEBHOOK_TOKEN,
+                "WA_INBOUND_SQLITE_PATH": os.path.join(tmpdir, "whatsapp_inbound.db"),
+                "WA_INBOUND_POLL_SEC": "0.2",
+            })
+            code = asyncio.run(run(args, tmpdir, fonnte_port, api_port))
+    finally:
+        for proc in procs:
+            proc.terminate()
+    raise SystemExit(code)
+
+
+if __name__ == "__main__":
+    main()
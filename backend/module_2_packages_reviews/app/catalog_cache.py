@@ -0,0 +1,109 @@
+# backend/module_2_packages_reviews/app/catalog_cache.py
+"""
+Invalidasi katalog paket yang dipakai bersama dengan chatbot (module_1):
+- setiap commit yang menulis Package mem-publish invalidasi lewat Redis
+  pub/sub (key & channel sama dengan module_1_chatbot/app/catalog_cache.py)
+  sehingga snapshot katalog chatbot langsung dibuang. Pesan berisi generasi
+  baru (INCR CATALOG_GENERATION_KEY): chatbot menolak snapshot dengan
+  generasi lebih lama, termasuk yang di-SET ulang oleh refresh yang sedang
+  berjalan saat invalidasi,
+- invalidasi dari worker lain didengarkan di thread background; cache lokal
+  (app/response_cache.py) ikut dibuang lewat add_invalidation_callback.
+
+API ini sendiri tidak lagi membaca snapshot katalog: GET /packages memakai
+query berindex dengan filter & keyset pagination (app/package_query.py) yang
+tidak bisa dilayani dari satu snapshot seluruh tabel tanpa memindai semua
+baris di memori, dan respons serialisasinya sudah di-cache response_cache.
+"""
+import logging
+import os
+from typing import Callable, List
+
+import redis
+from sqlalchemy import event
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI (format key & channel sama dengan module_1) ---
+CATALOG_SNAPSHOT_KEY = "catalog:packages:snapshot"
+CATALOG_CHANNEL = "catalog:invalidate"
+CATALOG_GENERATION_KEY = "catalog:packages:generation"
+
+redis_client = redis.Redis(
+    host=os.getenv("REDIS_HOST", "redis-cache"),
+    port=6379,
+    db=0,
+    decode_responses=True,
+    socket_timeout=2,
+)
+
+
+class CatalogCache:
+    def __init__(self):
+        self._listener = None
+        self._callbacks: List[Callable[[], None]] = []
+
+    # --- INVALIDASI ---
+    def invalidate(self):
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Callback invalidasi katalog gagal: {e}")
+
+    def add_invalidation_callback(self, callback: Callable[[], None]):
+        """Dipanggil setiap invalidasi, baik lokal maupun dari pub/sub worker lain"""
+        self._callbacks.append(callback)
+
+    def start_listener(self):
+        """Dengarkan channel invalidasi di thread background"""
+        if self._listener is not None:
+            return
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{CATALOG_CHANNEL: lambda message: self.invalidate()})
+            self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Listener invalidasi katalog tidak aktif: {e}")
+
+
+catalog_cache = CatalogCache()
+
+
+def publish_invalidation(reason: str = "packages updated"):
+    """Naikkan generasi katalog, buang snapshot bersama lalu beri tahu semua worker (chatbot & API)"""
+    catalog_cache.invalidate()
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(CATALOG_GENERATION_KEY)
+        pipe.delete(CATALOG_SNAPSHOT_KEY)
+        generation = pipe.execute()[0]
+        redis_client.publish(CATALOG_CHANNEL, str(generation))
+        logger.info(f"🔔 Invalidasi katalog dipublish: {reason} (generasi {generation})")
+    except Exception as e:
+        logger.warning(f"⚠️ Gagal publish invalidasi katalog: {e}")
+
+
+# --- HOOK SQLALCHEMY: publish setiap commit yang menulis Package ---
+def _track_package_writes(session, flush_context, instances):
+    changed = [obj for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, models.Package)]
+    if changed:
+        session.info["catalog_dirty"] = True
+
+
+def _publish_after_commit(session):
+    if session.info.pop("catalog_dirty", False):
+        publish_invalidation()
+
+
+def _reset_after_rollback(session):
+    session.info.pop("catalog_dirty", None)
+
+
+def register_invalidation_hooks(session_factory=SessionLocal):
+    event.listen(session_factory, "before_flush", _track_package_writes)
+    event.listen(session_factory, "after_commit", _publish_after_commit)
+    event.listen(session_factory, "after_rollback", _reset_after_rollback)
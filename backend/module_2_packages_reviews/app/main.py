@@ -1,10 +1,14 @@
 # backend/module_2_packages_reviews/app/main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import os
+from typing import Optional
 from . import models, schemas, database # Impor dari modul ini sendiri
+from .catalog_cache import catalog_cache, register_invalidation_hooks
+from .package_query import PackageQuery, InvalidPackageQuery, list_packages, PACKAGES_DEFAULT_LIMIT, PACKAGES_MAX_LIMIT
+from .response_cache import response_cache, register_response_cache_hooks, LIST_TAG, package_tag
 import sqlalchemy.exc
 
 # Setup logging
@@ -27,8 +31,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Atau lebih spesifik seperti ["GET", "POST"]
     allow_headers=["*"], # Atau lebih spesifik jika perlu
+    expose_headers=["ETag"], # Agar frontend bisa membaca ETag (revalidasi If-None-Match)
 )
 
+# Setiap commit yang menulis Package mem-publish invalidasi katalog (Redis pub/sub)
+register_invalidation_hooks(database.SessionLocal)
+# Setiap commit yang menulis Review membuang cache respons detail paketnya (lihat app/response_cache.py)
+register_response_cache_hooks(database.SessionLocal)
+
+@app.on_event("startup")
+def start_catalog_listener():
+    catalog_cache.start_listener()
+    response_cache.start_listener()
+
 # Dependency
 def get_db():
     db = database.SessionLocal()
@@ -42,24 +57,64 @@ def get_db():
 def health_check():
     return {"status": "healthy"}
 
-# Get All Packages
+# Statistik cache respons GET /packages & /packages/{id}
+@app.get("/cache/stats")
+def cache_stats():
+    return response_cache.health()
+
+# Get All Packages (filter, urutan, keyset pagination & field terpilih; lihat app/package_query.py)
+# Respons dilayani dari cache bytes JSON + ETag; response_model hanya untuk dokumentasi OpenAPI
 @app.get("/packages", response_model=schemas.AllPackagesResponse)
-def get_all_packages(db: Session = Depends(get_db)):
+def get_all_packages(
+    request: Request,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    category: Optional[str] = None,
+    destination: Optional[str] = None,
+    departure_city: Optional[str] = None,
+    duration_days: Optional[int] = Query(None, ge=1),
+    featured: Optional[bool] = None,
+    sort: str = Query("package_id", description="price, name, package_id; awalan - untuk menurun"),
+    limit: int = Query(PACKAGES_DEFAULT_LIMIT, ge=1, le=PACKAGES_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor dari halaman sebelumnya"),
+    fields: Optional[str] = Query(None, description="mis. name,price,image_url (package_id selalu ikut)"),
+    db: Session = Depends(get_db),
+):
+    query = PackageQuery(
+        min_price=min_price, max_price=max_price, category=category, destination=destination,
+        departure_city=departure_city, duration_days=duration_days, featured=featured,
+        sort=sort, limit=limit, cursor=cursor, fields=fields,
+    )
+
+    def build() -> bytes:
+        packages, next_cursor = list_packages(db, query)
+        response = schemas.AllPackagesResponse(packages=packages, next_cursor=next_cursor, has_more=next_cursor is not None)
+        return response.model_dump_json(exclude_unset=True).encode("utf-8")
+
     try:
-        packages = db.query(models.Package).all()
-        return schemas.AllPackagesResponse(packages=packages)
+        entry = response_cache.get_or_build(query.cache_key(), [LIST_TAG], build)
+        return response_cache.respond(request, entry)
+    except InvalidPackageQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error mengambil semua paket: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Gagal mengambil data paket.")
 
 # Get Package Detail
 @app.get("/packages/{package_id}", response_model=schemas.PackageDetailResponse)
-def get_package_detail(package_id: int, db: Session = Depends(get_db)):
-    try:
+def get_package_detail(package_id: int, request: Request, db: Session = Depends(get_db)):
+
+    def build() -> bytes:
         package = db.query(models.Package).filter(models.Package.package_id == package_id).first()
         if not package:
             raise HTTPException(status_code=404, detail="Paket tidak ditemukan.")
-        return package
+        return schemas.PackageDetailResponse.model_validate(package).model_dump_json().encode("utf-8")
+
+    try:
+        entry = response_cache.get_or_build(f"packages/{package_id}", [package_tag(package_id)], build)
+        return response_cache.respond(request, entry)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error mengambil detail paket {package_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Gagal mengambil detail paket.")
@@ -83,7 +138,7 @@ def create_review(review_data: schemas.ReviewCreate, db: Session = Depends(get_d
             rating=review_data.rating
         )
         db.add(db_review)
-        db.commit()
+        db.commit() # hook response_cache membuang cache detail paket ini
         db.refresh(db_review)
 
         return db_review
@@ -1,10 +1,15 @@
 # backend/module_2_packages_reviews/app/models.py
-from sqlalchemy import Column, Integer, String, Text, BigInteger, ForeignKey, CheckConstraint, DateTime, Boolean, ARRAY
+from sqlalchemy import Column, Integer, String, Text, BigInteger, ForeignKey, CheckConstraint, DateTime, Boolean, ARRAY, Index, func
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+def destination_terms(column):
+    """'Makkah, Madinah' -> {makkah,madinah}; ekspresi yang sama dipakai index GIN & filter destination"""
+    return func.string_to_array(func.replace(func.lower(column), " ", ""), ",", type_=postgresql.ARRAY(Text))
+
 class Package(Base):
     __tablename__ = "packages"
 
@@ -25,6 +30,18 @@ class Package(Base):
     destination = Column(String(255))                     # Bisa dipertahankan
     category = Column(String(100))                        # Bisa dipertahankan
 
+    # Index listing GET /packages (lihat app/package_query.py & db_schema.sql):
+    # (kolom urut, package_id) untuk keyset pagination, diawali kolom filter
+    __table_args__ = (
+        Index("ix_packages_price_id", price, package_id),
+        Index("ix_packages_name_id", name, package_id),
+        Index("ix_packages_category_price", func.lower(category), price, package_id),
+        Index("ix_packages_departure_price", func.lower(departure_city), price, package_id),
+        Index("ix_packages_duration_price", duration_days, price, package_id),
+        Index("ix_packages_featured_price", price, package_id, postgresql_where=featured.is_(True)),
+        Index("ix_packages_destination", destination_terms(destination), postgresql_using="gin"),
+    )
+
     # Relasi ke tabel reviews
     reviews = relationship("Review", back_populates="package", cascade="all, delete-orphan")
 
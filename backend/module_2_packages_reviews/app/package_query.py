@@ -0,0 +1,147 @@
+# backend/module_2_packages_reviews/app/package_query.py
+"""
+Listing paket untuk GET /packages, dieksekusi di Postgres memakai index
+models.Package (juga dideklarasikan di db_schema.sql):
+- filter: min_price / max_price, category & departure_city (tanpa beda huruf
+  besar-kecil), destination (salah satu kota di kolom "Makkah, Madinah"),
+  duration_days, featured,
+- urutan: price, name, package_id (default); awalan "-" untuk menurun,
+- keyset pagination: cursor opaque berisi (nilai kolom urut, package_id) baris
+  terakhir, jadi halaman ke-1000 sama murahnya dengan halaman pertama
+  (tanpa OFFSET, tanpa COUNT),
+- fields=name,price,... hanya memilih kolom yang diminta (package_id selalu
+  ikut), mis. kartu katalog tanpa description & features.
+"""
+import base64
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import models
+
+# --- KONFIGURASI ---
+PACKAGES_DEFAULT_LIMIT = int(os.getenv("PACKAGES_DEFAULT_LIMIT", "50"))
+PACKAGES_MAX_LIMIT = int(os.getenv("PACKAGES_MAX_LIMIT", "200"))
+
+Package = models.Package
+SORT_COLUMNS = {"package_id": Package.package_id, "price": Package.price, "name": Package.name}
+FIELDS = tuple(c.name for c in Package.__table__.columns)
+
+
+class InvalidPackageQuery(ValueError):
+    """Parameter listing tidak valid (dijawab HTTP 400)"""
+
+
+@dataclass
+class PackageQuery:
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    category: Optional[str] = None
+    destination: Optional[str] = None
+    departure_city: Optional[str] = None
+    duration_days: Optional[int] = None
+    featured: Optional[bool] = None
+    sort: str = "package_id"
+    limit: int = PACKAGES_DEFAULT_LIMIT
+    cursor: Optional[str] = None
+    fields: Optional[str] = None
+
+    def selected_fields(self) -> List[str]:
+        if not self.fields:
+            return list(FIELDS)
+        names = list(dict.fromkeys(f.strip() for f in self.fields.split(",") if f.strip()))
+        unknown = [f for f in names if f not in FIELDS]
+        if unknown:
+            raise InvalidPackageQuery(f"field tidak dikenal: {', '.join(unknown)}")
+        return ["package_id"] + [f for f in names if f != "package_id"]
+
+    def cache_key(self) -> str:
+        """Key cache respons: parameter yang diisi, urutan tetap (lihat app/response_cache.py)"""
+        return "packages?" + urlencode(sorted((k, v) for k, v in asdict(self).items() if v is not None))
+
+
+# --- CURSOR ---
+def encode_cursor(sort: str, value: Any, package_id: int) -> str:
+    raw = json.dumps([sort, value, package_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, package_id = json.loads(raw)
+        package_id = int(package_id)
+    except Exception:
+        raise InvalidPackageQuery("cursor tidak valid")
+    if cursor_sort != sort:
+        raise InvalidPackageQuery("cursor berasal dari urutan yang berbeda")
+    return value, package_id
+
+
+# --- QUERY ---
+def _conditions(q: PackageQuery) -> list:
+    if q.min_price is not None and q.max_price is not None and q.min_price > q.max_price:
+        raise InvalidPackageQuery("min_price lebih besar dari max_price")
+    conditions = []
+    if q.min_price is not None:
+        conditions.append(Package.price >= q.min_price)
+    if q.max_price is not None:
+        conditions.append(Package.price <= q.max_price)
+    # lower(...) sama dengan ekspresi index ix_packages_category_price / ix_packages_departure_price
+    if q.category:
+        conditions.append(func.lower(Package.category) == q.category.strip().lower())
+    if q.departure_city:
+        conditions.append(func.lower(Package.departure_city) == q.departure_city.strip().lower())
+    if q.destination:
+        term = q.destination.lower().replace(" ", "")
+        conditions.append(models.destination_terms(Package.destination).contains([term]))
+    if q.duration_days is not None:
+        conditions.append(Package.duration_days == q.duration_days)
+    if q.featured is True:
+        conditions.append(Package.featured.is_(True))  # cocok dengan predikat index parsial
+    elif q.featured is False:
+        conditions.append(Package.featured.isnot(True))
+    return conditions
+
+
+def list_packages(db: Session, q: PackageQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """(baris halaman ini berisi field terpilih, cursor halaman berikutnya atau None)"""
+    if not 1 <= q.limit <= PACKAGES_MAX_LIMIT:
+        raise InvalidPackageQuery(f"limit harus 1-{PACKAGES_MAX_LIMIT}")
+    sort_key = q.sort.lstrip("-")
+    if sort_key not in SORT_COLUMNS:
+        raise InvalidPackageQuery(f"sort harus salah satu dari: {', '.join(SORT_COLUMNS)} (awalan - untuk menurun)")
+    descending = q.sort.startswith("-")
+    sort_column = SORT_COLUMNS[sort_key]
+    fields = q.selected_fields()
+
+    # Kolom urut ikut dipilih (untuk cursor) walau tidak diminta di fields
+    columns = [getattr(Package, f) for f in fields]
+    if sort_key not in fields:
+        columns.append(sort_column)
+    stmt = select(*columns).where(*_conditions(q))
+
+    keys = [Package.package_id] if sort_key == "package_id" else [sort_column, Package.package_id]
+    if q.cursor:
+        value, last_id = decode_cursor(q.cursor, q.sort)
+        if sort_key == "package_id":
+            stmt = stmt.where(Package.package_id < last_id if descending else Package.package_id > last_id)
+        else:
+            # Perbandingan baris (price, package_id) > (:v, :id) memakai index komposit apa adanya
+            position = tuple_(sort_column, Package.package_id)
+            bound = tuple_(value, last_id)
+            stmt = stmt.where(position < bound if descending else position > bound)
+    stmt = stmt.order_by(*(k.desc() if descending else k.asc() for k in keys)).limit(q.limit + 1)
+
+    rows = db.execute(stmt).mappings().all()
+    next_cursor = None
+    if len(rows) > q.limit:
+        rows = rows[: q.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(q.sort, last[sort_key], last["package_id"])
+    return [{f: row[f] for f in fields} for row in rows], next_cursor
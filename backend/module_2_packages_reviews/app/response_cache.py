@@ -0,0 +1,225 @@
+# backend/module_2_packages_reviews/app/response_cache.py
+"""
+Cache respons JSON untuk GET /packages dan GET /packages/{package_id}:
+- menyimpan bytes JSON yang sudah diserialisasi, jadi saat hit tidak ada
+  query DB, objek ORM, maupun validasi Pydantic; LRU dibatasi jumlah entry
+  dan total bytes, dengan TTL sebagai jaring pengaman bila pub/sub mati,
+- ETag kuat = hash body, sehingga sama di semua worker; If-None-Match yang
+  cocok dijawab 304 tanpa body,
+- invalidasi per tag: "packages" (halaman listing) dan "package:<id>"
+  (detail + review). Tulis Package -> semua entry dibuang (ikut invalidasi
+  katalog, termasuk pub/sub dari worker lain); tulis Review -> hanya detail
+  paket terkait, disebar lewat channel Redis sendiri agar chatbot tidak ikut
+  membuang snapshot katalognya,
+- nomor generasi mencegah hasil query yang dimulai sebelum invalidasi
+  tersimpan sebagai entry baru; miss bersamaan untuk key yang sama hanya
+  membangun respons sekali (single-flight).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, inspect
+
+from . import models
+from .catalog_cache import catalog_cache, redis_client
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- KONFIGURASI ---
+RESPONSE_CACHE_CHANNEL = "packages:responses:invalidate"
+RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# max-age=0 + must-revalidate: browser selalu bertanya ulang (dijawab 304 dari memori),
+# jadi review baru langsung terlihat tanpa menunggu cache browser kedaluwarsa
+RESPONSE_CACHE_CONTROL = os.getenv("RESPONSE_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+ALL_TAGS = "*"
+LIST_TAG = "packages"
+_BUILD_LOCK_STRIPES = 64
+
+
+def package_tag(package_id: int) -> str:
+    return f"package:{package_id}"
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    tags: FrozenSet[str]
+    stored_at: float  # time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match memakai perbandingan lemah (RFC 9110): awalan W/ diabaikan"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    def __init__(self, ttl_sec: float = RESPONSE_CACHE_TTL_SEC, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Lock per key (di-stripe agar jumlahnya tetap) untuk single-flight saat miss
+        self._build_locks = [threading.Lock() for _ in range(_BUILD_LOCK_STRIPES)]
+        self._listener = None
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "discarded": 0,
+                      "evictions": 0, "invalidations": 0}
+
+    # --- BACA / TULIS ---
+    def _lookup(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.age >= self.ttl_sec:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def get_or_build(self, key: str, tags: Iterable[str], build: Callable[[], bytes]) -> CachedResponse:
+        """Entry dari cache, atau panggil build() (query DB + serialisasi) lalu simpan.
+        Exception dari build() (404, 400, error DB) diteruskan dan tidak di-cache."""
+        entry = self._lookup(key)
+        if entry:
+            return entry
+        with self._build_locks[hash(key) % _BUILD_LOCK_STRIPES]:
+            entry = self._lookup(key)
+            if entry:
+                return entry
+            with self._lock:
+                self.stats["misses"] += 1
+                generation = self._generation
+            body = build()
+            entry = CachedResponse(body=body, etag=make_etag(body), tags=frozenset(tags), stored_at=time.monotonic())
+            self._store(key, entry, generation)
+            return entry
+
+    def _store(self, key: str, entry: CachedResponse, generation: int):
+        with self._lock:
+            if generation != self._generation or len(entry.body) > self.max_bytes:
+                # Ada invalidasi selama build: hasilnya mungkin sudah basi, layani sekali saja
+                self.stats["discarded"] += 1
+                return
+            self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= len(entry.body)
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": RESPONSE_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    # --- INVALIDASI ---
+    def invalidate(self, tags: Iterable[str] = (ALL_TAGS,)):
+        tags = set(tags)
+        with self._lock:
+            self._generation += 1
+            if ALL_TAGS in tags:
+                keys = list(self._entries)
+            else:
+                keys = [key for key, entry in self._entries.items() if entry.tags & tags]
+            for key in keys:
+                self._drop(key)
+            self.stats["invalidations"] += 1
+        logger.info(f"🧹 Cache respons paket dibuang ({', '.join(sorted(tags))}): {len(keys)} entry")
+
+    def start_listener(self):
+        """Dengarkan invalidasi review dari worker lain di thread background"""
+        if self._listener is not None:
+            return
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{RESPONSE_CACHE_CHANNEL: lambda message: self.invalidate(message["data"].split(","))})
+            self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Listener invalidasi cache respons tidak aktif: {e}")
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "ttl_sec": self.ttl_sec,
+                    "listener": self._listener is not None, **self.stats}
+
+
+response_cache = ResponseCache()
+
+# Paket berubah (commit lokal maupun pub/sub katalog dari worker lain) -> semua listing & detail basi
+catalog_cache.add_invalidation_callback(response_cache.invalidate)
+
+
+def publish_invalidation(tags: Iterable[str]):
+    """Buang entry lokal lalu beri tahu worker API lain"""
+    tags = sorted(set(tags))
+    response_cache.invalidate(tags)
+    try:
+        redis_client.publish(RESPONSE_CACHE_CHANNEL, ",".join(tags))
+    except Exception as e:
+        logger.warning(f"⚠️ Gagal publish invalidasi cache respons: {e}")
+
+
+# --- HOOK SQLALCHEMY: commit yang menulis Review membuang detail paketnya ---
+def _track_review_writes(session, flush_context, instances):
+    tags = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.Review):
+            # package_id lama ikut dibuang bila review dipindah ke paket lain
+            for package_id in (obj.package_id, *inspect(obj).attrs.package_id.history.deleted):
+                if package_id is not None:
+                    tags.add(package_tag(package_id))
+    if tags:
+        session.info.setdefault("response_cache_tags", set()).update(tags)
+
+
+def _publish_after_commit(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if tags:
+        publish_invalidation(tags)
+
+
+def _reset_after_rollback(session):
+    session.info.pop("response_cache_tags", None)
+
+
+def register_response_cache_hooks(session_factory=SessionLocal):
+    event.listen(session_factory, "before_flush", _track_review_writes)
+    event.listen(session_factory, "after_commit", _publish_after_commit)
+    event.listen(session_factory, "after_rollback", _reset_after_rollback)
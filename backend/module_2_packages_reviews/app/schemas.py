@@ -46,8 +46,27 @@ class ReviewCreate(ReviewBase): # Schema untuk permintaan pembuatan review
 class PackageWithReviews(Package):
     reviews: List[Review] = []
 
+class PackageListItem(BaseModel):
+    # Semua field opsional: GET /packages?fields=... hanya mengisi kolom yang diminta
+    package_id: int
+    name: Optional[str] = None
+    duration: Optional[str] = None
+    price: Optional[int] = None
+    features: Optional[List[str]] = None
+    image_url: Optional[str] = None
+    featured: Optional[bool] = None
+    description: Optional[str] = None
+    airline: Optional[str] = None
+    departure_city: Optional[str] = None
+    duration_days: Optional[int] = None
+    hotel_info: Optional[str] = None
+    destination: Optional[str] = None
+    category: Optional[str] = None
+
 class AllPackagesResponse(BaseModel):
-    packages: List[Package]
+    packages: List[PackageListItem]
+    next_cursor: Optional[str] = None  # kirim sebagai ?cursor= untuk halaman berikutnya
+    has_more: bool = False
 
 class PackageDetailResponse(PackageWithReviews):
     pass
@@ -1,7 +1,22 @@
 // src/hooks/use-chat.ts
 import { useState, useCallback, useRef, useEffect } from "react";
-import { ChatMessage, ChatRequest } from "@/lib/api";
-import { chatEndpoint } from "@/lib/api";
+import { ChatMessage, ChatRequest, ChatResponse } from "@/lib/api";
+import { chatStreamEndpoint } from "@/lib/api";
+
+// Event SSE dari /chat/stream: `token` berisi { text }, `done`/`error` berisi ChatResponse
+type ChatStreamData = { text?: string } & Partial<ChatResponse>;
+
+// Parse satu blok SSE ("event: x\ndata: {...}") dari endpoint /chat/stream
+const parseSseBlock = (block: string): { event: string; data: ChatStreamData } | null => {
+  let event = "message";
+  const dataLines: string[] = [];
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+  }
+  if (dataLines.length === 0) return null; // komentar / keep-alive
+  return { event, data: JSON.parse(dataLines.join("\n")) };
+};
 
 export const useChat = (userId: string, userEmail?: string) => {
   const [message, setMessage] = useState("");
@@ -19,8 +34,15 @@ export const useChat = (userId: string, userEmail?: string) => {
       setMessage("");
       setIsLoading(true);
 
+      // Ganti isi pesan bot terakhir (pesan yang sedang di-stream)
+      const setBotText = (botText: string) =>
+        setChatHistory((prev) => [
+          ...prev.slice(0, -1),
+          { sender: "bot", text: botText },
+        ]);
+
       try {
-        const response = await fetch(chatEndpoint, {
+        const response = await fetch(chatStreamEndpoint, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -30,16 +52,38 @@ export const useChat = (userId: string, userEmail?: string) => {
           } as ChatRequest),
         });
 
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
           throw new Error(`Error: ${response.statusText}`);
         }
 
-        const data = await response.json();
-        const botMessage: ChatMessage = {
-          sender: "bot",
-          text: data.response_text,
-        };
-        setChatHistory((prev) => [...prev, botMessage]);
+        // Placeholder pesan bot yang diisi token demi token
+        setChatHistory((prev) => [...prev, { sender: "bot", text: "" }]);
+        setIsLoading(false);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let botText = "";
+
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          const blocks = buffer.split("\n\n");
+          buffer = blocks.pop() ?? "";
+          for (const block of blocks) {
+            const parsed = parseSseBlock(block);
+            if (!parsed) continue;
+            if (parsed.event === "token") {
+              botText += parsed.data.text ?? "";
+              setBotText(botText);
+            } else if (parsed.event === "done" || parsed.event === "error") {
+              // Teks final dari server (termasuk tawaran eskalasi bila ada)
+              setBotText(parsed.data.response_text ?? botText);
+            }
+          }
+        }
       } catch (error) {
         console.error("Gagal terhubung ke Chatbot API:", error);
         const errorMessage: ChatMessage = {
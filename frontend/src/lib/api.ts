@@ -6,6 +6,7 @@ const PACKAGES_API_BASE_URL = "http://localhost:8009"; // Sesuaikan dengan port
 
 // --- ENDPOINTS ---
 export const chatEndpoint = `${CHAT_API_BASE_URL}/chat`;
+export const chatStreamEndpoint = `${CHAT_API_BASE_URL}/chat/stream`; // Server-Sent Events
 
 // --- INTERFACES / TYPES ---
 
@@ -66,18 +67,32 @@ export interface ChatResponse {
 
 // --- API FUNCTIONS ---
 
+// Ukuran halaman maksimum GET /packages (PACKAGES_MAX_LIMIT di backend)
+const PACKAGES_PAGE_LIMIT = 200;
+
 // Fungsi untuk mengambil semua paket
+// Backend membagi hasil per halaman (keyset pagination): ikuti next_cursor sampai habis
 export const fetchPackages = async (): Promise<ApiPackage[]> => {
-  const response = await fetch(`${PACKAGES_API_BASE_URL}/packages`);
-  if (!response.ok) {
-    throw new Error(`Gagal mengambil paket: ${response.statusText}`);
-  }
-  const data = await response.json();
-  // Pastikan struktur respons sesuai { packages: [...] }
-  if (!data || !Array.isArray(data.packages)) {
-    throw new Error("Respons API paket tidak valid.");
-  }
-  return data.packages;
+  const packages: ApiPackage[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(PACKAGES_PAGE_LIMIT) });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    const response = await fetch(`${PACKAGES_API_BASE_URL}/packages?${params}`);
+    if (!response.ok) {
+      throw new Error(`Gagal mengambil paket: ${response.statusText}`);
+    }
+    const data = await response.json();
+    // Pastikan struktur respons sesuai { packages: [...], next_cursor }
+    if (!data || !Array.isArray(data.packages)) {
+      throw new Error("Respons API paket tidak valid.");
+    }
+    packages.push(...data.packages);
+    cursor = data.has_more ? data.next_cursor : null;
+  } while (cursor);
+  return packages;
 };
 
 // Fungsi untuk mengambil detail paket